@@ -14,6 +14,81 @@ interface FileUploaderProps {
   onUploadSuccess: (uploadId: string) => void;
 }
 
+// Polling af upload-job indtil backend er færdig med OCR og parsing
+const POLL_INTERVAL_MS = 2000;
+
+const waitForUploadJob = async (jobId: string, onProgress: (stage: number) => void) => {
+  while (true) {
+    const response = await fetch(`${API_URL}${ENDPOINTS.UPLOAD_JOB(jobId)}`, {
+      headers: { 'Accept': 'application/json' },
+    });
+    if (!response.ok) {
+      throw new Error(`Status request failed with status: ${response.status}`);
+    }
+    const job = await response.json();
+    if (job.status === "completed") return job.result;
+    if (job.status === "failed") throw new Error(job.error || "Behandling af lønseddel fejlede");
+
+    const stagesDone = Object.values(job.stages || {}).filter(Boolean).length;
+    onProgress(stagesDone);
+    await new Promise((resolve) => setTimeout(resolve, POLL_INTERVAL_MS));
+  }
+};
+
+// Følg upload-jobbet over SSE: trin og parsede sektioner sendes løbende.
+// Falder tilbage til polling hvis forbindelsen fejler før jobbet er færdigt.
+const streamUploadJob = (
+  jobId: string,
+  onProgress: (stage: number) => void,
+  onSection?: (name: string, data: unknown) => void
+) => {
+  if (typeof EventSource === "undefined") {
+    return waitForUploadJob(jobId, onProgress);
+  }
+
+  return new Promise<any>((resolve, reject) => {
+    const source = new EventSource(`${API_URL}${ENDPOINTS.UPLOAD_JOB_EVENTS(jobId)}`);
+    let stagesDone = 0;
+    let sectionsDone = 0;
+    let finished = false;
+
+    const finish = () => {
+      finished = true;
+      source.close();
+    };
+
+    source.addEventListener("status", (event) => {
+      const job = JSON.parse((event as MessageEvent).data);
+      stagesDone = Object.values(job.stages || {}).filter(Boolean).length;
+      onProgress(stagesDone);
+    });
+    source.addEventListener("stage", () => {
+      stagesDone += 1;
+      onProgress(stagesDone + sectionsDone * 0.1);
+    });
+    source.addEventListener("section", (event) => {
+      const section = JSON.parse((event as MessageEvent).data);
+      sectionsDone += 1;
+      onProgress(stagesDone + sectionsDone * 0.1);
+      if (onSection) onSection(section.name, section.data);
+    });
+    source.addEventListener("completed", (event) => {
+      finish();
+      resolve(JSON.parse((event as MessageEvent).data));
+    });
+    source.addEventListener("failed", (event) => {
+      finish();
+      const data = JSON.parse((event as MessageEvent).data);
+      reject(new Error(data.error || "Behandling af lønseddel fejlede"));
+    });
+    source.onerror = () => {
+      if (finished) return;
+      finish();
+      waitForUploadJob(jobId, onProgress).then(resolve, reject);
+    };
+  });
+};
+
 const FileUploader: React.FC<FileUploaderProps> = ({ onUploadSuccess, onUploadStart }) => {
   const { t } = useTranslation();
   const navigate = useNavigate();
@@ -110,13 +185,17 @@ const FileUploader: React.FC<FileUploaderProps> = ({ onUploadSuccess, onUploadSt
         }
       });
       
-      setProgress(70);
+      setProgress(40);
       
       if (!response.ok) {
         throw new Error(`Upload failed with status: ${response.status}`);
       }
       
-      const validationResult = await response.json();
+      // Upload returnerer et job-id - vent på at behandlingen bliver færdig
+      const job = await response.json();
+      const validationResult = await streamUploadJob(job.job_id, (stagesDone) =>
+        setProgress(Math.min(Math.round(40 + stagesDone * 15), 95))
+      );
       
       // Gem resultatet i localstorage med bruger-specifik nøgle
       const storageKey = `validationResult_${selectedProfile.user_id}`;
@@ -4,6 +4,8 @@ export const API_URL = import.meta.env.VITE_API_URL || "http://localhost:8000";
 // API endpoints
 export const ENDPOINTS = {
   UPLOAD: '/api/v1/upload',
+  UPLOAD_JOB: (jobId: string) => `/api/v1/upload/${jobId}`,
+  UPLOAD_JOB_EVENTS: (jobId: string) => `/api/v1/upload/${jobId}/events`,
   HEALTH: '/api/v1/health',
   USERS: '/api/v1/users',
   SHIFTS: (userId: string) => `/api/v1/users/${userId}/shifts`,
@@ -0,0 +1,45 @@
+"""Add result_cache table and upload_jobs.content_hash
+
+Revision ID: 2f8d6a0b5c17
+Revises: 7b2e4c91d3a5
+Create Date: 2026-10-18 10:03:27.551902
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2f8d6a0b5c17'
+down_revision: Union[str, None] = '7b2e4c91d3a5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('upload_jobs', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.create_index(op.f('ix_upload_jobs_content_hash'), 'upload_jobs', ['content_hash'], unique=False)
+    op.create_table('result_cache',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('namespace', sa.String(), nullable=False),
+    sa.Column('cache_key', sa.String(), nullable=False),
+    sa.Column('value', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('last_accessed_at', sa.DateTime(), nullable=True),
+    sa.Column('hits', sa.Integer(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('namespace', 'cache_key', name='uq_result_cache_namespace_key')
+    )
+    op.create_index('ix_result_cache_namespace_last_accessed', 'result_cache', ['namespace', 'last_accessed_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_result_cache_namespace_last_accessed', table_name='result_cache')
+    op.drop_table('result_cache')
+    op.drop_index(op.f('ix_upload_jobs_content_hash'), table_name='upload_jobs')
+    op.drop_column('upload_jobs', 'content_hash')
@@ -0,0 +1,42 @@
+"""Add layout_templates table
+
+Revision ID: 5e1b7c3d9a42
+Revises: 2f8d6a0b5c17
+Create Date: 2026-10-18 13:41:09.218734
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e1b7c3d9a42'
+down_revision: Union[str, None] = '2f8d6a0b5c17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('layout_templates',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('bucket_key', sa.String(length=16), nullable=False),
+    sa.Column('layout_id', sa.String(), nullable=False),
+    sa.Column('employer', sa.String(), nullable=True),
+    sa.Column('signature', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('confirmations', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('bucket_key')
+    )
+    op.create_index(op.f('ix_layout_templates_layout_id'), 'layout_templates', ['layout_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_layout_templates_layout_id'), table_name='layout_templates')
+    op.drop_table('layout_templates')
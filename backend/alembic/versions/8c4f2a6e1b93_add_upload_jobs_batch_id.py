@@ -0,0 +1,30 @@
+"""Add upload_jobs.batch_id
+
+Revision ID: 8c4f2a6e1b93
+Revises: 5e1b7c3d9a42
+Create Date: 2026-10-18 15:22:47.093615
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c4f2a6e1b93'
+down_revision: Union[str, None] = '5e1b7c3d9a42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('upload_jobs', sa.Column('batch_id', sa.String(length=36), nullable=True))
+    op.create_index(op.f('ix_upload_jobs_batch_id'), 'upload_jobs', ['batch_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_upload_jobs_batch_id'), table_name='upload_jobs')
+    op.drop_column('upload_jobs', 'batch_id')
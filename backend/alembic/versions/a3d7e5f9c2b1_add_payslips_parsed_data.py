@@ -0,0 +1,37 @@
+"""Add payslips.parsed_data, content_hash and history indexes
+
+Revision ID: a3d7e5f9c2b1
+Revises: 8c4f2a6e1b93
+Create Date: 2026-10-18 16:08:12.540931
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3d7e5f9c2b1'
+down_revision: Union[str, None] = '8c4f2a6e1b93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('payslips', sa.Column('parsed_data', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+    op.add_column('payslips', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.create_unique_constraint('uq_payslips_user_content_hash', 'payslips', ['user_id', 'content_hash'])
+    op.create_index('ix_payslips_user_id_date', 'payslips', ['user_id', 'date'], unique=False)
+    op.create_index('ix_payslips_parsed_data', 'payslips', ['parsed_data'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_payslips_parsed_data', table_name='payslips', postgresql_using='gin')
+    op.drop_index('ix_payslips_user_id_date', table_name='payslips')
+    op.drop_constraint('uq_payslips_user_content_hash', 'payslips', type_='unique')
+    op.drop_column('payslips', 'content_hash')
+    op.drop_column('payslips', 'parsed_data')
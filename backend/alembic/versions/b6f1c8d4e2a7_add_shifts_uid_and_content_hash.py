@@ -0,0 +1,32 @@
+"""Add shifts.uid and content_hash for incremental ICS sync
+
+Revision ID: b6f1c8d4e2a7
+Revises: a3d7e5f9c2b1
+Create Date: 2026-10-18 17:31:54.208163
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6f1c8d4e2a7'
+down_revision: Union[str, None] = 'a3d7e5f9c2b1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('shifts', sa.Column('uid', sa.String(), nullable=True))
+    op.add_column('shifts', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.create_unique_constraint('uq_shifts_user_uid', 'shifts', ['user_id', 'uid'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('uq_shifts_user_uid', 'shifts', type_='unique')
+    op.drop_column('shifts', 'content_hash')
+    op.drop_column('shifts', 'uid')
@@ -0,0 +1,28 @@
+"""Add (user_id, start_time) index on shifts for windowed queries
+
+Revision ID: d2a9e4b7f3c6
+Revises: b6f1c8d4e2a7
+Create Date: 2026-10-18 19:12:40.531904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2a9e4b7f3c6'
+down_revision: Union[str, None] = 'b6f1c8d4e2a7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_shifts_user_id_start_time', 'shifts', ['user_id', 'start_time'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_shifts_user_id_start_time', table_name='shifts')
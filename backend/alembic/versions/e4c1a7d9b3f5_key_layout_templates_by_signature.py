@@ -0,0 +1,60 @@
+"""Key layout_templates by (layout_id, signature_key); buckets are no longer unique
+
+Revision ID: e4c1a7d9b3f5
+Revises: d2a9e4b7f3c6
+Create Date: 2026-10-18 21:04:17.902365
+
+"""
+import hashlib
+from typing import Sequence, Union
+
+from alembic import op
+import numpy as np
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4c1a7d9b3f5'
+down_revision: Union[str, None] = 'd2a9e4b7f3c6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Samme beregning som bucket_key/signature_key i app/services/layout_index.py
+def _bucket_key(signature):
+    quantized = np.round(np.asarray(signature) * 16).astype(np.int8)
+    return hashlib.sha1(quantized.tobytes()).hexdigest()[:16]
+
+
+def _signature_key(signature):
+    rounded = np.round(np.asarray(signature, dtype=float), 4)
+    return hashlib.sha1(rounded.tobytes()).hexdigest()[:16]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('layout_templates', sa.Column('signature_key', sa.String(length=16), nullable=True))
+
+    # Eksisterende skabeloner får nøgler efter den nye (finere) kvantisering
+    connection = op.get_bind()
+    rows = connection.execute(sa.text('SELECT id, signature FROM layout_templates')).fetchall()
+    for row in rows:
+        connection.execute(
+            sa.text('UPDATE layout_templates SET bucket_key = :bucket, signature_key = :key WHERE id = :id'),
+            {"bucket": _bucket_key(row.signature), "key": _signature_key(row.signature), "id": row.id},
+        )
+
+    op.alter_column('layout_templates', 'signature_key', nullable=False)
+    op.drop_constraint('layout_templates_bucket_key_key', 'layout_templates', type_='unique')
+    op.create_index(op.f('ix_layout_templates_bucket_key'), 'layout_templates', ['bucket_key'], unique=False)
+    op.create_unique_constraint(
+        'uq_layout_templates_layout_signature', 'layout_templates', ['layout_id', 'signature_key']
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('uq_layout_templates_layout_signature', 'layout_templates', type_='unique')
+    op.drop_index(op.f('ix_layout_templates_bucket_key'), table_name='layout_templates')
+    op.create_unique_constraint('layout_templates_bucket_key_key', 'layout_templates', ['bucket_key'])
+    op.drop_column('layout_templates', 'signature_key')
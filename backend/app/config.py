@@ -19,6 +19,83 @@ class Settings:
     
     # Dokumenthåndtering
     UPLOAD_FOLDER: str = "temp_uploads"
-    MAX_CONTENT_LENGTH: int = 10 * 1024 * 1024  # 10 MB
+    # Maksimal størrelse pr. uploadet fil i bytes (håndhæves mens filen streames til disk)
+    MAX_CONTENT_LENGTH: int = int(os.getenv("MAX_CONTENT_LENGTH", str(10 * 1024 * 1024)))  # 10 MB
+
+    # OCR-modelpulje (antal forudindlæste docTR-predictors pr. proces)
+    OCR_POOL_SIZE: int = int(os.getenv("OCR_POOL_SIZE", "1"))
+    OCR_POOL_TIMEOUT: float = float(os.getenv("OCR_POOL_TIMEOUT", "120"))
+
+    # Inferens-backend for OCR-modellerne:
+    # "torch" (fp32, standard), "torch_int8" (dynamisk int8-kvantiseret) eller
+    # "onnx" (ONNX Runtime via den valgfrie pakke onnxtr[cpu], se requirements-onnx.txt)
+    OCR_BACKEND: str = os.getenv("OCR_BACKEND", "torch")
+    OCR_ONNX_8BIT: bool = os.getenv("OCR_ONNX_8BIT", "False").lower() == "true"
+
+    # PDF'er med indlejret tekstlag læses direkte; kun sider uden brugbar tekst OCR'es
+    PDF_TEXT_LAYER_ENABLED: bool = os.getenv("PDF_TEXT_LAYER_ENABLED", "True").lower() == "true"
+    PDF_TEXT_LAYER_MIN_CHARS: int = int(os.getenv("PDF_TEXT_LAYER_MIN_CHARS", "20"))
+
+    # Eksekvering af OCR/LLM uden for event loop'et
+    # OCR_EXECUTOR: "process" (en warm model pr. arbejdsproces) eller "thread" (deler OCR-modelpuljen)
+    OCR_EXECUTOR: str = os.getenv("OCR_EXECUTOR", "process")
+    OCR_WORKERS: int = int(os.getenv("OCR_WORKERS", "2"))
+    # Flersidede PDF'er fordeles side for side over OCR-workerne
+    OCR_PAGE_PARALLEL: bool = os.getenv("OCR_PAGE_PARALLEL", "True").lower() == "true"
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+    # Stream Mistral-svar og send færdige sektioner til klienten over SSE
+    LLM_STREAMING: bool = os.getenv("LLM_STREAMING", "True").lower() == "true"
+    # "single" (én samlet prompt) eller "sharded" (små samtidige prompts pr. sektion)
+    LLM_EXTRACTION_MODE: str = os.getenv("LLM_EXTRACTION_MODE", "single")
+    # Regelbaseret udtræk for kendte lønseddel-layouts (Mistral kun for manglende felter)
+    RULE_EXTRACTION_ENABLED: bool = os.getenv("RULE_EXTRACTION_ENABLED", "True").lower() == "true"
+    # Layout-fingeraftryk (overskrifter og tabelkolonner) slås op i de bekræftede skabeloner
+    LAYOUT_INDEX_ENABLED: bool = os.getenv("LAYOUT_INDEX_ENABLED", "True").lower() == "true"
+    LAYOUT_MATCH_MAX_DISTANCE: float = float(os.getenv("LAYOUT_MATCH_MAX_DISTANCE", "0.15"))
+
+    # Fælles HTTP-klient for udgående kald (connection-pulje, DNS-cache og keep-alive)
+    HTTP_POOL_LIMIT: int = int(os.getenv("HTTP_POOL_LIMIT", "100"))
+    HTTP_POOL_LIMIT_PER_HOST: int = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "10"))
+    HTTP_DNS_CACHE_SECONDS: int = int(os.getenv("HTTP_DNS_CACHE_SECONDS", "300"))
+    HTTP_KEEPALIVE_SECONDS: float = float(os.getenv("HTTP_KEEPALIVE_SECONDS", "30"))
+    HTTP_TIMEOUT_SECONDS: float = float(os.getenv("HTTP_TIMEOUT_SECONDS", "30"))
+
+    # Cache af brugernes ICS-feeds: så længe (sekunder) bruges de parsede vagter uden netværk,
+    # derefter revalideres feed'et med ETag/Last-Modified
+    ICS_CACHE_TTL_SECONDS: int = int(os.getenv("ICS_CACHE_TTL_SECONDS", "300"))
+    # Synkronisér nye/ændrede feeds til tabellen `shifts` (inkrementelt på UID)
+    ICS_SYNC_SHIFTS: bool = os.getenv("ICS_SYNC_SHIFTS", "True").lower() == "true"
+    # Baggrundsopdatering af alle brugeres feeds (interval, samtidige hentninger pr. host,
+    # første genforsøg efter fejl og maksimal backoff, alle i sekunder)
+    ICS_REFRESH_ENABLED: bool = os.getenv("ICS_REFRESH_ENABLED", "True").lower() == "true"
+    ICS_REFRESH_INTERVAL_SECONDS: int = int(os.getenv("ICS_REFRESH_INTERVAL_SECONDS", "900"))
+    ICS_REFRESH_PER_HOST: int = int(os.getenv("ICS_REFRESH_PER_HOST", "2"))
+    ICS_REFRESH_RETRY_SECONDS: int = int(os.getenv("ICS_REFRESH_RETRY_SECONDS", "60"))
+    ICS_REFRESH_MAX_BACKOFF_SECONDS: int = int(os.getenv("ICS_REFRESH_MAX_BACKOFF_SECONDS", "3600"))
+    # Gentagne vagter (RRULE) udfoldes fra så mange dage tilbage til så mange dage frem
+    ICS_RECURRENCE_DAYS_BACK: int = int(os.getenv("ICS_RECURRENCE_DAYS_BACK", "365"))
+    ICS_RECURRENCE_DAYS_AHEAD: int = int(os.getenv("ICS_RECURRENCE_DAYS_AHEAD", "365"))
+
+    # Upload-jobkø ("database" er holdbar på tværs af genstarter, "memory" er proces-lokal)
+    UPLOAD_JOB_BACKEND: str = os.getenv("UPLOAD_JOB_BACKEND", "database")
+    UPLOAD_WORKERS: int = int(os.getenv("UPLOAD_WORKERS", "4"))
+    # Maksimalt antal dokumenter i en batch-upload (filer eller filer i en ZIP)
+    BATCH_MAX_FILES: int = int(os.getenv("BATCH_MAX_FILES", "50"))
+
+    # Versioner af OCR-output og LLM-prompt - bump når output ændres, så gamle cache-entries ignoreres
+    OCR_VERSION: str = "2"
+    PROMPT_VERSION: str = "1"
+    # Version af de regelbaserede udtræk (rule_extractor) - bump når reglerne ændres
+    RULE_VERSION: str = "1"
+
+    # Persistent resultat-cache (OCR-tekst og parset JSON pr. filindhold)
+    RESULT_CACHE_MAX_ENTRIES: int = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "5000"))
+    RESULT_CACHE_MAX_AGE_DAYS: int = int(os.getenv("RESULT_CACHE_MAX_AGE_DAYS", "90"))
+
+    # Cache af Mistral-svar pr. normaliseret OCR-tekst, model og prompt-version
+    LLM_CACHE_ENABLED: bool = os.getenv("LLM_CACHE_ENABLED", "True").lower() == "true"
+    LLM_CACHE_MAX_ENTRIES: int = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+    LLM_CACHE_TTL_DAYS: int = int(os.getenv("LLM_CACHE_TTL_DAYS", "30"))
+    LLM_CACHE_MEMORY_ENTRIES: int = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "256"))
 
 settings = Settings()
@@ -1,11 +1,12 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, status, Form
+from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, status, Form, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
 import json
 import os
 from datetime import datetime, timedelta
-from typing import List
+from typing import List, Optional
 import logging
 import sys
+from contextlib import asynccontextmanager
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
@@ -21,21 +22,40 @@ from app.models import User, Payslip, Shift
 # Import routers
 from app.routers.users import router as users_router
 from app.routers.shifts import router as shifts_router
+from app.routers.upload import router as upload_router
+from app.routers.payslips import router as payslips_router
 
-# Import utils for ICS-håndtering
-from app.utils.ics_import import fetch_ics, ical_to_shifts
-
-# Import services (OCR, Document og Parser)
-from app.services.ocr_service import OCRService
-from app.services.document_processor import DocumentProcessor
-from app.services.parser_service import ParserService
+# Import services (OCR/LLM-eksekvering og upload-kø)
+from app.services.executor import pipeline_executor
+from app.services.job_queue import upload_queue
+from app.services.ics_cache import ics_cache
+from app.services.http_client import http_client
+from app.services.ics_refresher import ics_refresher
+from app.utils.pagination import MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, to_naive_utc
 
 # Pydantic schemata
 from pydantic import BaseModel, EmailStr, Field
 from app.schemas import ProfileRead, UserBase as UserBaseSchema, UserCreate as UserCreateSchema, UserRead as UserReadSchema
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Indlæs OCR-modellerne én gang ved opstart i stedet for pr. upload,
+    # og kør OCR/LLM i dedikerede puljer uden for event loop'et
+    pipeline_executor.start()
+    # Én HTTP-klient med connection-pulje til alle udgående kalenderkald
+    await http_client.start()
+    await upload_queue.start()
+    # Hold brugernes kalenderfeeds opdateret i baggrunden
+    if settings.ICS_REFRESH_ENABLED:
+        await ics_refresher.start()
+    yield
+    await ics_refresher.stop()
+    await upload_queue.stop()
+    await http_client.close()
+    await pipeline_executor.shutdown()
+
 # --- NYT ENDPOINT --- #
-app = FastAPI(title=settings.PROJECT_NAME)
+app = FastAPI(title=settings.PROJECT_NAME, lifespan=lifespan)
 
 # Sæt logging niveau til DEBUG
 logging.basicConfig(level=logging.DEBUG)
@@ -67,6 +87,7 @@ app.add_middleware(
     allow_credentials=False,  # Since we're not using credentials
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 # ---------- Root & health ---------- #
@@ -143,7 +164,22 @@ async def get_user(user_id: str, db: AsyncSession = Depends(get_db)):
         raise HTTPException(500, f"Kunne ikke hente bruger: {e}")
 
 @app.get("/api/v1/users/{user_id}/shifts")
-async def get_user_shifts(user_id: str, db: AsyncSession = Depends(get_db)):
+async def get_user_shifts(
+    user_id: str,
+    response: Response,
+    date_from: Optional[datetime] = Query(None, alias="from"),
+    date_to: Optional[datetime] = Query(None, alias="to"),
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Brugerens vagter fra ICS-feed'et, sorteret efter starttidspunkt.
+
+    `from`/`to` begrænser til vagter der starter i [from, to) (tidspunkter uden
+    tidszone tages som UTC). Med `limit` pagineres der: cursoren til næste side
+    står i headeren X-Next-Cursor og sendes tilbage som `cursor`.
+    """
     print(f"DEBUG: get_user_shifts kaldt for bruger {user_id}", file=sys.stderr)
     try:
         # Eksplicit specificere kolonner
@@ -179,28 +215,23 @@ async def get_user_shifts(user_id: str, db: AsyncSession = Depends(get_db)):
                  "end": (now + timedelta(days=3, hours=8)).isoformat()}
             ]
 
-        print(f"DEBUG: Kalder fetch_ics med URL: {user.ics_url}", file=sys.stderr)
-        logging.info(f"Henter ICS-data for {user_id} fra {user.ics_url}")
-        
-        # For at sikre at logning fungerer korrekt
-        print(f"DEBUGGING: Forsøger at hente ICS fra URL: {user.ics_url}")
-        
-        # Hent ICS data med vores opdaterede funktion
-        ics_data = await fetch_ics(user.ics_url)
-        
-        # Log resultatet
-        if ics_data:
-            print(f"DEBUG: ICS data hentet succesfuldt. Længde: {len(ics_data)} bytes", file=sys.stderr)
-            print(f"DEBUGGING: ICS data hentet succesfuldt, længde: {len(ics_data)} bytes")
-            logging.info(f"ICS-data hentet, {len(ics_data)} bytes")
-        else:
+        # Vagterne kommer fra ICS-cachen; med baggrundsopdatering læses de altid derfra
+        # (netværket rammes kun hvis brugeren endnu ikke er hentet)
+        logging.info(f"Henter vagter for {user_id} fra {user.ics_url}")
+        window = await ics_cache.get_window(
+            user.id,
+            user.ics_url,
+            start=to_naive_utc(date_from),
+            end=to_naive_utc(date_to),
+            after=decode_cursor(cursor, str) if cursor else None,
+            limit=limit,
+            allow_stale=settings.ICS_REFRESH_ENABLED,
+        )
+
+        if window is None:
             print(f"DEBUG: Kunne ikke hente ICS data fra {user.ics_url}", file=sys.stderr)
-            print("DEBUGGING: Kunne ikke hente ICS data, ics_data er None")
             logging.error(f"Kunne ikke hente ICS fra {user.ics_url}, data er None")
             
-            # Test direkte HTTP adgang til URL for at se om den er tilgængelig
-            print(f"DEBUG: Tester direkte HTTP adgang til URL: {user.ics_url}", file=sys.stderr)
-            
             # Returnér dummy-data i stedet for at fejle
             now = datetime.now()
             return [
@@ -210,31 +241,11 @@ async def get_user_shifts(user_id: str, db: AsyncSession = Depends(get_db)):
                  "end": (now + timedelta(hours=1)).isoformat()},
             ]
 
-        try:
-            print(f"DEBUG: Kalder ical_to_shifts med {len(ics_data)} bytes data", file=sys.stderr)
-            shifts = await ical_to_shifts(ics_data)
-            print(f"DEBUG: ical_to_shifts returnerede {len(shifts)} vagter", file=sys.stderr)
-            print(f"DEBUGGING: Konverterede {len(shifts)} vagter fra ICS data")
-            
-            # Gem debug data
-            debug_path = os.path.join(os.path.dirname(__file__), "calendar_data_debug.json")
-            with open(debug_path, "w", encoding="utf-8") as f:
-                json.dump(shifts, f, ensure_ascii=False, indent=2)
-                
-            return shifts
-        except Exception as parse_error:
-            print(f"DEBUG: Fejl ved parsing af ICS data: {parse_error}", file=sys.stderr)
-            logging.error(f"Fejl ved parsing af ICS data: {parse_error}")
-            print(f"DEBUGGING: Fejl ved parsing af ICS data: {parse_error}")
-            # Returnér fejlbesked som en vagt
-            now = datetime.now()
-            return [
-                {"id": "parse-error",
-                 "title": f"ERROR: Kunne ikke parse kalenderdata: {str(parse_error)}",
-                 "start": now.isoformat(),
-                 "end": (now + timedelta(hours=1)).isoformat()},
-            ]
-            
+        shifts, next_key = window
+        if next_key is not None:
+            response.headers[NEXT_CURSOR_HEADER] = encode_cursor(*next_key)
+        logging.debug(f"{len(shifts)} vagter for bruger {user_id}")
+        return shifts
     except HTTPException:
         raise
     except Exception as e:
@@ -246,6 +257,8 @@ async def get_user_shifts(user_id: str, db: AsyncSession = Depends(get_db)):
 # Inkluder routers (efter de specifikke ruter for at undgå konflikter)
 app.include_router(users_router)
 app.include_router(shifts_router)
+app.include_router(upload_router)
+app.include_router(payslips_router)
 
 # ---------- DB‐CRUD endpoints ---------- #
 @app.get("/api/v1/db/users", response_model=List[UserReadSchema])
@@ -312,124 +325,3 @@ async def get_user_by_id(user_id: int, db: AsyncSession = Depends(get_db)):
     except Exception as e:
         logging.error(f"Fejl ved hentning af DB-bruger: {e}")
         raise HTTPException(500, f"Kunne ikke hente bruger: {e}")
-
-# ---------- Upload-endpoint for lønsedler ---------- #
-@app.post("/api/v1/upload")
-async def upload_payslip(
-    file: UploadFile = File(...),
-    user_id: str = Form(...),
-    db: AsyncSession = Depends(get_db)
-):
-    try:
-        logging.info(f"Upload-request modtaget for bruger {user_id}")
-        print(f"Upload-request modtaget for bruger {user_id} med fil {file.filename}")
-        
-        # Validér at filen er i et acceptabelt format
-        DocumentProcessor.validate_file(file)
-        print(f"Filformat valideret: {file.content_type}")
-        
-        # Gem filen midlertidigt
-        filepath = await DocumentProcessor.save_temp_file(file)
-        logging.info(f"Fil midlertidigt gemt som: {filepath}")
-        print(f"Fil midlertidigt gemt som: {filepath}")
-        
-        # Søg efter bruger i databasen
-        stmt = sql_select(
-            User.id,
-            User.username,
-            User.full_name
-        ).where(User.username == user_id)
-        result = await db.execute(stmt)
-        user = result.first()
-        
-        if not user:
-            logging.warning(f"Bruger {user_id} ikke fundet")
-            raise HTTPException(status_code=404, detail=f"Bruger {user_id} ikke fundet")
-        
-        print(f"Bruger fundet: {user.full_name}")
-        
-        # Initialiser OCR Service
-        ocr_service = OCRService()
-        print("OCR Service initialiseret")
-        
-        # Udfør OCR på dokumentet
-        logging.info(f"Starter OCR-processering af fil {filepath}")
-        print(f"Starter OCR-processering af fil {filepath}")
-        extracted_text = ocr_service.process_document(filepath)
-        logging.info(f"OCR-processering færdig, {len(extracted_text)} tegn ekstraheret")
-        print(f"OCR-processering færdig, {len(extracted_text)} tegn ekstraheret")
-        
-        # Gem OCR output til en fil vi kan inspicere
-        output_path = os.path.join(os.path.dirname(filepath), f"ocr_output_{os.path.basename(filepath)}.txt")
-        with open(output_path, "w", encoding="utf-8") as f:
-            f.write(extracted_text)
-        print(f"OCR output gemt til: {output_path}")
-
-        # Parser lønsedlen med Mistral LLM
-        print("Initialiserer parser service...")
-        parser_service = ParserService()
-        print("Kalder Mistral API for at analysere lønseddel...")
-        try:
-            parsed_data = parser_service.parse_payslip(extracted_text)
-            print(f"Parsing færdig, fik {len(str(parsed_data))} bytes data")
-            
-            # Gem det parsede resultat til en fil
-            parsed_path = os.path.join(os.path.dirname(filepath), f"parsed_output_{os.path.basename(filepath)}.json")
-            with open(parsed_path, "w", encoding="utf-8") as f:
-                json.dump(parsed_data, f, ensure_ascii=False, indent=2)
-            print(f"Parsed output gemt til: {parsed_path}")
-            
-            # Brug de parsede data i stedet for dummy data
-            dummy_payslip_data = {
-                "bruttoløn": parsed_data.get("bruttolon", {}).get("beløb", 25000.0),
-                "nettoløn": parsed_data.get("løn", {}).get("netto_udbetalt", 16500.0),
-                "a_skat": parsed_data.get("a_skat", {}).get("beløb", 5000.0),
-                "am_bidrag": parsed_data.get("am_bidrag", {}).get("beløb", 2000.0),
-                "pension": parsed_data.get("pension", {}).get("samlet_pensionsbidrag", 1500.0),
-                "arbejdstimer": len(parsed_data.get("arbejdstimer", [])),
-                "arbejdsgiver": parsed_data.get("metadata", {}).get("arbejdsplads", "Bispebjerg og Frederiksberg Hospital"),
-                "medarbejder": parsed_data.get("metadata", {}).get("navn", user.full_name),
-                "løndato": parsed_data.get("metadata", {}).get("periode", "05/2024"),
-                "parsed_data": parsed_data  # Inkluder alt det parsede data
-            }
-        except Exception as parser_error:
-            print(f"Fejl under parsing: {str(parser_error)}")
-            logging.error(f"Parsing fejlede: {str(parser_error)}", exc_info=True)
-            # Fortsæt med dummy data hvis parsing fejler
-            dummy_payslip_data = {
-                "bruttoløn": 25000.0,
-                "nettoløn": 16500.0,
-                "a_skat": 5000.0,
-                "am_bidrag": 2000.0,
-                "pension": 1500.0,
-                "arbejdstimer": 160,
-                "arbejdsgiver": "Bispebjerg og Frederiksberg Hospital",
-                "medarbejder": user.full_name,
-                "løndato": "05/2024",
-                "extracted_text": extracted_text[:1000] + "..."  # Første 1000 tegn
-            }
-        
-        # Her ville vi normalt kalde en parser service for at strukturere data
-        # men for nu returnerer vi dummy data i det forventede format
-        result = {
-            "status": "success",
-            "message": "Lønseddel modtaget og behandlet",
-            "valid": True,
-            "issues": [],
-            "payslip_data": dummy_payslip_data,
-            "extracted_text_file": output_path,
-            "extracted_text": extracted_text[:3000] + "...",  # Første 3000 tegn
-            "user": user.full_name,
-            "filename": file.filename,
-            "timestamp": datetime.now().isoformat()
-        }
-        
-        print(f"Behandling færdig, returnerer resultat")
-        return result
-    
-    except Exception as e:
-        logging.error(f"Fejl under upload: {str(e)}", exc_info=True)
-        print(f"FEJL under upload: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
-
-# Upload-endpoint tilføjes senere, når afhængigheder er på plads
@@ -0,0 +1,120 @@
+from sqlalchemy import Column, Integer, String, Date, Float, ForeignKey, DateTime, Boolean, Index, UniqueConstraint
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import relationship
+from app.db import Base
+from datetime import datetime
+
+class User(Base):
+    __tablename__ = "users"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    username = Column(String, unique=True, index=True, nullable=False)
+    full_name = Column(String, nullable=False)
+    phone = Column(String, nullable=True)
+    ics_url = Column(String, nullable=True)
+    workplace = Column(String, nullable=True)
+    is_active = Column(Boolean, default=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    payslips = relationship("Payslip", back_populates="user")
+    shifts = relationship("Shift", back_populates="user")
+
+class Payslip(Base):
+    __tablename__ = "payslips"
+    __table_args__ = (
+        # Samme fil uploadet igen af samme bruger opdaterer rækken
+        UniqueConstraint("user_id", "content_hash", name="uq_payslips_user_content_hash"),
+        Index("ix_payslips_user_id_date", "user_id", "date"),
+        Index("ix_payslips_parsed_data", "parsed_data", postgresql_using="gin"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    date = Column(Date, nullable=False)
+    work_hours = Column(Float)
+    gross_salary = Column(Float)
+    deductions_total = Column(Float)
+    net_salary = Column(Float)
+    file_path = Column(String)
+    # Hele det parsede resultat fra OCR/LLM-pipelinen
+    parsed_data = Column(JSONB, nullable=True)
+    content_hash = Column(String(64), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    user = relationship("User", back_populates="payslips")
+
+class Shift(Base):
+    __tablename__ = "shifts"
+    __table_args__ = (
+        # Vagter fra ICS-feeds synkroniseres på begivenhedens UID
+        UniqueConstraint("user_id", "uid", name="uq_shifts_user_uid"),
+        # Tidsvinduer og keyset-paginering på brugerens vagter
+        Index("ix_shifts_user_id_start_time", "user_id", "start_time"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    date = Column(Date, nullable=False)
+    start_time = Column(DateTime)
+    end_time = Column(DateTime)
+    hours = Column(Float)
+    title = Column(String, nullable=False, default="Vagt")
+    # UID fra ICS-feed'et og hash af vagtens indhold (None for manuelt oprettede vagter)
+    uid = Column(String, nullable=True)
+    content_hash = Column(String(64), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    user = relationship("User", back_populates="shifts")
+
+class UploadJob(Base):
+    __tablename__ = "upload_jobs"
+    
+    id = Column(String(36), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    filename = Column(String)
+    file_path = Column(String)
+    content_hash = Column(String(64), nullable=True, index=True)
+    # Fælles id for dokumenter uploadet i samme batch (None for enkelt-uploads)
+    batch_id = Column(String(36), nullable=True, index=True)
+    status = Column(String, nullable=False, default="queued", index=True)
+    error = Column(String, nullable=True)
+    result = Column(JSONB, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    saved_at = Column(DateTime, nullable=True)
+    started_at = Column(DateTime, nullable=True)
+    ocr_done_at = Column(DateTime, nullable=True)
+    parsed_at = Column(DateTime, nullable=True)
+    validated_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+class ResultCacheEntry(Base):
+    __tablename__ = "result_cache"
+    __table_args__ = (
+        UniqueConstraint("namespace", "cache_key", name="uq_result_cache_namespace_key"),
+        Index("ix_result_cache_namespace_last_accessed", "namespace", "last_accessed_at"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    namespace = Column(String, nullable=False)
+    cache_key = Column(String, nullable=False)
+    value = Column(JSONB, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_accessed_at = Column(DateTime, default=datetime.utcnow)
+    hits = Column(Integer, default=0)
+
+class LayoutTemplate(Base):
+    __tablename__ = "layout_templates"
+    __table_args__ = (
+        # Én skabelon pr. (layout, signatur); en bucket kan rumme flere skabeloner
+        UniqueConstraint("layout_id", "signature_key", name="uq_layout_templates_layout_signature"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    bucket_key = Column(String(16), nullable=False, index=True)
+    signature_key = Column(String(16), nullable=False)
+    layout_id = Column(String, nullable=False, index=True)
+    employer = Column(String, nullable=True)
+    signature = Column(JSONB, nullable=False)
+    confirmations = Column(Integer, default=1)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
@@ -1,7 +1,10 @@
 from fastapi import APIRouter, HTTPException
-import httpx
+import asyncio
+import aiohttp
 from urllib.parse import unquote
 
+from app.services.http_client import http_client
+
 router = APIRouter(prefix="/api/v1/calendar")
 
 @router.get("/proxy")
@@ -11,17 +14,16 @@ async def proxy_calendar(url: str):
         # Decode URL hvis den er encoded
         decoded_url = unquote(url)
         
-        async with httpx.AsyncClient() as client:
-            response = await client.get(decoded_url)
+        async with http_client.session.get(decoded_url) as response:
+            content = await response.text()
             
-            if response.status_code != 200:
+            if response.status != 200:
                 raise HTTPException(
-                    status_code=response.status_code,
-                    detail=f"Failed to fetch calendar data: {response.text}"
+                    status_code=response.status,
+                    detail=f"Failed to fetch calendar data: {content}"
                 )
             
             # Verificer at det er ICS data
-            content = response.text
             if not content.startswith("BEGIN:VCALENDAR"):
                 raise HTTPException(
                     status_code=400,
@@ -30,8 +32,8 @@ async def proxy_calendar(url: str):
             
             return content
             
-    except httpx.RequestError as e:
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
         raise HTTPException(
             status_code=500,
             detail=f"Error fetching calendar data: {str(e)}"
-        ) 
\ No newline at end of file
+        )
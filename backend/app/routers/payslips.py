@@ -0,0 +1,70 @@
+from datetime import date
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select as sql_select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db import get_db
+from app.models import Payslip, User
+from app.schemas import PayslipRead
+
+router = APIRouter(prefix="/api/v1/payslips", tags=["payslips"])
+
+# Kolonnerne til historik-listen (uden det fulde parsede resultat)
+SUMMARY_COLUMNS = (
+    Payslip.id,
+    Payslip.user_id,
+    Payslip.date,
+    Payslip.work_hours,
+    Payslip.gross_salary,
+    Payslip.deductions_total,
+    Payslip.net_salary,
+    Payslip.file_path,
+    Payslip.content_hash,
+    Payslip.created_at,
+)
+
+
+@router.get("", response_model=List[PayslipRead])
+async def list_payslips(
+    user_id: str,
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    employer: Optional[str] = None,
+    include_data: bool = False,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Lønseddel-historik for en bruger, nyeste først.
+
+    Filtrerer på lønperiodens dato (indeks på (user_id, date)) og eventuelt på
+    arbejdsgiver i det parsede resultat (GIN-indeks på parsed_data). Det fulde
+    parsede resultat tages kun med når `include_data` er sat.
+    """
+    columns = (Payslip,) if include_data else SUMMARY_COLUMNS
+    stmt = (
+        sql_select(*columns)
+        .join(User, User.id == Payslip.user_id)
+        .where(User.username == user_id)
+        .order_by(Payslip.date.desc(), Payslip.id.desc())
+    )
+    if date_from:
+        stmt = stmt.where(Payslip.date >= date_from)
+    if date_to:
+        stmt = stmt.where(Payslip.date <= date_to)
+    if employer:
+        stmt = stmt.where(Payslip.parsed_data.contains({"metadata": {"arbejdsplads": employer}}))
+
+    res = await db.execute(stmt)
+    return res.scalars().all() if include_data else res.all()
+
+
+@router.get("/{payslip_id}", response_model=PayslipRead)
+async def get_payslip(payslip_id: int, db: AsyncSession = Depends(get_db)):
+    """Én lønseddel inklusive det fulde parsede resultat."""
+    res = await db.execute(sql_select(Payslip).where(Payslip.id == payslip_id))
+    payslip = res.scalar_one_or_none()
+    if not payslip:
+        raise HTTPException(404, f"Lønseddel {payslip_id} ikke fundet")
+    return payslip
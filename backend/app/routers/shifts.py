@@ -1,12 +1,17 @@
-from fastapi import APIRouter, Depends, status
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import select as sql_select
+from sqlalchemy import or_, select as sql_select
 
 from app.db import get_db                      # ← rettet
 from app.models import Shift                   # ← rettet
 from app.schemas import ShiftCreate, ShiftRead, ICSImport
+from app.services.shift_sync import shift_sync
 from app.utils.ics_import import fetch_ics, ical_to_shifts
+from app.utils.pagination import MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, to_naive_utc
 # ... resten uændret
 
 router = APIRouter(prefix="/api/v1/shifts", tags=["shifts"])
@@ -20,7 +25,23 @@ async def add_shift(payload: ShiftCreate, db: AsyncSession = Depends(get_db)):
     return new
 
 @router.get("/{user_id}", response_model=list[ShiftRead])
-async def list_shifts(user_id: int, db: AsyncSession = Depends(get_db)):
+async def list_shifts(
+    user_id: int,
+    response: Response,
+    date_from: Optional[datetime] = Query(None, alias="from"),
+    date_to: Optional[datetime] = Query(None, alias="to"),
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Brugerens gemte vagter sorteret efter starttidspunkt.
+
+    `from`/`to` begrænser til vagter der starter i [from, to) (tidspunkter uden
+    tidszone tages som UTC); indekset på (user_id, start_time) gør at kun
+    vinduet læses. Med `limit` pagineres der på (start_time, id): cursoren til
+    næste side står i headeren X-Next-Cursor og sendes tilbage som `cursor`.
+    """
     # Eksplicit specificere kolonner
     stmt = sql_select(
         Shift.id,
@@ -30,16 +51,41 @@ async def list_shifts(user_id: int, db: AsyncSession = Depends(get_db)):
         Shift.end_time,
         Shift.hours,
         Shift.title,
+        Shift.uid,
         Shift.created_at
-    ).where(Shift.user_id == user_id)
+    ).where(Shift.user_id == user_id).order_by(Shift.start_time, Shift.id)
+    if date_from:
+        stmt = stmt.where(Shift.start_time >= to_naive_utc(date_from))
+    if date_to:
+        stmt = stmt.where(Shift.start_time < to_naive_utc(date_to))
+    if cursor:
+        after_start, after_id = decode_cursor(cursor, int)
+        # Udskrevet som interval + tie-break, så betingelsen kan bruge indekset
+        stmt = stmt.where(
+            Shift.start_time >= after_start,
+            or_(Shift.start_time > after_start, Shift.id > after_id),
+        )
+    if limit:
+        # Én ekstra række afslører om der er en næste side
+        stmt = stmt.limit(limit + 1)
+
     res = await db.execute(stmt)
-    return res.all()
+    rows = res.all()
+    if limit and len(rows) > limit:
+        rows = rows[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(rows[-1].start_time, rows[-1].id)
+    return rows
 
 @router.post("/import", status_code=201)
-async def import_ics(payload: ICSImport, user_id: int, db: AsyncSession = Depends(get_db)):
+async def import_ics(payload: ICSImport, user_id: int):
+    """
+    Importerer vagterne fra et ICS-feed for brugeren. Synkroniseringen er
+    inkrementel på begivenhedernes UID, så gentagne imports ikke giver dubletter:
+    kun nye og ændrede vagter skrives, og vagter der er fjernet fra feed'et slettes.
+    """
     ics_text = await fetch_ics(payload.ics_url)
-    shift_dicts = ical_to_shifts(ics_text, user_id)
-    shifts = [Shift(**d) for d in shift_dicts]
-    db.add_all(shifts)
-    await db.commit()
-    return {"imported": len(shifts)}
+    if ics_text is None:
+        raise HTTPException(502, f"Kunne ikke hente ICS fra {payload.ics_url}")
+    shift_dicts = await ical_to_shifts(ics_text)
+    counts = await shift_sync.sync(user_id, shift_dicts)
+    return {"imported": counts["inserted"] + counts["updated"], **counts}
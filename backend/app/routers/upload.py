@@ -0,0 +1,307 @@
+import asyncio
+import json
+import logging
+import uuid
+from typing import Any, Dict, List
+
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Request, UploadFile, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select as sql_select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db import get_db
+from app.models import User
+from app.config import settings
+from app.schemas import (
+    BatchDocument,
+    BatchMetrics,
+    LayoutConfirm,
+    LayoutTemplateRead,
+    UploadBatchRead,
+    UploadJobRead,
+    UploadJobStages,
+)
+from app.services.document_processor import DocumentProcessor
+from app.services.job_queue import TERMINAL_EVENTS, UNFINISHED_STATUSES, batch_metrics, upload_queue
+from app.services.layout_index import layout_index
+
+router = APIRouter(prefix="/api/v1/upload", tags=["upload"])
+
+# Interval for keep-alive kommentarer på SSE-forbindelser (sekunder)
+SSE_KEEPALIVE_SECONDS = 15
+
+
+def _job_to_read(job: Dict[str, Any]) -> UploadJobRead:
+    return UploadJobRead(
+        job_id=job["id"],
+        status=job["status"],
+        filename=job.get("filename"),
+        error=job.get("error"),
+        created_at=job.get("created_at"),
+        started_at=job.get("started_at"),
+        finished_at=job.get("finished_at"),
+        stages=UploadJobStages(
+            saved=job.get("saved_at"),
+            ocr_done=job.get("ocr_done_at"),
+            parsed=job.get("parsed_at"),
+            validated=job.get("validated_at"),
+        ),
+        result=job.get("result"),
+    )
+
+
+def _batch_to_read(batch_id: str, jobs: List[Dict[str, Any]]) -> UploadBatchRead:
+    return UploadBatchRead(
+        batch_id=batch_id,
+        documents=[
+            BatchDocument(
+                filename=job.get("filename") or "",
+                status=job["status"],
+                job_id=job["id"],
+                error=job.get("error"),
+                result=job.get("result"),
+            )
+            for job in jobs
+        ],
+        metrics=BatchMetrics(**batch_metrics(jobs)),
+    )
+
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data), ensure_ascii=False)}\n\n"
+
+
+async def _relay_events(request: Request, events: "asyncio.Queue[Dict[str, Any]]"):
+    """Videresender events som SSE indtil et afsluttende event, med keep-alive imellem."""
+    while not await request.is_disconnected():
+        try:
+            message = await asyncio.wait_for(events.get(), timeout=SSE_KEEPALIVE_SECONDS)
+        except asyncio.TimeoutError:
+            yield ": keep-alive\n\n"
+            continue
+        yield _sse(message["event"], message["data"])
+        if message["event"] in TERMINAL_EVENTS:
+            return
+
+
+async def _get_user_id(db: AsyncSession, user_id: str) -> int:
+    result = await db.execute(sql_select(User.id).where(User.username == user_id))
+    db_user_id = result.scalar_one_or_none()
+    if db_user_id is None:
+        logging.warning(f"Bruger {user_id} ikke fundet")
+        raise HTTPException(status_code=404, detail=f"Bruger {user_id} ikke fundet")
+    return db_user_id
+
+
+@router.post("", response_model=UploadJobRead, status_code=status.HTTP_202_ACCEPTED)
+async def upload_payslip(
+    file: UploadFile = File(...),
+    user_id: str = Form(...),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Modtager en lønseddel og sætter den i kø til behandling.
+    Returnerer straks et job-id, som kan polles via GET /api/v1/upload/{job_id}.
+    """
+    logging.info(f"Upload-request modtaget for bruger {user_id}")
+
+    # Validér filens format (ud fra indholdet) og størrelse
+    file_type = await DocumentProcessor.validate_file(file)
+
+    # Søg efter bruger i databasen
+    db_user_id = await _get_user_id(db, user_id)
+
+    try:
+        # Gem filen midlertidigt
+        filepath, content_hash = await DocumentProcessor.save_temp_file(file, file_type)
+        logging.info(f"Fil midlertidigt gemt som: {filepath} (sha256 {content_hash})")
+
+        job = await upload_queue.submit(db_user_id, file.filename, filepath, content_hash)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Fejl under upload: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+    logging.info(f"Upload-job {job['id']} oprettet for bruger {user_id}")
+    return _job_to_read(job)
+
+
+@router.post("/batch", response_model=UploadBatchRead, status_code=status.HTTP_202_ACCEPTED)
+async def upload_payslip_batch(
+    files: List[UploadFile] = File(...),
+    user_id: str = Form(...),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Modtager flere lønsedler på én gang - som flere filer og/eller ZIP-filer -
+    og sætter hvert dokument i kø som sit eget upload-job under et fælles batch-id.
+
+    Dokumenter med samme indhold (SHA-256) behandles kun én gang; dubletter og
+    afviste filer står i svaret men sættes ikke i kø. Resultaterne kan streames
+    via GET /api/v1/upload/batch/{batch_id}/events efterhånden som de bliver færdige.
+    """
+    logging.info(f"Batch-upload modtaget for bruger {user_id} ({len(files)} filer)")
+    db_user_id = await _get_user_id(db, user_id)
+
+    batch_id = str(uuid.uuid4())
+    documents: List[BatchDocument] = []
+    queued_by_hash: Dict[str, str] = {}
+    try:
+        for file in files:
+            for saved in await DocumentProcessor.save_batch_file(file, settings.BATCH_MAX_FILES):
+                filename = saved["filename"] or ""
+                if "error" in saved:
+                    documents.append(BatchDocument(filename=filename, status="rejected", error=saved["error"]))
+                    continue
+
+                content_hash = saved["content_hash"]
+                if content_hash in queued_by_hash:
+                    DocumentProcessor.remove_temp_file(saved["filepath"])
+                    documents.append(BatchDocument(
+                        filename=filename, status="duplicate", duplicate_of=queued_by_hash[content_hash]
+                    ))
+                    continue
+
+                if len(queued_by_hash) >= settings.BATCH_MAX_FILES:
+                    DocumentProcessor.remove_temp_file(saved["filepath"])
+                    documents.append(BatchDocument(
+                        filename=filename,
+                        status="rejected",
+                        error=f"For mange filer i batchen (maks. {settings.BATCH_MAX_FILES})",
+                    ))
+                    continue
+
+                job = await upload_queue.submit(
+                    db_user_id, filename, saved["filepath"], content_hash, batch_id=batch_id
+                )
+                queued_by_hash[content_hash] = job["id"]
+                documents.append(BatchDocument(filename=filename, status=job["status"], job_id=job["id"]))
+    except Exception as e:
+        logging.error(f"Fejl under batch-upload: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        # Alle filer er sat i kø - først nu kan batchen meldes færdig
+        await upload_queue.seal_batch(batch_id)
+
+    if not queued_by_hash:
+        raise HTTPException(status_code=400, detail="Ingen gyldige dokumenter i batchen")
+
+    logging.info(
+        f"Upload-batch {batch_id} oprettet for bruger {user_id}: {len(queued_by_hash)} dokumenter i kø, "
+        f"{len(documents) - len(queued_by_hash)} dubletter/afviste"
+    )
+    jobs = await upload_queue.get_batch(batch_id)
+    return UploadBatchRead(batch_id=batch_id, documents=documents, metrics=BatchMetrics(**batch_metrics(jobs)))
+
+
+@router.get("/batch/{batch_id}", response_model=UploadBatchRead)
+async def get_upload_batch(batch_id: str):
+    """Returnerer status og resultat for hvert dokument i en batch samt gennemløbstal."""
+    jobs = await upload_queue.get_batch(batch_id)
+    if not jobs:
+        raise HTTPException(status_code=404, detail=f"Upload-batch {batch_id} ikke fundet")
+    return _batch_to_read(batch_id, jobs)
+
+
+@router.get("/batch/{batch_id}/events")
+async def stream_upload_batch_events(batch_id: str, request: Request):
+    """
+    Server-Sent Events for en batch.
+
+    Sender først batchens aktuelle status, derefter `document` for hvert dokument
+    når det er færdigt (med resultat eller fejl), og til sidst `completed` med
+    batchens gennemløbstal.
+    """
+    events = upload_queue.subscribe(batch_id)
+    jobs = await upload_queue.get_batch(batch_id)
+    if not jobs:
+        upload_queue.unsubscribe(batch_id, events)
+        raise HTTPException(status_code=404, detail=f"Upload-batch {batch_id} ikke fundet")
+
+    async def event_stream():
+        try:
+            batch = _batch_to_read(batch_id, jobs)
+            yield _sse("status", batch)
+            if not any(job["status"] in UNFINISHED_STATUSES for job in jobs):
+                yield _sse("completed", {"batch_id": batch_id, "metrics": batch.metrics})
+                return
+            async for message in _relay_events(request, events):
+                yield message
+        finally:
+            upload_queue.unsubscribe(batch_id, events)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/{job_id}", response_model=UploadJobRead)
+async def get_upload_job(job_id: str):
+    """Returnerer status, tidsstempler pr. trin og resultat for et upload-job."""
+    job = await upload_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Upload-job {job_id} ikke fundet")
+    return _job_to_read(job)
+
+
+@router.post("/{job_id}/layout", response_model=LayoutTemplateRead)
+async def confirm_upload_layout(job_id: str, payload: LayoutConfirm):
+    """
+    Bekræfter layoutet for et færdigt upload-job, så dokumentets layout-signatur
+    gemmes som skabelon i layout-indekset og genkendes ved næste upload.
+    """
+    job = await upload_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Upload-job {job_id} ikke fundet")
+    signature = ((job.get("result") or {}).get("layout") or {}).get("signature")
+    if job["status"] != "completed" or not signature or not any(signature):
+        raise HTTPException(status_code=409, detail=f"Upload-job {job_id} har ingen layout-signatur")
+
+    try:
+        template = await layout_index.confirm(signature, payload.layout_id, payload.employer)
+    except Exception as e:
+        logging.error(f"Fejl under bekræftelse af layout: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Kunne ikke gemme layout-skabelonen")
+    return LayoutTemplateRead(**template)
+
+
+@router.get("/{job_id}/events")
+async def stream_upload_job_events(job_id: str, request: Request):
+    """
+    Server-Sent Events for et upload-job.
+
+    Sender først jobbets aktuelle status, derefter `stage` når et trin er færdigt,
+    `section` for hver parset lønseddelsektion (metadata, løn, skat, ...) mens
+    LLM'en streamer, og til sidst `completed` med resultatet eller `failed`.
+    """
+    # Abonnér før opslaget, så ingen events går tabt imellem
+    events = upload_queue.subscribe(job_id)
+    job = await upload_queue.get(job_id)
+    if not job:
+        upload_queue.unsubscribe(job_id, events)
+        raise HTTPException(status_code=404, detail=f"Upload-job {job_id} ikke fundet")
+
+    async def event_stream():
+        try:
+            yield _sse("status", _job_to_read(job))
+            if job["status"] == "completed":
+                yield _sse("completed", job.get("result"))
+                return
+            if job["status"] == "failed":
+                yield _sse("failed", {"error": job.get("error")})
+                return
+
+            async for message in _relay_events(request, events):
+                yield message
+        finally:
+            upload_queue.unsubscribe(job_id, events)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from datetime import date, datetime
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
 # ---------- User ----------
 class UserBase(BaseModel):
@@ -43,6 +43,7 @@ class ShiftCreate(BaseModel):
 
 class ShiftRead(ShiftCreate):
     id: int
+    uid: Optional[str] = None
     created_at: datetime
 
     class Config:
@@ -58,6 +59,8 @@ class PayslipCreate(BaseModel):
     deductions_total: Optional[float] = None
     net_salary: Optional[float] = None
     file_path: Optional[str] = None
+    parsed_data: Optional[Dict[str, Any]] = None
+    content_hash: Optional[str] = None
 
 class PayslipRead(PayslipCreate):
     id: int
@@ -70,3 +73,56 @@ class PayslipRead(PayslipCreate):
 # ---------- ICS Import Payload ----------
 class ICSImport(BaseModel):
     ics_url: str
+
+# ---------- Upload Jobs ----------
+class UploadJobStages(BaseModel):
+    saved: Optional[datetime] = None
+    ocr_done: Optional[datetime] = None
+    parsed: Optional[datetime] = None
+    validated: Optional[datetime] = None
+
+class UploadJobRead(BaseModel):
+    job_id: str
+    status: str
+    filename: Optional[str] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    stages: UploadJobStages
+    result: Optional[Dict[str, Any]] = None
+
+class BatchDocument(BaseModel):
+    filename: str
+    # Jobbets status, eller "duplicate"/"rejected" for filer der ikke blev sat i kø
+    status: str
+    job_id: Optional[str] = None
+    duplicate_of: Optional[str] = None
+    error: Optional[str] = None
+    result: Optional[Dict[str, Any]] = None
+
+class BatchMetrics(BaseModel):
+    documents: int
+    completed: int
+    failed: int
+    pending: int
+    elapsed_seconds: float
+    documents_per_minute: Optional[float] = None
+    avg_ocr_seconds: Optional[float] = None
+    avg_parse_seconds: Optional[float] = None
+
+class UploadBatchRead(BaseModel):
+    batch_id: str
+    documents: List[BatchDocument]
+    metrics: BatchMetrics
+
+# ---------- Layout-skabeloner ----------
+class LayoutConfirm(BaseModel):
+    layout_id: str
+    employer: Optional[str] = None
+
+class LayoutTemplateRead(BaseModel):
+    bucket_key: str
+    layout_id: str
+    employer: Optional[str] = None
+    confirmations: int
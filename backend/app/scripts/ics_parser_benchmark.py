@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+"""
+Equivalence check and benchmark of the streaming ICS parser against icalendar.
+
+`iter_ics_shifts` must produce the same shifts as the original
+`Calendar.from_ical` + `walk()` implementation of `ical_to_shifts`, which is
+kept here as the reference. For synthetic roster feeds spanning several years
+(or the .ics files given on the command line) the script
+
+- compares the shifts from both parsers,
+- reports parse time (best of --runs) and peak memory (tracemalloc), and
+- times a one-month window with early stop on the chronological feed.
+
+Usage:
+    python app/scripts/ics_parser_benchmark.py [--years 1 3 5] [--runs 5] [feed.ics ...]
+"""
+import argparse
+import random
+import sys
+import timeit
+import tracemalloc
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import icalendar
+
+# Add parent directory to path to allow imports from app
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from app.utils.ics_stream import iter_ics_shifts
+
+VTIMEZONE = """BEGIN:VTIMEZONE
+TZID:Europe/Copenhagen
+BEGIN:DAYLIGHT
+TZOFFSETFROM:+0100
+TZOFFSETTO:+0200
+TZNAME:CEST
+DTSTART:19700329T020000
+RRULE:FREQ=YEARLY;BYMONTH=3;BYDAY=-1SU
+END:DAYLIGHT
+BEGIN:STANDARD
+TZOFFSETFROM:+0200
+TZOFFSETTO:+0100
+TZNAME:CET
+DTSTART:19701025T030000
+RRULE:FREQ=YEARLY;BYMONTH=10;BYDAY=-1SU
+END:STANDARD
+END:VTIMEZONE"""
+
+TITLES = ["Dagvagt", "Aftenvagt", "Nattevagt", "Weekendvagt; afd. 3", "Vagt, akut modtagelse", "Kursus\\, ekstern"]
+
+
+def fold(line: str) -> str:
+    """Fold a content line at 75 octets as RFC 5545 prescribes."""
+    data = line.encode("utf-8")
+    if len(data) <= 75:
+        return line
+    parts, start = [], 0
+    while start < len(data):
+        end = start + (75 if not parts else 74)
+        # Do not split UTF-8 sequences
+        while end < len(data) and (data[end] & 0xC0) == 0x80:
+            end -= 1
+        parts.append(data[start:end].decode("utf-8"))
+        start = end
+    return "\r\n ".join(parts)
+
+
+def synthetic_feed(years: int, seed: int = 0) -> str:
+    """A chronological roster feed with roughly five shifts a week over `years` years."""
+    rng = random.Random(seed)
+    lines = ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//Vagtplan//DA", VTIMEZONE]
+    day = date(2022, 1, 1)
+    for i in range(years * 365):
+        current = day + timedelta(days=i)
+        if rng.random() < 0.3:
+            continue
+        start_hour = rng.choice([7, 15, 23])
+        start = datetime.combine(current, datetime.min.time()) + timedelta(hours=start_hour)
+        end = start + timedelta(hours=rng.choice([8, 8, 8, 12]))
+        lines += [
+            "BEGIN:VEVENT",
+            f"UID:vagt-{i}-{rng.randrange(10 ** 8)}@vagtplan.example",
+            f"DTSTAMP:{start:%Y%m%dT%H%M%S}Z",
+            f"SUMMARY:{rng.choice(TITLES)}",
+            fold("DESCRIPTION:" + "Afdeling for akut modtagelse, sengeafsnit ø " * rng.randint(1, 4)),
+            "LOCATION:Hovedindgang\\, bygning 2",
+        ]
+        if rng.random() < 0.1:
+            # Some rostering systems export UTC times
+            offset = 2 if 3 < current.month < 11 else 1
+            lines += [
+                f"DTSTART:{start - timedelta(hours=offset):%Y%m%dT%H%M%S}Z",
+                f"DTEND:{end - timedelta(hours=offset):%Y%m%dT%H%M%S}Z",
+            ]
+        else:
+            lines += [
+                f"DTSTART;TZID=Europe/Copenhagen:{start:%Y%m%dT%H%M%S}",
+                f"DTEND;TZID=Europe/Copenhagen:{end:%Y%m%dT%H%M%S}",
+            ]
+        lines += ["BEGIN:VALARM", "ACTION:DISPLAY", "DESCRIPTION:Vagt om en time", "TRIGGER:-PT1H", "END:VALARM"]
+        lines.append("END:VEVENT")
+        if rng.random() < 0.05:
+            lines += [
+                "BEGIN:VEVENT",
+                f"UID:fri-{i}@vagtplan.example",
+                "SUMMARY:Fridag",
+                f"DTSTART;VALUE=DATE:{current:%Y%m%d}",
+                f"DTEND;VALUE=DATE:{current + timedelta(days=1):%Y%m%d}",
+                "END:VEVENT",
+            ]
+    lines.append("END:VCALENDAR")
+    return "\r\n".join(lines) + "\r\n"
+
+
+def reference_shifts(ical_data: str) -> list:
+    """The original icalendar-based ical_to_shifts (without logging)."""
+    calendar = icalendar.Calendar.from_ical(ical_data)
+    shifts = []
+    for component in calendar.walk():
+        if component.name == "VEVENT":
+            try:
+                start = component.get('dtstart').dt
+                end = component.get('dtend').dt
+                if isinstance(start, datetime) and isinstance(end, datetime):
+                    shifts.append({
+                        "id": str(component.get('uid')),
+                        "title": str(component.get('summary', 'Vagt')),
+                        "start": start.isoformat(),
+                        "end": end.isoformat()
+                    })
+            except Exception:
+                pass
+    return shifts
+
+
+def streaming_shifts(ical_data: str) -> list:
+    return list(iter_ics_shifts(ical_data))
+
+
+def peak_memory(func, ical_data: str) -> int:
+    tracemalloc.start()
+    try:
+        func(ical_data)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def compare(name: str, ical_data: str) -> int:
+    """Compare both parsers on one feed; returns the number of differing shifts."""
+    expected = reference_shifts(ical_data)
+    actual = streaming_shifts(ical_data)
+    differences = sum(1 for a, b in zip(expected, actual) if a != b) + abs(len(expected) - len(actual))
+    print(f"  {'ok' if not differences else 'FAILED':8} {name}: {len(actual)} shifts", end="")
+    print(f", {differences} differences" if differences else "")
+    for a, b in list((a, b) for a, b in zip(expected, actual) if a != b)[:3]:
+        print(f"    icalendar: {a}\n    streaming: {b}")
+    return differences
+
+
+def benchmark(name: str, ical_data: str, runs: int) -> None:
+    reference = min(timeit.repeat(lambda: reference_shifts(ical_data), number=1, repeat=runs))
+    streaming = min(timeit.repeat(lambda: streaming_shifts(ical_data), number=1, repeat=runs))
+    reference_peak = peak_memory(reference_shifts, ical_data)
+    streaming_peak = peak_memory(streaming_shifts, ical_data)
+    print(
+        f"{name:>14} {len(ical_data) / 1024:8.0f} {reference * 1000:10.1f} {streaming * 1000:10.1f} "
+        f"{reference / streaming:8.1f}x {reference_peak / 2 ** 20:10.2f} {streaming_peak / 2 ** 20:10.2f}"
+    )
+
+
+def benchmark_window(ical_data: str, runs: int) -> None:
+    """One month from the start of the feed, with and without stopping after the window."""
+    window = (datetime(2022, 3, 1), datetime(2022, 4, 1))
+    full = min(timeit.repeat(lambda: list(iter_ics_shifts(ical_data, *window)), number=1, repeat=runs))
+    early = min(timeit.repeat(
+        lambda: list(iter_ics_shifts(ical_data, *window, stop_after_window=True)), number=1, repeat=runs
+    ))
+    count = len(list(iter_ics_shifts(ical_data, *window, stop_after_window=True)))
+    print(f"\nOne-month window ({count} shifts): full scan {full * 1000:.1f} ms, early stop {early * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare and benchmark the streaming ICS parser against icalendar")
+    parser.add_argument("feeds", nargs="*", help="ICS files to use in addition to the synthetic feeds")
+    parser.add_argument("--years", type=int, nargs="+", default=[1, 3, 5], help="Synthetic feed lengths in years")
+    parser.add_argument("--runs", type=int, default=5, help="Timing repetitions per feed")
+    args = parser.parse_args()
+
+    feeds = [(f"{years} year(s)", synthetic_feed(years)) for years in args.years]
+    feeds += [(Path(path).name, Path(path).read_text(encoding="utf-8")) for path in args.feeds]
+
+    print("Equivalence with the icalendar implementation:")
+    failures = sum(compare(name, ical_data) for name, ical_data in feeds)
+
+    print(f"\n{'feed':>14} {'KiB':>8} {'ical ms':>10} {'stream ms':>10} {'speed-up':>9} {'ical MiB':>10} {'stream MiB':>10}")
+    for name, ical_data in feeds:
+        benchmark(name, ical_data, args.runs)
+    benchmark_window(feeds[-1][1] if not args.feeds else feeds[0][1], args.runs)
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""
+Check that JsonSectionStream emits every top-level section of a streamed LLM
+response, including responses with the comments and malformed numbers the
+full parse cleans with clean_json_string.
+
+The sample response is fed in chunks of every size from 1 to --max-chunk
+characters; each run must emit the same sections as parsing the whole
+response at once.
+
+Usage:
+    python app/scripts/json_stream_check.py [--max-chunk 16] [response.json ...]
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# Add parent directory to path to allow imports from app
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from app.services.json_stream import JsonSectionStream, clean_json_string
+
+SAMPLE = """```json
+{
+  // Metadata fra lønsedlens hoved - "navn" står øverst
+  "metadata": {
+    "navn": "Test Testesen", /* afdeling: "3" */
+    "periode": "01.05.2024 - 31.05.2024"
+  },
+  "løn": {"fast_løn_i_alt": 31.805.89, "netto_udbetalt": 21000.00,},
+  "arbejdstimer": [
+    {"dato": "01.05.24", "arbejdstid": "07:00-15:00", "timer": 8.00},
+    {"dato": "02.05.24", "arbejdstid": "15:00-23:00", "timer": 8.00},
+    // ... resten af arbejdstiderne
+  ],
+  "afdeling": "Akut/modtagelse",
+  "timer_i_alt": 16.00 // samlet
+}
+```"""
+
+
+def expected_sections(response: str) -> dict:
+    """The sections of the whole response, parsed as ParserService does."""
+    body = response[response.index("{"):response.rindex("}") + 1]
+    return json.loads(clean_json_string(body))
+
+
+def check(name: str, response: str, max_chunk: int) -> int:
+    """Stream the response in every chunk size; returns the number of failing chunk sizes."""
+    expected = expected_sections(response)
+    failures = 0
+    for size in range(1, max_chunk + 1):
+        stream = JsonSectionStream()
+        sections = {}
+        for start in range(0, len(response), size):
+            sections.update(stream.feed(response[start:start + size]))
+        if sections != expected or not stream.finished:
+            failures += 1
+            missing = sorted(set(expected) - set(sections))
+            wrong = sorted(key for key in sections if key in expected and sections[key] != expected[key])
+            print(f"  FAILED   {name}, chunk size {size}: missing {missing}, differing {wrong}")
+    if not failures:
+        print(f"  ok       {name}: {len(expected)} sections in chunk sizes 1-{max_chunk}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check incremental section parsing of streamed LLM responses")
+    parser.add_argument("responses", nargs="*", help="Raw LLM responses to check in addition to the sample")
+    parser.add_argument("--max-chunk", type=int, default=16, help="Largest chunk size to feed")
+    args = parser.parse_args()
+
+    responses = [("sample", SAMPLE)]
+    responses += [(Path(path).name, Path(path).read_text(encoding="utf-8")) for path in args.responses]
+
+    failures = sum(check(name, response, args.max_chunk) for name, response in responses)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+"""
+Benchmark of LLM extraction modes: one monolithic prompt vs. section-sharded prompts.
+
+Every OCR text (e.g. the `ocr_output_*.txt` files written by the upload pipeline)
+is parsed in both modes with the LLM cache and rule extraction disabled. The script reports tokens
+(from the API's usage info), number of requests, wall-clock time and how many
+leaf fields the two modes agree on.
+
+Usage:
+    python app/scripts/llm_extraction_benchmark.py <ocr_text_file_or_dir> [--runs 3]
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Add parent directory to path to allow imports from app
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from app.config import settings
+from app.services.parser_service import ParserService
+from app.services.payslip_prompts import split_ocr_sections
+
+MODES = ("single", "sharded")
+
+
+def flatten(data, prefix=""):
+    """Flatten nested dicts/lists to {path: value} for field-level comparison."""
+    if isinstance(data, dict):
+        items = {}
+        for key, value in data.items():
+            items.update(flatten(value, f"{prefix}.{key}" if prefix else key))
+        return items
+    if isinstance(data, list):
+        items = {}
+        for idx, value in enumerate(data):
+            items.update(flatten(value, f"{prefix}[{idx}]"))
+        return items
+    return {prefix: data}
+
+
+async def run_mode(service: ParserService, mode: str, ocr_text: str):
+    """Parse once in the given mode and return (result, seconds, usage delta)."""
+    settings.LLM_EXTRACTION_MODE = mode
+    before = dict(service.usage)
+    start = time.perf_counter()
+    result = await service.parse_payslip_async(ocr_text)
+    elapsed = time.perf_counter() - start
+    usage = {key: service.usage[key] - before[key] for key in before}
+    return result, elapsed, usage
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Compare monolithic and sharded LLM extraction")
+    parser.add_argument("path", help="OCR text file or directory with ocr_output_*.txt files")
+    parser.add_argument("--runs", type=int, default=1, help="Runs per mode and document")
+    args = parser.parse_args()
+
+    path = Path(args.path)
+    files = sorted(path.glob("*.txt")) if path.is_dir() else [path]
+    if not files:
+        print(f"No OCR text files found in {path}")
+        sys.exit(1)
+
+    # Measure the API, not the cache - and not rule extraction, which skips both
+    # LLM modes for known layouts
+    settings.LLM_CACHE_ENABLED = False
+    settings.RULE_EXTRACTION_ENABLED = False
+    service = ParserService()
+
+    totals = {mode: {"seconds": [], "prompt_tokens": 0, "completion_tokens": 0, "requests": 0} for mode in MODES}
+    try:
+        for file in files:
+            ocr_text = file.read_text(encoding="utf-8")
+            sections = split_ocr_sections(ocr_text)
+            print(f"\n{file.name}: {len(ocr_text)} chars, sections: {', '.join(sections) or 'none'}")
+
+            results = {}
+            for mode in MODES:
+                for _ in range(args.runs):
+                    result, elapsed, usage = await run_mode(service, mode, ocr_text)
+                    results[mode] = result
+                    totals[mode]["seconds"].append(elapsed)
+                    for key in ("prompt_tokens", "completion_tokens", "requests"):
+                        totals[mode][key] += usage[key]
+                    print(
+                        f"  {mode:8} {elapsed:7.2f}s  prompt {usage['prompt_tokens']:6}  "
+                        f"completion {usage['completion_tokens']:6}  requests {usage['requests']}"
+                    )
+
+            single, sharded = flatten(results["single"]), flatten(results["sharded"])
+            fields = set(single) | set(sharded)
+            agree = sum(1 for field in fields if single.get(field) == sharded.get(field))
+            print(f"  field agreement: {agree}/{len(fields)}")
+    finally:
+        await service.close()
+
+    print("\nTotals:")
+    for mode in MODES:
+        t = totals[mode]
+        print(
+            f"  {mode:8} median {statistics.median(t['seconds']):7.2f}s  "
+            f"prompt {t['prompt_tokens']:8}  completion {t['completion_tokens']:8}  requests {t['requests']}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+"""
+Accuracy-regression check for OCR inference backends.
+
+Runs every document in a reference corpus through a reference backend and a
+candidate backend (see OCR_BACKEND in app/config.py) and compares the formatted
+text by character error rate. If a document has an expected `<name>.txt` next
+to it, that text is used as the reference instead of the reference backend.
+
+Usage:
+    python app/scripts/ocr_backend_regression.py <corpus_dir> --backend torch_int8
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+from rapidfuzz.distance import Levenshtein
+
+# Add parent directory to path to allow imports from app
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from app.config import settings
+from app.services.ocr_pool import OCR_BACKENDS, build_predictor
+from app.services.ocr_service import OCRService
+
+DOCUMENT_EXTENSIONS = {".pdf", ".png", ".jpg", ".jpeg"}
+
+
+def run_backend(service: OCRService, path: Path):
+    """Run OCR on a document and return (text, seconds)."""
+    start = time.perf_counter()
+    text = service.process_document(str(path))
+    return text, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare OCR backends on a reference corpus")
+    parser.add_argument("corpus", help="Directory with reference payslips")
+    parser.add_argument("--backend", required=True, choices=OCR_BACKENDS, help="Backend to check")
+    parser.add_argument("--reference", default="torch", choices=OCR_BACKENDS, help="Reference backend")
+    parser.add_argument("--max-cer", type=float, default=0.02, help="Maximum allowed character error rate")
+    args = parser.parse_args()
+
+    # Keep the uploaded files and force real OCR so the models are what is measured
+    settings.DEBUG = True
+    settings.PDF_TEXT_LAYER_ENABLED = False
+
+    documents = sorted(p for p in Path(args.corpus).iterdir() if p.suffix.lower() in DOCUMENT_EXTENSIONS)
+    if not documents:
+        print(f"No documents found in {args.corpus}")
+        sys.exit(1)
+
+    print(f"Loading reference backend '{args.reference}' and candidate backend '{args.backend}'...")
+    reference = OCRService(model=build_predictor(args.reference))
+    candidate = OCRService(model=build_predictor(args.backend))
+
+    failures = 0
+    total_ref_time = 0.0
+    total_cand_time = 0.0
+    print(f"\n{'document':40} {'ref s':>8} {'cand s':>8} {'CER':>8}")
+    for path in documents:
+        expected_path = path.with_suffix(".txt")
+        if expected_path.exists():
+            expected = expected_path.read_text(encoding="utf-8")
+            ref_time = 0.0
+        else:
+            expected, ref_time = run_backend(reference, path)
+        text, cand_time = run_backend(candidate, path)
+
+        cer = Levenshtein.normalized_distance(expected, text)
+        total_ref_time += ref_time
+        total_cand_time += cand_time
+        flag = "" if cer <= args.max_cer else "  <-- REGRESSION"
+        failures += 1 if flag else 0
+        print(f"{path.name[:40]:40} {ref_time:8.2f} {cand_time:8.2f} {cer:8.4f}{flag}")
+
+    print(f"\nTotal time: reference {total_ref_time:.2f}s, candidate {total_cand_time:.2f}s")
+    if total_cand_time > 0 and total_ref_time > 0:
+        print(f"Speed-up: {total_ref_time / total_cand_time:.2f}x")
+    print(f"{failures} of {len(documents)} documents exceed CER {args.max_cer}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+"""
+Golden-file check and micro-benchmark of the OCR post-processor.
+
+`OCRService._post_process_payslip_data` must produce byte-identical output to
+the original pass-per-pattern implementation, which is kept here as the
+reference. The script
+
+- compares every `<name>.raw.txt` in the golden directory with its
+  `<name>.expected.txt` (use --update to regenerate the expected files from
+  the reference implementation),
+- optionally fuzzes both implementations with random payslip-like text, and
+- times both implementations on synthetic payslips of increasing size.
+
+Usage:
+    python app/scripts/ocr_postprocess_benchmark.py [--golden DIR] [--update] [--fuzz 10000] [--runs 50]
+"""
+import argparse
+import random
+import re
+import sys
+import timeit
+from pathlib import Path
+
+# Add parent directory to path to allow imports from app
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from app.services.ocr_service import OCRService
+
+GOLDEN_DIR = Path(__file__).parent / "golden" / "postprocess"
+SIZES = (50, 500, 2000)
+
+# Building blocks for the fuzzer; chosen to hit the edges of the number patterns
+FUZZ_TOKENS = [
+    "0", "5", "12", "123", "1234", "12345", "123456", "080498", "0075", "24.559", "1.751,08", ",5", ",41",
+    ".", ",", ":", "-", "–", " - ", "  -  ", " ", "  ", "   ", "\t", "\xa0", "\n", "\n\n", "\n\n\n", "\n \n",
+    "%", "5 %", "% ", "kr", "kr.", "kr.5", "DKK", "krone", "=", "a", "Z", "08:00", "8.00",
+    "Løn", "Løn\n", "ferie", "timer", "tillæg", "skat", "a-skat", "am-bidrag", "Period", "cpr", "fast løn",
+]
+
+
+def reference_post_process(text: str) -> str:
+    """The original implementation: one re.sub per pattern, compiled on every call."""
+    def format_numbers(match):
+        num = match.group(0)
+        return num.replace(" ", "").replace(",", ".")
+
+    processed = text
+
+    money_pattern = r'\b\d{1,3}(?:\.\d{3})*(?:,\d{1,2})?\s*(?:kr\.?|DKK)?\b'
+    processed = re.sub(money_pattern, format_numbers, processed)
+
+    pct_pattern = r'\b\d{1,2}(?:,\d{1,2})?\s*%'
+    processed = re.sub(pct_pattern, format_numbers, processed)
+
+    date_pattern = r'\b\d{1,2}[.-]\d{1,2}[.-]\d{2,4}\b'
+    processed = re.sub(date_pattern, lambda m: m.group(0).replace(" ", ""), processed)
+
+    cpr_pattern = r'\b\d{6}[-\s]?\d{4}\b'
+    processed = re.sub(cpr_pattern, lambda m: m.group(0).replace(" ", "-"), processed)
+
+    time_pattern = r'\b\d{1,2}[:\.]\d{2}\s*[-–]\s*\d{1,2}[:\.]\d{2}\b'
+    processed = re.sub(time_pattern, lambda m: m.group(0).replace(" ", "").replace(".", ":"), processed)
+
+    processed = re.sub(r' {2,}', ' ', processed)
+    processed = re.sub(r'\n{3,}', '\n\n', processed)
+
+    sections = {
+        r'(?i)(?:^|\n)(?:løn|period|name|cpr)': '\n### METADATA ###\n',
+        r'(?i)(?:^|\n)(?:grundløn|fast løn|tillæg)': '\n### LØN ###\n',
+        r'(?i)(?:^|\n)(?:ferie|feriepenge|ferietillæg)': '\n### FERIE ###\n',
+        r'(?i)(?:^|\n)(?:arbejdstid|timer|optælling)': '\n### TIMER ###\n',
+        r'(?i)(?:^|\n)(?:pension|samlet pensionsbidrag)': '\n### PENSION ###\n',
+        r'(?i)(?:^|\n)(?:skat|trækprocent|a-skat)': '\n### SKAT ###\n',
+        r'(?i)(?:^|\n)(?:arbejdsmarkedsbidrag|am-bidrag)': '\n### AM-BIDRAG ###\n',
+    }
+    for pattern, marker in sections.items():
+        processed = re.sub(pattern, lambda m: marker + m.group(0), processed, count=1)
+
+    return processed
+
+
+def synthetic_payslip(rows: int, seed: int = 0) -> str:
+    """A payslip header followed by `rows` timesheet lines, as the OCR formatter emits them."""
+    rng = random.Random(seed)
+    lines = [
+        "Lønseddel 09/2024", "Periode: 01.09.2024 - 30.09.2024", "080498 0075  Ernst Krohn", "Navn: Ernst Krohn",
+        "", "## LØN ##", "", "Grundløn trin 04 24.559,41 P", "Lukket afsnit/afd. PV 1.751,08 P",
+        "Weekendtillæg 100,00 kr.", "Fast løn i alt   27.477,38", "Arbejdsmarkedsbidrag 8 % 2.230,00",
+        "A-skat 41% 8.591,00 DKK", "Trækprocent 41", "", "", "", "",
+    ]
+    for _ in range(rows):
+        day = f"{rng.randint(1, 28):02d}.{rng.randint(1, 12):02d}.2024"
+        sep = rng.choice([":", "."])
+        dash = rng.choice(["-", " - ", "–"])
+        label = rng.choice(["Aftentillæg", "Ferietimer", "", "Nattillæg 12,5 %"])
+        lines.append(
+            f"{day} {rng.randint(6, 12):02d}{sep}00{dash}{rng.randint(13, 23):02d}{sep}30 "
+            f"{rng.randint(1, 9)},{rng.randint(0, 99):02d} {label}"
+        )
+        if rng.random() < 0.1:
+            lines.append(f"  Tillæg  {rng.randint(1, 999)}.{rng.randint(100, 999)},{rng.randint(0, 99):02d}  P")
+    lines += ["Ferie med løn 0,00", "Feriepenge 1.234,56", "Samlet pensionsbidrag 3.456,78", "Optælling af timer 160,33"]
+    return "\n".join(lines)
+
+
+def check_golden(service: OCRService, golden_dir: Path, update: bool) -> int:
+    """Compare (or with update: regenerate) the golden files; returns the number of failures."""
+    raw_files = sorted(golden_dir.glob("*.raw.txt"))
+    if not raw_files:
+        print(f"No golden files found in {golden_dir}")
+        return 1
+
+    failures = 0
+    for raw_path in raw_files:
+        expected_path = raw_path.with_name(raw_path.name.replace(".raw.txt", ".expected.txt"))
+        raw = raw_path.read_text(encoding="utf-8")
+        if update:
+            expected_path.write_text(reference_post_process(raw), encoding="utf-8")
+            print(f"  updated  {expected_path.name}")
+            continue
+
+        ok = service._post_process_payslip_data(raw) == expected_path.read_text(encoding="utf-8")
+        failures += 0 if ok else 1
+        print(f"  {'ok' if ok else 'FAILED':8} {raw_path.name}")
+    return failures
+
+
+def fuzz(service: OCRService, cases: int, seed: int) -> int:
+    """Run both implementations on random token strings; returns the number of mismatches."""
+    rng = random.Random(seed)
+    mismatches = 0
+    for _ in range(cases):
+        text = "".join(rng.choice(FUZZ_TOKENS) for _ in range(rng.randint(1, 40)))
+        if service._post_process_payslip_data(text) != reference_post_process(text):
+            mismatches += 1
+            if mismatches <= 5:
+                print(f"  mismatch: {text!r}")
+    print(f"  {mismatches} mismatches in {cases} cases")
+    return mismatches
+
+
+def benchmark(service: OCRService, runs: int) -> None:
+    print(f"\n{'rows':>6} {'chars':>8} {'reference ms':>13} {'compiled ms':>12} {'speed-up':>9}")
+    for rows in SIZES:
+        text = synthetic_payslip(rows)
+        reference = min(timeit.repeat(lambda: reference_post_process(text), number=1, repeat=runs))
+        compiled = min(timeit.repeat(lambda: service._post_process_payslip_data(text), number=1, repeat=runs))
+        print(f"{rows:6} {len(text):8} {reference * 1000:13.2f} {compiled * 1000:12.2f} {reference / compiled:8.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check and benchmark the OCR post-processor")
+    parser.add_argument("--golden", default=str(GOLDEN_DIR), help="Directory with *.raw.txt / *.expected.txt pairs")
+    parser.add_argument("--update", action="store_true", help="Regenerate expected files with the reference")
+    parser.add_argument("--fuzz", type=int, default=0, help="Number of random fuzz cases")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the fuzzer")
+    parser.add_argument("--runs", type=int, default=50, help="Timing repetitions per size")
+    args = parser.parse_args()
+
+    # The post-processor needs no OCR model
+    service = OCRService(model=object())
+
+    print(f"Golden files in {args.golden}:")
+    failures = check_golden(service, Path(args.golden), args.update)
+    if args.fuzz:
+        print("\nFuzzing against the reference implementation:")
+        failures += fuzz(service, args.fuzz, args.seed)
+    if not args.update:
+        benchmark(service, args.runs)
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,35 +1,187 @@
+import asyncio
 import os
 import uuid
+import hashlib
+import zipfile
+import zlib
 from fastapi import UploadFile, HTTPException
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 from app.config import settings
 
 class DocumentProcessor:
     ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg'}
+    CHUNK_SIZE = 64 * 1024
+    # Filtype ud fra de første bytes (magic bytes) - filnavnet kan ikke stoles på
+    FILE_SIGNATURES = {
+        b'%PDF-': 'pdf',
+        b'\x89PNG\r\n\x1a\n': 'png',
+        b'\xff\xd8\xff': 'jpg',
+    }
+    SNIFF_BYTES = 8
+    ZIP_SIGNATURE = b'PK\x03\x04'
     
     @staticmethod
-    def validate_file(file: UploadFile) -> bool:
-        """Validerer at filen er i et acceptabelt format."""
+    def detect_file_type(header: bytes) -> Optional[str]:
+        """Returnerer filtypen ('pdf', 'png' eller 'jpg') ud fra filens første bytes."""
+        for signature, file_type in DocumentProcessor.FILE_SIGNATURES.items():
+            if header.startswith(signature):
+                return file_type
+        return None
+    
+    @staticmethod
+    def _too_large(max_size: Optional[int] = None) -> HTTPException:
+        limit_mb = (max_size or settings.MAX_CONTENT_LENGTH) / (1024 * 1024)
+        return HTTPException(status_code=413, detail=f"Filen er for stor. Maksimal størrelse: {limit_mb:g} MB")
+    
+    @staticmethod
+    async def validate_file(file: UploadFile) -> str:
+        """
+        Validerer at filen er i et acceptabelt format og ikke er for stor.
+        Formatet afgøres af filens indhold (magic bytes), ikke af filnavnet;
+        den fundne filtype returneres.
+        """
         if not file.filename:
             raise HTTPException(status_code=400, detail="Ingen fil uploaded")
-            
-        ext = file.filename.split('.')[-1].lower()
-        if ext not in DocumentProcessor.ALLOWED_EXTENSIONS:
+        
+        # Afvis straks hvis størrelsen allerede er kendt
+        if file.size is not None and file.size > settings.MAX_CONTENT_LENGTH:
+            raise DocumentProcessor._too_large()
+        
+        header = await file.read(DocumentProcessor.SNIFF_BYTES)
+        await file.seek(0)
+        file_type = DocumentProcessor.detect_file_type(header)
+        if file_type is None:
             raise HTTPException(status_code=400, detail=f"Filformat ikke understøttet. Tilladt: {', '.join(DocumentProcessor.ALLOWED_EXTENSIONS)}")
-        return True
+        return file_type
     
     @staticmethod
-    async def save_temp_file(file: UploadFile) -> str:
-        """Gemmer filen midlertidigt og returnerer filstien."""
+    async def save_temp_file(
+        file: UploadFile, file_type: Optional[str] = None, max_size: Optional[int] = None
+    ) -> Tuple[str, str]:
+        """
+        Gemmer filen midlertidigt i bidder og returnerer (filsti, SHA-256 af indholdet).
+        Hashen beregnes mens filen streames, så den ikke skal læses igen, og der
+        holdes aldrig mere end én bid i hukommelsen. Overstiger filen
+        MAX_CONTENT_LENGTH (eller `max_size`), afbrydes der straks med 413, og den
+        delvise fil slettes.
+        """
+        max_size = max_size or settings.MAX_CONTENT_LENGTH
         temp_dir = settings.UPLOAD_FOLDER
         os.makedirs(temp_dir, exist_ok=True)
         
         file_id = str(uuid.uuid4())
-        ext = file.filename.split('.')[-1].lower()
+        ext = file_type or file.filename.split('.')[-1].lower()
         filepath = os.path.join(temp_dir, f"{file_id}.{ext}")
         
-        content = await file.read()
-        with open(filepath, "wb") as buffer:
-            buffer.write(content)
+        sha256 = hashlib.sha256()
+        size = 0
+        try:
+            with open(filepath, "wb") as buffer:
+                while True:
+                    chunk = await file.read(DocumentProcessor.CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > max_size:
+                        raise DocumentProcessor._too_large(max_size)
+                    sha256.update(chunk)
+                    buffer.write(chunk)
+        except BaseException:
+            # Efterlad ikke halve filer (heller ikke i DEBUG)
+            if os.path.exists(filepath):
+                os.remove(filepath)
+            raise
+        
+        return filepath, sha256.hexdigest()
+    
+    @staticmethod
+    async def save_batch_file(file: UploadFile, max_files: int) -> List[Dict[str, Any]]:
+        """
+        Gemmer en fil fra en batch-upload. En ZIP-fil pakkes ud til et dokument
+        pr. understøttet fil (højst `max_files`); ellers valideres og gemmes
+        filen som ved enkelt-upload.
+
+        Returnerer en liste af {"filename", "filepath", "content_hash"} - eller
+        {"filename", "error"} for filer der blev afvist.
+        """
+        header = await file.read(DocumentProcessor.SNIFF_BYTES)
+        await file.seek(0)
+        if not header.startswith(DocumentProcessor.ZIP_SIGNATURE):
+            try:
+                file_type = await DocumentProcessor.validate_file(file)
+                filepath, content_hash = await DocumentProcessor.save_temp_file(file, file_type)
+            except HTTPException as e:
+                return [{"filename": file.filename, "error": e.detail}]
+            return [{"filename": file.filename, "filepath": filepath, "content_hash": content_hash}]
+
+        try:
+            zip_path, _ = await DocumentProcessor.save_temp_file(
+                file, "zip", max_size=settings.MAX_CONTENT_LENGTH * max_files
+            )
+        except HTTPException as e:
+            return [{"filename": file.filename, "error": e.detail}]
+        try:
+            return await asyncio.to_thread(DocumentProcessor.extract_zip, zip_path, max_files)
+        finally:
+            os.remove(zip_path)
+    
+    @staticmethod
+    def extract_zip(zip_path: str, max_files: int) -> List[Dict[str, Any]]:
+        """
+        Pakker de understøttede dokumenter i en ZIP-fil ud i bidder (blokerende).
+        Hvert dokument begrænses til MAX_CONTENT_LENGTH ud fra de faktisk udpakkede
+        bytes, så en ZIP-bombe ikke kan fylde disken.
+        """
+        documents: List[Dict[str, Any]] = []
+        try:
+            archive = zipfile.ZipFile(zip_path)
+        except zipfile.BadZipFile:
+            return [{"filename": os.path.basename(zip_path), "error": "Ugyldig ZIP-fil"}]
+        
+        with archive:
+            for member in archive.infolist():
+                name = member.filename
+                # Spring mapper og macOS-metadata over
+                if member.is_dir() or name.startswith("__MACOSX/") or os.path.basename(name).startswith("."):
+                    continue
+                if len(documents) >= max_files:
+                    documents.append({"filename": name, "error": f"For mange filer i batchen (maks. {max_files})"})
+                    continue
+                documents.append(DocumentProcessor._extract_zip_member(archive, member))
+        return documents
+    
+    @staticmethod
+    def _extract_zip_member(archive: zipfile.ZipFile, member: zipfile.ZipInfo) -> Dict[str, Any]:
+        name = member.filename
+        filepath = None
+        sha256 = hashlib.sha256()
+        size = 0
+        try:
+            with archive.open(member) as source:
+                chunk = source.read(DocumentProcessor.CHUNK_SIZE)
+                file_type = DocumentProcessor.detect_file_type(chunk[:DocumentProcessor.SNIFF_BYTES])
+                if file_type is None:
+                    return {"filename": name, "error": "Filformat ikke understøttet"}
+                
+                filepath = os.path.join(settings.UPLOAD_FOLDER, f"{uuid.uuid4()}.{file_type}")
+                with open(filepath, "wb") as buffer:
+                    while chunk:
+                        size += len(chunk)
+                        if size > settings.MAX_CONTENT_LENGTH:
+                            raise DocumentProcessor._too_large()
+                        sha256.update(chunk)
+                        buffer.write(chunk)
+                        chunk = source.read(DocumentProcessor.CHUNK_SIZE)
+        except (HTTPException, zipfile.BadZipFile, zlib.error, RuntimeError, OSError) as e:
+            if filepath and os.path.exists(filepath):
+                os.remove(filepath)
+            detail = e.detail if isinstance(e, HTTPException) else f"Kunne ikke pakke filen ud: {e}"
+            return {"filename": name, "error": detail}
         
-        return filepath
+        return {"filename": name, "filepath": filepath, "content_hash": sha256.hexdigest()}
+    
+    @staticmethod
+    def remove_temp_file(filepath: str) -> None:
+        """Sletter en midlertidig upload, medmindre DEBUG er slået til (så den kan inspiceres)."""
+        if not settings.DEBUG and os.path.exists(filepath):
+            os.remove(filepath)
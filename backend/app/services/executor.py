@@ -0,0 +1,144 @@
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.services.document_processor import DocumentProcessor
+from app.services.ocr_pool import check_backend, ocr_pool
+from app.services.pdf_text_layer import count_pdf_pages
+
+logger = logging.getLogger(__name__)
+
+
+def _init_ocr_worker() -> None:
+    """Initializer for OCR-arbejdsprocesser: én warm predictor pr. proces."""
+    ocr_pool.size = 1
+    ocr_pool.start()
+
+
+def _warmup() -> bool:
+    return ocr_pool.started
+
+
+def _run_ocr(file_path: str) -> Tuple[str, Optional[List[float]]]:
+    """
+    Kører OCR på et dokument med en model lånt fra (proces-lokal) pulje.
+    Returnerer teksten og dokumentets layout-signatur.
+    """
+    from app.services.ocr_service import OCRService
+
+    with ocr_pool.checkout() as model:
+        service = OCRService(model=model)
+        text = service.process_document(file_path)
+        return text, service.layout_signature
+
+
+def _run_ocr_page(file_path: str, page_idx: int) -> Tuple[str, Optional[List[float]]]:
+    """Udtrækker den formaterede tekst og layout-signaturen for én side af en PDF."""
+    from app.services.ocr_service import OCRService
+
+    with ocr_pool.checkout() as model:
+        service = OCRService(model=model)
+        text = service.extract_page_text(file_path, page_idx)
+        return text, service.layout_signature
+
+
+class PipelineExecutor:
+    """
+    Eksekveringslag for upload-pipelinen.
+
+    CPU-tung OCR kører i en procespulje (eller trådpulje, jf. OCR_EXECUTOR),
+    og LLM-kald awaites via ParserService' async klient (begrænset af
+    LLM_MAX_CONCURRENCY), så event loop'et aldrig blokeres af en upload.
+    """
+
+    def __init__(self):
+        self._ocr_executor: Optional[Executor] = None
+        self._parser = None
+
+    def start(self) -> None:
+        # Manglende OCR-pakker skal stoppe opstarten her, ikke i arbejdsprocesserne
+        check_backend()
+        if settings.OCR_EXECUTOR == "process":
+            workers = max(1, settings.OCR_WORKERS)
+            self._ocr_executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_ocr_worker,
+            )
+            # Start arbejdsprocesserne nu, så modellerne er varme før første upload
+            for _ in range(workers):
+                self._ocr_executor.submit(_warmup)
+            logger.info(f"OCR-procespulje startet med {workers} arbejdsprocesser")
+        else:
+            ocr_pool.start()
+            self._ocr_executor = ThreadPoolExecutor(
+                max_workers=ocr_pool.size, thread_name_prefix="ocr"
+            )
+            logger.info(f"OCR-trådpulje startet med {ocr_pool.size} tråde")
+
+    async def shutdown(self) -> None:
+        if self._ocr_executor is not None:
+            self._ocr_executor.shutdown(wait=False, cancel_futures=True)
+            self._ocr_executor = None
+        ocr_pool.shutdown()
+        if self._parser is not None:
+            await self._parser.close()
+            self._parser = None
+
+    def _get_parser(self):
+        if self._parser is None:
+            from app.services.parser_service import ParserService
+
+            self._parser = ParserService()
+        return self._parser
+
+    async def run_ocr(self, file_path: str) -> Tuple[str, Optional[List[float]]]:
+        """
+        Kører OCR på dokumentet uden at blokere event loop'et og returnerer
+        teksten sammen med layout-signaturen (første sides).
+
+        Flersidede PDF'er fordeles side for side over OCR-workerne (hver med sin
+        egen warm model), og siderne samles i rækkefølge bagefter.
+        """
+        if self._ocr_executor is None:
+            self.start()
+        loop = asyncio.get_running_loop()
+
+        page_count = 1
+        if settings.OCR_PAGE_PARALLEL and file_path.endswith('.pdf'):
+            # pdfium åbner filen synkront - også det holdes ude af event loop'et
+            page_count = await asyncio.to_thread(count_pdf_pages, file_path)
+        if page_count <= 1:
+            return await loop.run_in_executor(self._ocr_executor, _run_ocr, file_path)
+
+        from app.services.ocr_service import OCRService
+
+        try:
+            pages = await asyncio.gather(*(
+                loop.run_in_executor(self._ocr_executor, _run_ocr_page, file_path, page_idx)
+                for page_idx in range(page_count)
+            ))
+            full_text = OCRService().assemble_pages([text for text, _ in pages])
+            logger.info(f"OCR af {page_count} sider færdig, {len(full_text)} tegn ekstraheret")
+            return full_text, pages[0][1]
+        finally:
+            DocumentProcessor.remove_temp_file(file_path)
+
+    async def run_parse(
+        self,
+        ocr_text: str,
+        on_section: Optional[Callable[[str, Any], Awaitable[None]]] = None,
+        layout_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Parser OCR-teksten med LLM'en over den delte async Mistral-klient.
+        `on_section` modtager færdige top-level sektioner undervejs (streaming),
+        og `layout_id` er layoutet fundet i layout-indekset, hvis det er kendt.
+        """
+        return await self._get_parser().parse_payslip_async(ocr_text, on_section=on_section, layout_id=layout_id)
+
+
+pipeline_executor = PipelineExecutor()
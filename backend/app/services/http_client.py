@@ -0,0 +1,64 @@
+import logging
+import ssl
+from typing import Optional
+
+import aiohttp
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Kalenderfeeds hentes uden certifikatverifikation (mange vagtplansystemer har
+# selvsignerede certifikater); gives pr. request, så andre kald verificerer som normalt
+UNVERIFIED_SSL = ssl.create_default_context()
+UNVERIFIED_SSL.check_hostname = False
+UNVERIFIED_SSL.verify_mode = ssl.CERT_NONE
+
+
+class HTTPClient:
+    """
+    Fælles aiohttp-session for alle udgående HTTP-kald (kalenderfeeds, proxy).
+
+    Sessionen lever hele applikationens levetid (startes og lukkes i FastAPI's
+    lifespan) med én connection-pulje, DNS-cache, keep-alive og en grænse pr.
+    host, så gentagne hentninger fra samme vagtplanserver genbruger forbindelser.
+    Bruges den uden for lifespan (f.eks. i scripts), oprettes sessionen ved
+    første kald.
+    """
+
+    def __init__(self):
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = self._create_session()
+        return self._session
+
+    @staticmethod
+    def _create_session() -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(
+            limit=settings.HTTP_POOL_LIMIT,
+            limit_per_host=settings.HTTP_POOL_LIMIT_PER_HOST,
+            ttl_dns_cache=settings.HTTP_DNS_CACHE_SECONDS,
+            keepalive_timeout=settings.HTTP_KEEPALIVE_SECONDS,
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=settings.HTTP_TIMEOUT_SECONDS),
+        )
+
+    async def start(self) -> None:
+        self.session
+        logger.info(
+            f"HTTP-klient startet (pulje {settings.HTTP_POOL_LIMIT}, "
+            f"{settings.HTTP_POOL_LIMIT_PER_HOST} pr. host)"
+        )
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+http_client = HTTPClient()
@@ -1,11 +1,14 @@
-import requests
-from icalendar import Calendar
+import aiohttp
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
 import json
 import os
 import html
 
+from app.services.http_client import http_client
+from app.utils.ics_import import recurrence_window
+from app.utils.ics_stream import event_id, iter_ics_events
+
 class ICalService:
     """Service til at håndtere parsing af iCalendar-filer"""
 
@@ -14,12 +17,12 @@ class ICalService:
         """Henter iCalendar-data fra en URL"""
         try:
             print(f"Forsøger at hente iCalendar-data fra: {url}")
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            # Sæt encoding til utf-8 for at sikre korrekt håndtering af danske tegn
-            response.encoding = 'utf-8'
-            print(f"Succesfuldt hentet iCalendar-data: {len(response.text)} bytes")
-            return response.text
+            async with http_client.session.get(url, timeout=aiohttp.ClientTimeout(total=10)) as response:
+                response.raise_for_status()
+                # Læs som utf-8 for at sikre korrekt håndtering af danske tegn
+                text = await response.text(encoding='utf-8')
+            print(f"Succesfuldt hentet iCalendar-data: {len(text)} bytes")
+            return text
         except Exception as e:
             print(f"Fejl ved hentning af iCalendar-data: {e}")
             return None
@@ -33,66 +36,25 @@ class ICalService:
         
         try:
             print(f"Starter parsing af iCalendar-data ({len(ical_text)} bytes)")
-            cal = Calendar.from_ical(ical_text)
-            
-            print(f"Fandt kalender-objekt, leder efter VEVENT-elementer")
-            for component in cal.walk('VEVENT'):
+            # Streaming-parseren læser kun de VEVENT-felter vi bruger; fejlbehæftede events springes over
+            for parsed in iter_ics_events(ical_text, recurrence_window=recurrence_window()):
                 event_count += 1
                 try:
-                    # Debug info for hver event
-                    raw_summary = component.get('summary', 'Ingen titel')
-                    
-                    # Sikre at summary er korrekt decodet og håndteret som UTF-8
-                    if isinstance(raw_summary, bytes):
-                        summary = raw_summary.decode('utf-8')
-                    else:
-                        summary = str(raw_summary)
-                    
                     # Decode eventuelle HTML entities i titlen
-                    summary = html.unescape(summary)
-                    
-                    print(f"Parser event {event_count}: {summary}")
-                    
-                    start = component.get('dtstart').dt
-                    print(f"  - Start: {start} (type: {type(start).__name__})")
-                    
-                    end = component.get('dtend').dt
-                    print(f"  - End: {end} (type: {type(end).__name__})")
-                    
-                    # Hvis start eller sluttidspunkt er datetime-objekter (ikke dato), 
-                    # skal vi sikre, at de er konverteret korrekt
-                    if isinstance(start, datetime):
-                        start_time = start
-                    else:
-                        # Hvis det er en dato, konverter til datetime
-                        print(f"  - Konverterer start-dato til datetime")
-                        start_time = datetime.combine(start, datetime.min.time())
-                    
-                    if isinstance(end, datetime):
-                        end_time = end
-                    else:
-                        # Hvis det er en dato, konverter til datetime
-                        print(f"  - Konverterer end-dato til datetime")
-                        end_time = datetime.combine(end, datetime.min.time())
-                    
-                    # Forsøg at få uid'et
-                    uid = component.get('uid', f'event-{event_count}')
-                    if uid:
-                        uid = str(uid)
-                    else:
-                        uid = f'event-{event_count}'
-                    
-                    # Opret begivenhed som dict
-                    event = {
-                        'id': uid,
+                    summary = html.unescape(parsed['summary'] or 'Ingen titel')
+
+                    start, end = parsed['start'], parsed['end']
+                    # Heldagsbegivenheder har datoer; konverter til datetime ved midnat
+                    start_time = start if isinstance(start, datetime) else datetime.combine(start, datetime.min.time())
+                    end_time = end if isinstance(end, datetime) else datetime.combine(end, datetime.min.time())
+
+                    events.append({
+                        'id': event_id(parsed) if parsed['uid'] else f'event-{event_count}',
                         'title': summary,
                         'start': start_time.isoformat(),
                         'end': end_time.isoformat(),
-                        'allDay': not isinstance(start, datetime)  # True hvis det er en heldagsbegivenhed
-                    }
-                    
-                    print(f"  - Oprettet event: {json.dumps(event, ensure_ascii=False)}")
-                    events.append(event)
+                        'allDay': parsed['all_day']  # True hvis det er en heldagsbegivenhed
+                    })
                 except Exception as event_err:
                     error_count += 1
                     print(f"Fejl ved parsing af event {event_count}: {event_err}")
@@ -0,0 +1,200 @@
+import asyncio
+import logging
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.services.shift_sync import shift_sync
+from app.utils.ics_import import fetch_ics_conditional, ical_to_shifts
+from app.utils.pagination import to_naive_utc
+
+logger = logging.getLogger(__name__)
+
+
+def _sorted_with_keys(shifts: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Tuple[datetime, str]]]:
+    """Vagterne sorteret på (start som naiv UTC, id) og de tilhørende nøgler til opslag i tidsvinduer."""
+    keyed = sorted(
+        (((to_naive_utc(datetime.fromisoformat(shift["start"])), shift["id"]), shift) for shift in shifts),
+        key=lambda item: item[0],
+    )
+    return [shift for _, shift in keyed], [key for key, _ in keyed]
+
+
+class ICSFeedCache:
+    """
+    Proces-lokal cache af hver brugers ICS-feed: den rå kalender, de parsede
+    vagter og feed'ets ETag/Last-Modified.
+
+    Inden for `ttl` besvares opslag uden netværk. Derefter revalideres med
+    conditional GET; svarer serveren 304, genbruges de parsede vagter uden
+    ny parsing. Fejler hentningen, returneres de sidst kendte vagter.
+
+    Vagterne holdes sorteret efter starttidspunkt, så `get_window` kan slå et
+    tidsvindue (og en side af det) op uden at gennemløbe hele historikken.
+
+    Holder baggrunds-opdateringen (se ics_refresher) cachen varm, kan opslag
+    med `allow_stale` altid svares fra cachen, når brugeren har en entry.
+
+    `on_change` kaldes med (user_id, vagter) hver gang vagterne ændrer sig
+    (nyt indhold, eller gentagne vagter der rykker ind i horisonten), f.eks.
+    for at synkronisere vagterne til databasen; fejl i den logges kun.
+    """
+
+    def __init__(
+        self,
+        ttl: timedelta,
+        on_change: Optional[Callable[[int, List[Dict[str, Any]]], Awaitable[Any]]] = None,
+    ):
+        self.ttl = ttl
+        self.on_change = on_change
+        self._entries: Dict[int, Dict[str, Any]] = {}
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self.hits = 0
+        self.not_modified = 0
+        self.fetches = 0
+        self.errors = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "users": len(self._entries),
+            "hits": self.hits,
+            "not_modified": self.not_modified,
+            "fetches": self.fetches,
+            "errors": self.errors,
+        }
+
+    def _entry(self, user_id: int, url: str) -> Optional[Dict[str, Any]]:
+        """Brugerens entry, hvis den stammer fra den nuværende ICS-URL."""
+        entry = self._entries.get(user_id)
+        return entry if entry is not None and entry["url"] == url else None
+
+    def _is_fresh(self, entry: Optional[Dict[str, Any]]) -> bool:
+        return entry is not None and entry["checked_at"] >= datetime.utcnow() - self.ttl
+
+    def invalidate(self, user_id: int) -> None:
+        self._entries.pop(user_id, None)
+
+    async def get_shifts(
+        self, user_id: int, url: str, allow_stale: bool = False
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Brugerens vagter - fra cachen hvis den er frisk (eller findes, med `allow_stale`),
+        ellers revalideret. None hvis feed'et aldrig kunne hentes.
+        """
+        entry = await self._lookup(user_id, url, allow_stale)
+        return entry["shifts"] if entry is not None else None
+
+    async def get_window(
+        self,
+        user_id: int,
+        url: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        after: Optional[Tuple[datetime, str]] = None,
+        limit: Optional[int] = None,
+        allow_stale: bool = False,
+    ) -> Optional[Tuple[List[Dict[str, Any]], Optional[Tuple[datetime, str]]]]:
+        """
+        Vagterne der starter i [start, end) efter nøglen `after`, højst `limit`,
+        og nøglen (start, id) for den sidste vagt hvis der er flere. Tidspunkter
+        er naiv UTC. None hvis feed'et aldrig kunne hentes.
+        """
+        entry = await self._lookup(user_id, url, allow_stale)
+        if entry is None:
+            return None
+        keys = entry["keys"]
+        lo = bisect_left(keys, (start,)) if start is not None else 0
+        if after is not None:
+            lo = max(lo, bisect_right(keys, after))
+        hi = bisect_left(keys, (end,)) if end is not None else len(keys)
+        if limit is not None and hi - lo > limit:
+            return entry["shifts"][lo:lo + limit], keys[lo + limit - 1]
+        return entry["shifts"][lo:hi], None
+
+    async def _lookup(self, user_id: int, url: str, allow_stale: bool) -> Optional[Dict[str, Any]]:
+        entry = self._entry(user_id, url)
+        if self._is_fresh(entry) or (allow_stale and entry is not None):
+            self.hits += 1
+            return entry
+
+        # Én hentning pr. bruger ad gangen; ventende opslag bruger dens resultat
+        async with self._locks.setdefault(user_id, asyncio.Lock()):
+            entry = self._entry(user_id, url)
+            if self._is_fresh(entry):
+                self.hits += 1
+                return entry
+            entry, _ = await self._revalidate(user_id, url, entry)
+            return entry
+
+    async def refresh(self, user_id: int, url: str) -> bool:
+        """Revaliderer brugerens feed uanset friskhed. Returnerer False hvis hentningen fejlede."""
+        async with self._locks.setdefault(user_id, asyncio.Lock()):
+            _, ok = await self._revalidate(user_id, url, self._entry(user_id, url))
+            return ok
+
+    async def _revalidate(
+        self, user_id: int, url: str, entry: Optional[Dict[str, Any]]
+    ) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """Henter feed'et (betinget hvis det er kendt); returnerer (entry, om hentningen lykkedes)."""
+        response = await fetch_ics_conditional(
+            url,
+            etag=entry["etag"] if entry else None,
+            last_modified=entry["last_modified"] if entry else None,
+        )
+        now = datetime.utcnow()
+
+        # Servere uden ETag/Last-Modified sender hele feed'et igen; uændret indhold parses ikke
+        unchanged = response is not None and entry is not None and (
+            response["status"] == 304 or response["text"] == entry["raw"]
+        )
+        if unchanged:
+            self.not_modified += 1
+            entry["etag"], entry["last_modified"] = response["etag"], response["last_modified"]
+            entry["checked_at"] = now
+            # Gentagne vagter er udfoldet til en horisont der rykker sig dagligt
+            if entry["parsed_on"] != date.today():
+                shifts, keys = _sorted_with_keys(await ical_to_shifts(entry["raw"]))
+                entry["parsed_on"] = date.today()
+                if shifts != entry["shifts"]:
+                    entry["shifts"], entry["keys"] = shifts, keys
+                    await self._notify(user_id, shifts)
+            return entry, True
+
+        if response is None or response["text"] is None:
+            self.errors += 1
+            if entry is not None:
+                logger.warning(f"ICS-feed for bruger {user_id} kunne ikke hentes - bruger cachede vagter")
+                return entry, False
+            return None, False
+
+        self.fetches += 1
+        shifts, keys = _sorted_with_keys(await ical_to_shifts(response["text"]))
+        entry = self._entries[user_id] = {
+            "url": url,
+            "raw": response["text"],
+            "shifts": shifts,
+            "keys": keys,
+            "etag": response["etag"],
+            "last_modified": response["last_modified"],
+            "fetched_at": now,
+            "checked_at": now,
+            "parsed_on": date.today(),
+        }
+        logger.info(f"ICS-feed for bruger {user_id} hentet og parset: {len(shifts)} vagter")
+        await self._notify(user_id, shifts)
+        return entry, True
+
+    async def _notify(self, user_id: int, shifts: List[Dict[str, Any]]) -> None:
+        if self.on_change is None:
+            return
+        try:
+            await self.on_change(user_id, shifts)
+        except Exception as e:
+            logger.error(f"Synkronisering af vagter for bruger {user_id} fejlede: {e}", exc_info=True)
+
+
+ics_cache = ICSFeedCache(
+    ttl=timedelta(seconds=settings.ICS_CACHE_TTL_SECONDS),
+    on_change=shift_sync.sync if settings.ICS_SYNC_SHIFTS else None,
+)
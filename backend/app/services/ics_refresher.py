@@ -0,0 +1,164 @@
+import asyncio
+import logging
+import random
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set
+from urllib.parse import urlsplit
+
+from sqlalchemy import select as sql_select
+
+from app.config import settings
+from app.db import AsyncSessionLocal
+from app.models import User
+from app.services.ics_cache import ICSFeedCache, ics_cache
+
+logger = logging.getLogger(__name__)
+
+# Højst så længe (sekunder) mellem hver genindlæsning af brugerlisten
+USER_RELOAD_SECONDS = 60
+
+
+class ICSRefreshScheduler:
+    """
+    Baggrundsopdatering af alle brugeres ICS-feeds ind i `ICSFeedCache`.
+
+    Brugere med en ICS-URL indlæses løbende fra databasen, og hvert feed
+    revalideres cirka hvert `interval` (med ±`jitter` spredning, så feeds fra
+    samme vagtplanserver ikke hentes i ryk). Fejlede hentninger prøves igen efter
+    `retry`, derefter med eksponentiel backoff op til `max_backoff`. Højst
+    `per_host` hentninger kører samtidig mod samme host.
+
+    Cachen er proces-lokal, så hver API-proces kører sin egen scheduler.
+    """
+
+    def __init__(
+        self,
+        cache: ICSFeedCache,
+        interval: timedelta,
+        per_host: int,
+        retry: timedelta,
+        max_backoff: timedelta,
+        jitter: float = 0.2,
+    ):
+        self.cache = cache
+        self.interval = interval
+        self.per_host = max(1, per_host)
+        self.retry = retry
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        # user_id -> {"url", "next_run", "failures"}
+        self._state: Dict[int, Dict[str, Any]] = {}
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+        self._running: Set[int] = set()
+        self._refresh_tasks: Set[asyncio.Task] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"ICS-opdatering startet (interval {self.interval.total_seconds():.0f}s, {self.per_host} pr. host)")
+
+    async def stop(self) -> None:
+        tasks = [self._task, *self._refresh_tasks] if self._task else list(self._refresh_tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        self._refresh_tasks.clear()
+
+    def _jittered(self, seconds: float) -> timedelta:
+        return timedelta(seconds=seconds * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    async def _load_users(self) -> List[Any]:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                sql_select(User.id, User.ics_url).where(User.ics_url.isnot(None), User.ics_url != "")
+            )
+            return result.all()
+
+    def _sync_users(self, users: List[Any]) -> None:
+        """Opdaterer planen efter brugerlisten: nye/ændrede URL'er hentes snarest, fjernede glemmes."""
+        now = datetime.utcnow()
+        current = {user.id: user.ics_url for user in users}
+        for user_id in list(self._state):
+            if user_id not in current:
+                del self._state[user_id]
+                self.cache.invalidate(user_id)
+
+        # Første hentning spredes over op til et minut, så opstart ikke henter alt på én gang
+        spread = min(self.interval.total_seconds(), USER_RELOAD_SECONDS)
+        for user_id, url in current.items():
+            state = self._state.get(user_id)
+            if state is None or state["url"] != url:
+                self._state[user_id] = {
+                    "url": url,
+                    "next_run": now + timedelta(seconds=random.uniform(0, spread)),
+                    "failures": 0,
+                }
+
+    async def _run(self) -> None:
+        next_reload = datetime.min
+        while True:
+            try:
+                now = datetime.utcnow()
+                if now >= next_reload:
+                    self._sync_users(await self._load_users())
+                    next_reload = now + timedelta(seconds=USER_RELOAD_SECONDS)
+
+                for user_id, state in self._state.items():
+                    if state["next_run"] <= now and user_id not in self._running:
+                        self._running.add(user_id)
+                        # Foreløbig; sættes når hentningen er færdig
+                        state["next_run"] = now + self.interval
+                        task = asyncio.create_task(self._refresh(user_id, state["url"]))
+                        self._refresh_tasks.add(task)
+                        task.add_done_callback(self._refresh_tasks.discard)
+
+                wake_at = min([s["next_run"] for s in self._state.values()] + [next_reload])
+                delay = (wake_at - datetime.utcnow()).total_seconds()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"ICS-opdatering fejlede: {e}", exc_info=True)
+                delay = USER_RELOAD_SECONDS
+            await asyncio.sleep(min(max(delay, 1.0), USER_RELOAD_SECONDS))
+
+    async def _refresh(self, user_id: int, url: str) -> None:
+        host = urlsplit(url).hostname or ""
+        limit = self._host_limits.setdefault(host, asyncio.Semaphore(self.per_host))
+        try:
+            async with limit:
+                ok = await self.cache.refresh(user_id, url)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"ICS-opdatering for bruger {user_id} fejlede: {e}", exc_info=True)
+            ok = False
+        finally:
+            self._running.discard(user_id)
+
+        state = self._state.get(user_id)
+        if state is None or state["url"] != url:
+            return
+        if ok:
+            state["failures"] = 0
+            state["next_run"] = datetime.utcnow() + self._jittered(self.interval.total_seconds())
+        else:
+            state["failures"] += 1
+            backoff = min(
+                self.retry.total_seconds() * 2 ** (state["failures"] - 1),
+                self.max_backoff.total_seconds(),
+            )
+            state["next_run"] = datetime.utcnow() + self._jittered(backoff)
+            logger.warning(
+                f"ICS-feed for bruger {user_id} fejlede {state['failures']} gang(e) - "
+                f"prøver igen om {backoff:.0f}s"
+            )
+
+
+ics_refresher = ICSRefreshScheduler(
+    ics_cache,
+    interval=timedelta(seconds=settings.ICS_REFRESH_INTERVAL_SECONDS),
+    per_host=settings.ICS_REFRESH_PER_HOST,
+    retry=timedelta(seconds=settings.ICS_REFRESH_RETRY_SECONDS),
+    max_backoff=timedelta(seconds=settings.ICS_REFRESH_MAX_BACKOFF_SECONDS),
+)
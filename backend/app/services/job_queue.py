@@ -0,0 +1,358 @@
+import asyncio
+import logging
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
+from sqlalchemy import select as sql_select, update
+
+from app.config import settings
+from app.db import AsyncSessionLocal
+from app.models import UploadJob
+
+logger = logging.getLogger(__name__)
+
+JOB_FIELDS = [
+    "id", "user_id", "filename", "file_path", "content_hash", "batch_id", "status", "error", "result",
+    "created_at", "saved_at", "started_at", "ocr_done_at", "parsed_at",
+    "validated_at", "finished_at",
+]
+
+UNFINISHED_STATUSES = ("queued", "processing")
+# Events der afslutter et jobs event-stream
+TERMINAL_EVENTS = ("completed", "failed")
+
+
+def batch_metrics(jobs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Samlede gennemløbstal for jobsene i en batch: antal pr. status, tid fra
+    første upload til sidste færdige dokument, dokumenter pr. minut og
+    gennemsnitlig tid i OCR og parsing.
+    """
+    finished = [job for job in jobs if job.get("finished_at")]
+    pending = len(jobs) - len(finished)
+    created = [job["created_at"] for job in jobs if job.get("created_at")]
+    elapsed = 0.0
+    if created:
+        end = max(job["finished_at"] for job in finished) if finished and not pending else datetime.utcnow()
+        elapsed = max((end - min(created)).total_seconds(), 0.0)
+
+    def average(start: str, end: str) -> Optional[float]:
+        durations = [
+            (job[end] - job[start]).total_seconds() for job in jobs if job.get(start) and job.get(end)
+        ]
+        return round(sum(durations) / len(durations), 3) if durations else None
+
+    return {
+        "documents": len(jobs),
+        "completed": sum(1 for job in jobs if job["status"] == "completed"),
+        "failed": sum(1 for job in jobs if job["status"] == "failed"),
+        "pending": pending,
+        "elapsed_seconds": round(elapsed, 3),
+        "documents_per_minute": round(len(finished) / elapsed * 60, 2) if finished and elapsed > 0 else None,
+        "avg_ocr_seconds": average("started_at", "ocr_done_at"),
+        "avg_parse_seconds": average("ocr_done_at", "parsed_at"),
+    }
+
+
+class JobBackend(ABC):
+    """Lager til upload-jobs. Implementeres af en in-memory og en Postgres-backend."""
+
+    @abstractmethod
+    async def create(self, job: Dict[str, Any]) -> None:
+        ...
+
+    @abstractmethod
+    async def update(self, job_id: str, **fields: Any) -> None:
+        ...
+
+    @abstractmethod
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def unfinished(self) -> List[Dict[str, Any]]:
+        """Jobs der ikke blev færdige (f.eks. pga. genstart)."""
+
+    @abstractmethod
+    async def batch(self, batch_id: str) -> List[Dict[str, Any]]:
+        """Jobsene i en batch i upload-rækkefølge."""
+
+
+class InMemoryJobBackend(JobBackend):
+    """Proces-lokalt lager - jobs overlever ikke en genstart."""
+
+    def __init__(self):
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+
+    async def create(self, job: Dict[str, Any]) -> None:
+        self._jobs[job["id"]] = dict(job)
+
+    async def update(self, job_id: str, **fields: Any) -> None:
+        if job_id in self._jobs:
+            self._jobs[job_id].update(fields)
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self._jobs.get(job_id)
+        return dict(job) if job else None
+
+    async def unfinished(self) -> List[Dict[str, Any]]:
+        return [dict(j) for j in self._jobs.values() if j["status"] in UNFINISHED_STATUSES]
+
+    async def batch(self, batch_id: str) -> List[Dict[str, Any]]:
+        return [dict(j) for j in self._jobs.values() if j.get("batch_id") == batch_id]
+
+
+class DatabaseJobBackend(JobBackend):
+    """Holdbart lager i Postgres-tabellen `upload_jobs`."""
+
+    @staticmethod
+    def _to_dict(job: UploadJob) -> Dict[str, Any]:
+        return {field: getattr(job, field) for field in JOB_FIELDS}
+
+    async def create(self, job: Dict[str, Any]) -> None:
+        async with AsyncSessionLocal() as session:
+            session.add(UploadJob(**{k: v for k, v in job.items() if k in JOB_FIELDS}))
+            await session.commit()
+
+    async def update(self, job_id: str, **fields: Any) -> None:
+        async with AsyncSessionLocal() as session:
+            await session.execute(update(UploadJob).where(UploadJob.id == job_id).values(**fields))
+            await session.commit()
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(sql_select(UploadJob).where(UploadJob.id == job_id))
+            job = result.scalar_one_or_none()
+            return self._to_dict(job) if job else None
+
+    async def unfinished(self) -> List[Dict[str, Any]]:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                sql_select(UploadJob)
+                .where(UploadJob.status.in_(UNFINISHED_STATUSES))
+                .order_by(UploadJob.created_at)
+            )
+            return [self._to_dict(job) for job in result.scalars().all()]
+
+    async def batch(self, batch_id: str) -> List[Dict[str, Any]]:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                sql_select(UploadJob)
+                .where(UploadJob.batch_id == batch_id)
+                .order_by(UploadJob.created_at)
+            )
+            return [self._to_dict(job) for job in result.scalars().all()]
+
+
+def create_backend(name: str) -> JobBackend:
+    if name == "memory":
+        return InMemoryJobBackend()
+    if name == "database":
+        return DatabaseJobBackend()
+    raise ValueError(f"Ukendt UPLOAD_JOB_BACKEND: {name}")
+
+
+class UploadJobQueue:
+    """
+    Kø af upload-jobs der behandles af baggrundsworkers.
+
+    Uploads returnerer et job-id med det samme, og klienten poller
+    `GET /api/v1/upload/{job_id}` for status og resultat - eller abonnerer på
+    jobbets events (stage, section, completed, failed) via `subscribe`.
+
+    Jobs fra en batch-upload deler et batch-id; på batch-id'et publiceres
+    `document` hver gang et af dens jobs bliver færdigt og `completed` med
+    gennemløbstal når de alle er - dog først når batchen er forseglet med
+    `seal_batch`, dvs. når alle dens filer er sat i kø.
+
+    Events holdes i hukommelsen i den proces der kører jobbet, så SSE-klienter
+    skal ramme samme proces som workeren.
+    """
+
+    def __init__(self, backend: Optional[JobBackend] = None, workers: int = 1):
+        self.backend = backend or create_backend(settings.UPLOAD_JOB_BACKEND)
+        self.workers = max(1, workers)
+        self._queue: "asyncio.Queue[str]" = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+        self._fast_tasks: Set[asyncio.Task] = set()
+        self._subscribers: Dict[str, Set["asyncio.Queue[Dict[str, Any]]"]] = {}
+        # Events for igangværende jobs, så sene abonnenter får dem genafspillet
+        self._history: Dict[str, List[Dict[str, Any]]] = {}
+        # Forseglede batches hvor `completed` endnu ikke er sendt
+        self._sealed_batches: Set[str] = set()
+
+    async def start(self) -> None:
+        # Genoptag jobs der ikke blev færdige før sidste nedlukning
+        try:
+            pending = await self.backend.unfinished()
+        except Exception as e:
+            logger.error(f"Kunne ikke hente ufærdige upload-jobs: {e}")
+            pending = []
+        for job in pending:
+            logger.info(f"Genoptager upload-job {job['id']} ({job['status']})")
+            await self.backend.update(job["id"], status="queued")
+            # Batch-requesten døde med processen, så der kommer ikke flere filer
+            if job.get("batch_id"):
+                self._sealed_batches.add(job["batch_id"])
+            self._queue.put_nowait(job["id"])
+
+        self._tasks = [asyncio.create_task(self._worker(idx)) for idx in range(self.workers)]
+        logger.info(f"Upload-kø startet med {self.workers} workers")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(
+        self,
+        user_id: int,
+        filename: str,
+        file_path: str,
+        content_hash: Optional[str] = None,
+        batch_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Opretter et job for en allerede gemt fil og sætter det i kø.
+        Er resultatet allerede cachet for filens indhold, køres jobbet med det samme
+        uden om køen, så gentagne uploads ikke venter bag OCR-tunge jobs.
+        """
+        from app.services.upload_pipeline import parsed_result_cached
+
+        now = datetime.utcnow()
+        job = {
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "filename": filename,
+            "file_path": file_path,
+            "content_hash": content_hash,
+            "batch_id": batch_id,
+            "status": "queued",
+            "error": None,
+            "result": None,
+            "created_at": now,
+            "saved_at": now,
+            "started_at": None,
+            "ocr_done_at": None,
+            "parsed_at": None,
+            "validated_at": None,
+            "finished_at": None,
+        }
+        await self.backend.create(job)
+
+        if content_hash and await parsed_result_cached(content_hash):
+            task = asyncio.create_task(self._run_job(job["id"]))
+            self._fast_tasks.add(task)
+            task.add_done_callback(self._fast_tasks.discard)
+        else:
+            self._queue.put_nowait(job["id"])
+        return job
+
+    async def seal_batch(self, batch_id: str) -> None:
+        """Markerer at alle batchens filer er sat i kø; `completed` sendes når de er færdige."""
+        self._sealed_batches.add(batch_id)
+        await self._complete_batch(batch_id)
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self.backend.get(job_id)
+
+    async def get_batch(self, batch_id: str) -> List[Dict[str, Any]]:
+        return await self.backend.batch(batch_id)
+
+    def subscribe(self, job_id: str) -> "asyncio.Queue[Dict[str, Any]]":
+        """Returnerer en kø der modtager jobbets events (inkl. dem der allerede er sendt)."""
+        events: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+        for message in self._history.get(job_id, []):
+            events.put_nowait(message)
+        self._subscribers.setdefault(job_id, set()).add(events)
+        return events
+
+    def unsubscribe(self, job_id: str, events: "asyncio.Queue[Dict[str, Any]]") -> None:
+        subscribers = self._subscribers.get(job_id)
+        if subscribers is None:
+            return
+        subscribers.discard(events)
+        if not subscribers:
+            del self._subscribers[job_id]
+
+    def _publish(self, job_id: str, event: str, data: Any) -> None:
+        message = {"event": event, "data": data}
+        if event in TERMINAL_EVENTS:
+            self._history.pop(job_id, None)
+        else:
+            self._history.setdefault(job_id, []).append(message)
+        for events in self._subscribers.get(job_id, ()):
+            events.put_nowait(message)
+
+    async def _worker(self, idx: int) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run_job(job_id)
+            except Exception as e:
+                logger.error(f"Upload-worker {idx} fejlede på job {job_id}: {e}", exc_info=True)
+            finally:
+                self._queue.task_done()
+
+    async def _run_job(self, job_id: str) -> None:
+        from app.services.upload_pipeline import process_upload
+
+        job = await self.backend.get(job_id)
+        if not job:
+            logger.warning(f"Upload-job {job_id} findes ikke")
+            return
+
+        await self.backend.update(job_id, status="processing", started_at=datetime.utcnow())
+
+        async def mark_stage(stage: str) -> None:
+            now = datetime.utcnow()
+            await self.backend.update(job_id, **{stage: now})
+            self._publish(job_id, "stage", {"stage": stage, "at": now.isoformat()})
+
+        async def on_section(name: str, data: Any) -> None:
+            self._publish(job_id, "section", {"name": name, "data": data})
+
+        try:
+            result = await process_upload(job, mark_stage, on_section)
+        except Exception as e:
+            logger.error(f"Upload-job {job_id} fejlede: {e}", exc_info=True)
+            await self.backend.update(job_id, status="failed", error=str(e), finished_at=datetime.utcnow())
+            self._publish(job_id, "failed", {"error": str(e)})
+            await self._batch_progress(job, "failed", {"error": str(e)})
+            return
+
+        await self.backend.update(job_id, status="completed", result=result, finished_at=datetime.utcnow())
+        self._publish(job_id, "completed", result)
+        logger.info(f"Upload-job {job_id} færdigt")
+        await self._batch_progress(job, "completed", {"result": result})
+
+    async def _batch_progress(self, job: Dict[str, Any], status: str, outcome: Dict[str, Any]) -> None:
+        """Publicerer et færdigt batch-dokument, og batchens afslutning når alle er færdige."""
+        batch_id = job.get("batch_id")
+        if not batch_id:
+            return
+        self._publish(batch_id, "document", {
+            "job_id": job["id"], "filename": job.get("filename"), "status": status, **outcome,
+        })
+        await self._complete_batch(batch_id)
+
+    async def _complete_batch(self, batch_id: str) -> None:
+        """Publicerer `completed` én gang, når batchen er forseglet og alle dens jobs er færdige."""
+        if batch_id not in self._sealed_batches:
+            return
+        jobs = await self.backend.batch(batch_id)
+        if any(j["status"] in UNFINISHED_STATUSES for j in jobs) or batch_id not in self._sealed_batches:
+            return
+        self._sealed_batches.discard(batch_id)
+        metrics = batch_metrics(jobs)
+        self._publish(batch_id, "completed", {"batch_id": batch_id, "metrics": metrics})
+        logger.info(
+            f"Upload-batch {batch_id} færdig: {metrics['completed']}/{metrics['documents']} dokumenter "
+            f"på {metrics['elapsed_seconds']}s"
+        )
+
+
+upload_queue = UploadJobQueue(workers=settings.UPLOAD_WORKERS)
@@ -0,0 +1,168 @@
+import json
+import logging
+import re
+from typing import Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def clean_json_string(json_str: str) -> str:
+    """Rens en JSON-streng for ugyldige elementer som kommentarer og lignende"""
+    # Fjern enkeltlinjekommentarer
+    json_str = re.sub(r'//.*?$', '', json_str, flags=re.MULTILINE)
+
+    # Fjern blokkommentarer
+    json_str = re.sub(r'/\*.*?\*/', '', json_str, flags=re.DOTALL)
+
+    # Fjern kommentarer som "// ... resten af arbejdstiderne"
+    json_str = re.sub(r'// \.\.\. .*?$', '', json_str, flags=re.MULTILINE)
+
+    # Håndter trailing commas
+    json_str = re.sub(r',(\s*[\]}])', r'\1', json_str)
+
+    # Fjern usynlige kontroltegn
+    json_str = ''.join(ch for ch in json_str if ord(ch) >= 32 or ch in '\n\r\t')
+
+    # Håndter decimal-tal med to punktummer (31.805.89 -> 31805.89)
+    def fix_numbers(match):
+        num_str = match.group(0)
+        if num_str.count('.') > 1:
+            # Fjern alle punktummer og behold det sidste som decimalseparator
+            parts = num_str.split('.')
+            return ''.join(parts[:-1]) + '.' + parts[-1]
+        return num_str
+
+    json_str = re.sub(r'\d+\.\d+\.\d+', fix_numbers, json_str)
+
+    return json_str
+
+
+class JsonSectionStream:
+    """
+    Inkrementel parser for et JSON-objekt der modtages i bidder (token-stream).
+
+    `feed` returnerer de top-level nøgler hvis værdi er blevet komplet siden
+    sidste kald, som (nøgle, værdi)-par. Tekst før det første `{` (f.eks. en
+    ```json-fence) ignoreres. `//`- og `/* */`-kommentarer uden for strenge
+    springes over af scanneren, og hver sektion renses med `clean_json_string`
+    som det fulde svar. Sektioner der stadig ikke kan parses springes over -
+    den endelige, fulde parsing af svaret er stadig den autoritative.
+    """
+
+    def __init__(self):
+        self._buffer: List[str] = []
+        self._started = False
+        self._finished = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        # Kommentar uden for strenge: None, "line" eller "block"
+        self._comment: Optional[str] = None
+        self._slash = False
+        self._star = False
+        self._key: Optional[str] = None
+        self._key_chars: Optional[List[str]] = None
+        self._value_chars: Optional[List[str]] = None
+
+    @property
+    def finished(self) -> bool:
+        return self._finished
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        sections: List[Tuple[str, Any]] = []
+        for ch in chunk:
+            if self._finished:
+                break
+            if not self._started:
+                if ch == "{":
+                    self._started = True
+                    self._depth = 1
+                continue
+            self._feed_char(ch, sections)
+        return sections
+
+    def _feed_char(self, ch: str, sections: List[Tuple[str, Any]]) -> None:
+        if self._value_chars is not None:
+            self._value_chars.append(ch)
+
+        if self._comment == "line":
+            if ch == "\n":
+                self._comment = None
+            return
+        if self._comment == "block":
+            if ch == "/" and self._star:
+                self._comment = None
+            self._star = ch == "*"
+            return
+
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif ch == "\\":
+                self._escape = True
+            elif ch == '"':
+                self._in_string = False
+                if self._key_chars is not None and self._value_chars is None:
+                    self._key = json.loads('"' + "".join(self._key_chars) + '"')
+                    self._key_chars = None
+                    return
+            if self._key_chars is not None and self._value_chars is None:
+                self._key_chars.append(ch)
+            return
+
+        if self._slash:
+            self._slash = False
+            if ch == "/":
+                self._comment = "line"
+                return
+            if ch == "*":
+                self._comment = "block"
+                self._star = False
+                return
+        if ch == "/":
+            # Mulig start på en kommentar; afgøres af næste tegn
+            self._slash = True
+            return
+
+        if ch == '"':
+            self._in_string = True
+            if self._depth == 1 and self._value_chars is None and self._key is None:
+                # Start på en top-level nøgle
+                self._key_chars = []
+            return
+
+        if ch in "{[":
+            self._depth += 1
+            return
+
+        if ch in "}]":
+            self._depth -= 1
+            if self._depth == 1 and self._value_chars is not None:
+                # En indlejret værdi (objekt/liste) er lukket
+                self._emit(sections)
+            elif self._depth == 0:
+                if self._value_chars is not None:
+                    # Skalar som sidste værdi i objektet
+                    self._value_chars.pop()
+                    self._emit(sections)
+                self._finished = True
+            return
+
+        if self._depth == 1:
+            if ch == ":" and self._key is not None and self._value_chars is None:
+                self._value_chars = []
+            elif ch == "," and self._value_chars is not None:
+                # Skalar-værdi afsluttet af komma
+                self._value_chars.pop()
+                self._emit(sections)
+
+    def _emit(self, sections: List[Tuple[str, Any]]) -> None:
+        key, raw = self._key, "".join(self._value_chars or []).strip()
+        self._key = None
+        self._value_chars = None
+        if key is None or not raw:
+            return
+        try:
+            sections.append((key, json.loads(clean_json_string(raw))))
+        except json.JSONDecodeError:
+            logger.debug(f"Sektion '{key}' kunne ikke parses inkrementelt")
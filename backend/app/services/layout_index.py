@@ -0,0 +1,204 @@
+import asyncio
+import hashlib
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import select as sql_select
+from sqlalchemy.dialects.postgresql import insert
+
+from app.config import settings
+from app.db import AsyncSessionLocal
+from app.models import LayoutTemplate
+
+logger = logging.getLogger(__name__)
+
+# Grovhed af kvantiseringen der giver bucket-nøglen (værdier afrundes til 1/16).
+# Bucket'en udvælger kun kandidater; afstanden tjekkes altid.
+_BUCKET_LEVELS = 16
+# Decimaler i signaturen der identificerer en skabelon (sammen med layout-id'et)
+_SIGNATURE_DECIMALS = 4
+# Sekunder før en fejlet indlæsning af skabelonerne forsøges igen
+_LOAD_RETRY_SECONDS = 30
+
+
+def bucket_key(signature: List[float]) -> str:
+    """
+    Kvantiseret hash af en layout-signatur (se `OCRService._compute_layout_signature`),
+    så ens layouts lander i samme bucket.
+    """
+    quantized = np.round(np.asarray(signature) * _BUCKET_LEVELS).astype(np.int8)
+    return hashlib.sha1(quantized.tobytes()).hexdigest()[:16]
+
+
+def signature_key(signature: List[float]) -> str:
+    """Hash af selve signaturen; en skabelon er entydig på (layout_id, signature_key)."""
+    rounded = np.round(np.asarray(signature, dtype=float), _SIGNATURE_DECIMALS)
+    return hashlib.sha1(rounded.tobytes()).hexdigest()[:16]
+
+
+def signature_distance(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """L1-afstand mellem signaturer skaleret til [0, 1] (b kan være en matrix)."""
+    return np.abs(b - a).sum(axis=-1) / 4.0
+
+
+class LayoutIndex:
+    """
+    Indeks over kendte lønseddel-layouts (arbejdsgiver-skabeloner).
+
+    Opslag sammenligner først med skabelonerne i signaturens bucket og ellers
+    med alle kendte signaturer; i begge tilfælde returneres den nærmeste kun,
+    hvis afstanden er under `max_distance`. En bucket kan rumme flere
+    skabeloner (også for forskellige layouts). Skabelonerne ligger i tabellen
+    `layout_templates`, entydige på (layout_id, signatur), og indlæses ved
+    første opslag; bekræftede layouts gemmes der, så indekset vokser. Fejl i
+    databasen logges men får aldrig en upload til at fejle.
+    """
+
+    def __init__(self, max_distance: float):
+        self.max_distance = max_distance
+        self._templates: List[Dict[str, Any]] = []
+        # (layout_id, signature_key) -> række i _templates/_matrix
+        self._positions: Dict[Tuple[str, str], int] = {}
+        # bucket-nøgle -> rækker i _templates/_matrix
+        self._buckets: Dict[str, List[int]] = {}
+        self._matrix: Optional[np.ndarray] = None
+        self._loaded = False
+        self._retry_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._templates)
+
+    def add(self, template: Dict[str, Any]) -> None:
+        key = (template["layout_id"], signature_key(template["signature"]))
+        vector = np.asarray(template["signature"], dtype=float)[None, :]
+        position = self._positions.get(key)
+        if position is not None:
+            self._matrix[position] = vector
+            self._templates[position] = template
+            return
+        position = len(self._templates)
+        self._templates.append(template)
+        self._positions[key] = position
+        self._buckets.setdefault(bucket_key(template["signature"]), []).append(position)
+        self._matrix = vector if self._matrix is None else np.vstack([self._matrix, vector])
+
+    def _nearest(self, signature: np.ndarray, positions: Sequence[int]) -> Optional[Tuple[int, float]]:
+        """Nærmeste af skabelonerne på `positions`, hvis den er inden for `max_distance`."""
+        if not len(positions):
+            return None
+        distances = signature_distance(signature, self._matrix[positions])
+        nearest = int(distances.argmin())
+        distance = float(distances[nearest])
+        return (positions[nearest], distance) if distance <= self.max_distance else None
+
+    def match(self, signature: List[float]) -> Optional[Dict[str, Any]]:
+        """Skabelonen for signaturen, eller None hvis intet kendt layout er tæt nok på."""
+        if not any(signature) or not self._templates:
+            return None
+
+        vector = np.asarray(signature, dtype=float)
+        found = self._nearest(vector, self._buckets.get(bucket_key(signature), []))
+        if found is None:
+            # Tæt på en bucket-grænse kan nærmeste skabelon ligge i en nabo-bucket
+            found = self._nearest(vector, list(range(len(self._templates))))
+        if found is None:
+            return None
+
+        position, distance = found
+        template = self._templates[position]
+        return {
+            "layout_id": template["layout_id"],
+            "employer": template.get("employer"),
+            "bucket_key": bucket_key(template["signature"]),
+            "distance": round(distance, 4),
+        }
+
+    async def lookup(self, signature: Optional[List[float]]) -> Optional[Dict[str, Any]]:
+        if not signature:
+            return None
+        await self._ensure_loaded()
+        match = self.match(signature)
+        if match is not None:
+            logger.info(
+                f"Layout genkendt: {match['layout_id']} ({match.get('employer') or 'ukendt arbejdsgiver'}, "
+                f"afstand {match['distance']})"
+            )
+        return match
+
+    async def confirm(
+        self, signature: List[float], layout_id: str, employer: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Gemmer skabelonen for (layout, signatur) som et bekræftet layout, eller
+        tæller bekræftelserne op hvis den findes. Andre layouts i samme bucket
+        berøres ikke.
+        """
+        await self._ensure_loaded()
+        key = bucket_key(signature)
+        now = datetime.utcnow()
+        stmt = insert(LayoutTemplate).values(
+            bucket_key=key,
+            signature_key=signature_key(signature),
+            layout_id=layout_id,
+            employer=employer,
+            signature=signature,
+            confirmations=1,
+            created_at=now,
+            updated_at=now,
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[LayoutTemplate.layout_id, LayoutTemplate.signature_key],
+            set_={
+                "bucket_key": key,
+                "employer": employer,
+                "signature": signature,
+                "confirmations": LayoutTemplate.confirmations + 1,
+                "updated_at": now,
+            },
+        ).returning(LayoutTemplate.confirmations)
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(stmt)
+            confirmations = result.scalar_one()
+            await session.commit()
+
+        template = {
+            "bucket_key": key,
+            "layout_id": layout_id,
+            "employer": employer,
+            "signature": signature,
+            "confirmations": confirmations,
+        }
+        self.add(template)
+        logger.info(f"Layout {layout_id} bekræftet for bucket {key} ({confirmations} bekræftelser)")
+        return template
+
+    async def _ensure_loaded(self) -> None:
+        """Indlæser skabelonerne første gang; fejler det, prøves igen efter _LOAD_RETRY_SECONDS."""
+        if self._loaded or time.monotonic() < self._retry_at:
+            return
+        async with self._lock:
+            if self._loaded or time.monotonic() < self._retry_at:
+                return
+            try:
+                async with AsyncSessionLocal() as session:
+                    result = await session.execute(sql_select(LayoutTemplate))
+                    for row in result.scalars():
+                        self.add({
+                            "bucket_key": row.bucket_key,
+                            "layout_id": row.layout_id,
+                            "employer": row.employer,
+                            "signature": row.signature,
+                            "confirmations": row.confirmations,
+                        })
+                self._loaded = True
+                logger.info(f"Layout-indeks indlæst med {len(self)} skabeloner")
+            except Exception as e:
+                self._retry_at = time.monotonic() + _LOAD_RETRY_SECONDS
+                logger.warning(f"Layout-indeks kunne ikke indlæses, prøver igen om {_LOAD_RETRY_SECONDS}s: {e}")
+
+
+layout_index = LayoutIndex(max_distance=settings.LAYOUT_MATCH_MAX_DISTANCE)
@@ -0,0 +1,131 @@
+import importlib.util
+import logging
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+OCR_BACKENDS = ("torch", "torch_int8", "onnx")
+# Pakker hver backend kræver (modul, pip-pakke); onnxtr står i requirements-onnx.txt
+_BACKEND_PACKAGES = {
+    "torch": [("doctr", "python-doctr"), ("torch", "torch")],
+    "torch_int8": [("doctr", "python-doctr"), ("torch", "torch")],
+    "onnx": [("onnxtr", "onnxtr[cpu]")],
+}
+
+
+def check_backend(backend: Optional[str] = None) -> None:
+    """
+    Fejler med en tydelig fejl hvis OCR-backend'en er ukendt eller dens pakker
+    mangler. Kaldes ved opstart, så fejlen ikke først viser sig ved første
+    upload (eller som en død arbejdsproces).
+    """
+    backend = backend or settings.OCR_BACKEND
+    if backend not in _BACKEND_PACKAGES:
+        raise ValueError(f"Ukendt OCR_BACKEND: {backend} (gyldige: {', '.join(OCR_BACKENDS)})")
+    missing = [package for module, package in _BACKEND_PACKAGES[backend] if importlib.util.find_spec(module) is None]
+    if missing:
+        hint = "pip install -r requirements-onnx.txt" if backend == "onnx" else "pip install -r requirements.txt"
+        raise RuntimeError(f"OCR_BACKEND={backend} kræver {', '.join(repr(p) for p in missing)} - installér med {hint}")
+
+
+def build_predictor(backend: Optional[str] = None) -> Any:
+    """
+    Opretter en OCR-predictor med den valgte inferens-backend (jf. OCR_BACKEND).
+
+    Alle backends returnerer en predictor med docTR's interface: den kaldes med
+    en liste af sidebilleder og resultatet har `export()` i samme format.
+    """
+    backend = backend or settings.OCR_BACKEND
+    check_backend(backend)
+
+    if backend == "torch":
+        from doctr.models import ocr_predictor
+
+        return ocr_predictor(pretrained=True)
+
+    if backend == "torch_int8":
+        import torch
+        from doctr.models import ocr_predictor
+
+        predictor = ocr_predictor(pretrained=True)
+        # Dynamisk kvantisering af Linear/LSTM-lag (genkendelsesmodellens tunge del)
+        for sub in (predictor.det_predictor, predictor.reco_predictor):
+            sub.model = torch.quantization.quantize_dynamic(
+                sub.model, {torch.nn.Linear, torch.nn.LSTM}, dtype=torch.qint8
+            )
+        return predictor
+
+    if backend == "onnx":
+        from onnxtr.models import ocr_predictor as onnx_ocr_predictor
+
+        # Samme arkitekturer som docTR's standard, eksporteret til ONNX
+        return onnx_ocr_predictor(
+            det_arch="db_resnet50",
+            reco_arch="crnn_vgg16_bn",
+            load_in_8_bit=settings.OCR_ONNX_8BIT,
+        )
+
+    raise ValueError(f"Ukendt OCR_BACKEND: {backend} (gyldige: {', '.join(OCR_BACKENDS)})")
+
+
+class OCRModelPool:
+    """
+    Pulje af forudindlæste docTR-predictors.
+
+    Modellerne indlæses én gang ved opstart (se `start`) og lånes ud pr. request
+    via `checkout`, så en upload kun betaler for selve inferensen.
+    """
+
+    def __init__(self, size: int = 1):
+        self.size = max(1, size)
+        self._models: "queue.Queue[Any]" = queue.Queue(maxsize=self.size)
+        self._lock = threading.Lock()
+        self._started = False
+
+    @property
+    def started(self) -> bool:
+        return self._started
+
+    def start(self) -> None:
+        """Indlæser alle predictors i puljen. Kaldes ved app-opstart."""
+        with self._lock:
+            if self._started:
+                return
+
+            for idx in range(self.size):
+                logger.info(f"Indlæser OCR-model {idx + 1}/{self.size} ({settings.OCR_BACKEND})...")
+                self._models.put(build_predictor())
+            self._started = True
+            logger.info(f"OCR-modelpulje klar med {self.size} model(ler)")
+
+    def shutdown(self) -> None:
+        """Frigiver alle predictors i puljen."""
+        with self._lock:
+            while not self._models.empty():
+                self._models.get_nowait()
+            self._started = False
+
+    @contextmanager
+    def checkout(self, timeout: Optional[float] = None) -> Iterator[Any]:
+        """Låner en predictor fra puljen og returnerer den bagefter."""
+        if not self._started:
+            # Fallback hvis puljen ikke er startet (f.eks. scripts uden lifespan)
+            self.start()
+
+        try:
+            model = self._models.get(timeout=timeout if timeout is not None else settings.OCR_POOL_TIMEOUT)
+        except queue.Empty:
+            raise TimeoutError("Ingen ledig OCR-model i puljen")
+
+        try:
+            yield model
+        finally:
+            self._models.put(model)
+
+
+ocr_pool = OCRModelPool(settings.OCR_POOL_SIZE)
@@ -1,34 +1,129 @@
 import os
 import re
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, List, Optional, Tuple
 import logging
-from doctr.io import DocumentFile
-from doctr.models import ocr_predictor
+import numpy as np
 from app.config import settings
+from app.services.document_processor import DocumentProcessor
+from app.services.pdf_text_layer import PdfTextLayerExtractor
 
 logger = logging.getLogger(__name__)
 
+# Number of bins per histogram in the layout signature (headings vertically, table columns horizontally)
+LAYOUT_SIGNATURE_BINS = 16
+
+# --- Section heading detection (compiled once, one search per line) ---
+_HEADING_KEYWORD_RE = re.compile(
+    r"(lønoplysninger|lønseddel|specifikation|ferieregnskab|arbejdstidsopgørelse|optælling af timer|metadata|pension|overenskomst|ferie|afspadsering)"
+    r"|(løn|indtægt|fradrag|a-skat|am-bidrag|arbejdsmarkedsbidrag|skat|pension)"
+    r"|(timer|normtimer|arbejdstimer|netto\s+udbetalt|brutto)"
+    r"|^(periode|periode:|beløb|samlet|total)"
+    r"|^(grundløn|særydelser|tillæg)",
+    re.IGNORECASE,
+)
+# Lines that start or end with a number (likely column headers)
+_HEADING_NUMBER_RE = re.compile(r'^\d+\.?\s+\w+|^\w+\s+\d+\.?$')
+
+# --- Payslip post-processing (compiled once) ---
+# The number patterns start with "\d(?<!\w\d)" rather than the equivalent "\b\d", which
+# lets the regex engine skip straight to digits instead of testing every position.
+#
+# Currency values, e.g. "24.559,41 kr." -> "24.559.41kr". The lookahead skips values that
+# have no comma or whitespace to rewrite, so only those reach the replacement function.
+_MONEY_RE = re.compile(
+    r'\d(?<!\w\d)(?=\d{0,2}(?:\.\d{3})*[,\s])'
+    r'\d{0,2}(?:\.\d{3})*(?:,\d{1,2})?\s*(?:kr\.?|DKK)?\b'
+)
+# Everything else reads the compacted currency values and is done in one scan, dispatched
+# on the named group. Time intervals, CPR numbers and percentages never overlap; a time
+# interval takes a trailing "%" with it, as the percentage format would have.
+# (Dates need no rewrite: their format contains no spaces.)
+_NUMBER_FORMATS_RE = re.compile(
+    r'\d(?<!\w\d)(?:'
+    r'(?P<time>\d?[:\.]\d{2}\s*[-–]\s*\d{1,2}[:\.]\d{2}\b(?:\s*%)?)'
+    r'|(?P<cpr>\d{5}[-\s]?\d{4}\b)'
+    r'|(?P<percent>\d?(?:,\d{1,2})?\s*%)'
+    r')'
+    r'|(?P<spaces> {2,})'
+    r'|(?P<newlines>\n{3,})'
+)
+_MULTI_NEWLINE_RE = re.compile(r'\n{3,}')
+
+# Section markers to help the parser; each is inserted once, before its first match
+_SECTION_MARKERS = {
+    "metadata": ("løn|period|name|cpr", "\n### METADATA ###\n"),
+    "loen": ("grundløn|fast løn|tillæg", "\n### LØN ###\n"),
+    "ferie": ("ferie|feriepenge|ferietillæg", "\n### FERIE ###\n"),
+    "timer": ("arbejdstid|timer|optælling", "\n### TIMER ###\n"),
+    "pension": ("pension|samlet pensionsbidrag", "\n### PENSION ###\n"),
+    "skat": ("skat|trækprocent|a-skat", "\n### SKAT ###\n"),
+    "am_bidrag": ("arbejdsmarkedsbidrag|am-bidrag", "\n### AM-BIDRAG ###\n"),
+}
+# Matched against "\n" + text, so the leading "\n" also stands in for the start of the text
+_SECTION_RE = re.compile(
+    "\n(?:" + "|".join(f"(?P<{name}>{keywords})" for name, (keywords, _) in _SECTION_MARKERS.items()) + ")",
+    re.IGNORECASE,
+)
+
+
+def _format_money(match: "re.Match") -> str:
+    """Compact a currency value: drop spaces and use '.' as decimal separator."""
+    return match.group(0).replace(" ", "").replace(",", ".")
+
+
+def _format_number_match(match: "re.Match") -> str:
+    """Rewrite a match of _NUMBER_FORMATS_RE according to the group that matched."""
+    kind = match.lastgroup
+    if kind == "spaces":
+        return " "
+    if kind == "newlines":
+        return "\n\n"
+    
+    text = match.group(0)
+    if kind == "cpr":
+        return text.replace(" ", "-")
+    if kind == "time":
+        text = text.replace(" ", "").replace(".", ":")
+    else:
+        text = text.replace(" ", "").replace(",", ".")
+    # Blank lines swallowed by the match are collapsed like everywhere else
+    return _MULTI_NEWLINE_RE.sub("\n\n", text) if "\n\n\n" in text else text
+
+
 class OCRService:
-    def __init__(self):
-        logger.info("Initializing OCR model...")
-        self.model = ocr_predictor(pretrained=True)
-        logger.info("OCR model initialized successfully")
+    # docTR importeres først når en model faktisk bruges, så processer der kun
+    # samler sider (f.eks. API-processen) ikke indlæser torch
+    def __init__(self, model=None):
+        # Genbrug en forudindlæst predictor (f.eks. fra OCRModelPool) hvis givet
+        self._model = model
+        # Layout-signatur pr. side fra seneste dokument (se _compute_layout_signature)
+        self.page_signatures: List[List[float]] = []
+    
+    @property
+    def model(self):
+        if self._model is None:
+            from app.services.ocr_pool import build_predictor
+            logger.info(f"Initializing OCR model ({settings.OCR_BACKEND})...")
+            self._model = build_predictor()
+            logger.info("OCR model initialized successfully")
+        return self._model
     
     def process_document(self, file_path: str) -> str:
         """Process document and extract text with improved layout preservation."""
         logger.info(f"Processing document: {file_path}")
+        self.page_signatures = []
         
         try:
             # Determine document type and load it
-            doc = (DocumentFile.from_pdf(file_path) if file_path.endswith('.pdf') 
-                  else DocumentFile.from_images(file_path))
-            
-            # Perform OCR
-            logger.debug("Running OCR prediction")
-            result = self.model(doc)
+            if file_path.endswith('.pdf'):
+                pages = self._load_pdf_pages(file_path)
+            else:
+                from doctr.io import DocumentFile
+                logger.debug("Running OCR prediction")
+                pages = self.model(DocumentFile.from_images(file_path)).export()["pages"]
             
             # Extract structured text with enhanced layout awareness
-            full_text = self._extract_enhanced_formatted_text(result.export())
+            full_text = self._extract_enhanced_formatted_text({"pages": pages})
             
             # Log success and text sample
             logger.info(f"OCR completed successfully, extracted {len(full_text)} characters")
@@ -41,48 +136,38 @@ class OCRService:
             raise Exception(f"OCR-fejl: {str(e)}")
         finally:
             # Cleanup temporary files based on environment
-            if hasattr(settings, 'DEBUG') and not settings.DEBUG and os.path.exists(file_path):
-                 os.remove(file_path)
-                 logger.debug(f"Removed temporary file: {file_path}")
-            elif not hasattr(settings, 'DEBUG') and os.path.exists(file_path):
-                 os.remove(file_path)
-                 logger.debug(f"Removed temporary file: {file_path}")
+            DocumentProcessor.remove_temp_file(file_path)
     
-    def _extract_enhanced_formatted_text(self, extracted_data: Dict) -> str:
+    def extract_page_text(self, file_path: str, page_idx: int) -> str:
         """
-        Enhanced text extraction with specialized formatting for payslips.
+        Extract the formatted text of a single PDF page (before post-processing).
         
-        This method uses a more advanced approach to preserve:
-        1. Table structures and alignments
-        2. Section headings and hierarchies
-        3. Financial data patterns
-        4. Date and time information
+        Used for page-parallel OCR: each worker handles one page and the results
+        are combined with `assemble_pages`. The file is not removed here.
         """
+        self.page_signatures = []
+        extractor = PdfTextLayerExtractor(file_path)
+        try:
+            page = extractor.extract_page(page_idx) if settings.PDF_TEXT_LAYER_ENABLED else None
+            if page is None:
+                logger.debug(f"Running OCR prediction on page {page_idx}")
+                page = self.model(extractor.render_pages([page_idx])).export()["pages"][0]
+        finally:
+            extractor.close()
+        
+        return self._format_page(page)
+    
+    def assemble_pages(self, page_texts: List[str]) -> str:
+        """Join formatted page texts in order and apply payslip post-processing."""
         full_document = []
         
-        # Process each page
-        for page_idx, page in enumerate(extracted_data["pages"]):
+        for page_idx, page_text in enumerate(page_texts):
             if page_idx > 0:
                 # Clear page separator
                 full_document.append("\n\n" + "=" * 50)
                 full_document.append(f"PAGE {page_idx + 1}")
                 full_document.append("=" * 50 + "\n")
-            
-            # Extract all words with their positions for better spatial analysis
-            words_with_positions = self._extract_all_words_with_positions(page)
-            
-            # Group words into lines based on vertical position
-            lines = self._group_words_into_lines(words_with_positions)
-            
-            # Detect section headings and mark them
-            lines = self._detect_and_mark_sections(lines)
-            
-            # Process and format tabular data
-            tables = self._detect_and_format_tables(page, lines)
-            
-            # Apply formatting and create final text
-            formatted_text = self._apply_final_formatting(lines, tables)
-            full_document.append(formatted_text)
+            full_document.append(page_text)
         
         result = "\n".join(full_document)
         
@@ -91,6 +176,92 @@ class OCRService:
         
         return result
     
+    def _load_pdf_pages(self, file_path: str) -> List[Dict]:
+        """
+        Load PDF pages in docTR export format.
+        
+        Pages with an embedded text layer are read directly (no rasterisation or
+        neural OCR); only pages without usable text are rendered and run through
+        the OCR model.
+        """
+        if not settings.PDF_TEXT_LAYER_ENABLED:
+            from doctr.io import DocumentFile
+            logger.debug("Running OCR prediction")
+            return self.model(DocumentFile.from_pdf(file_path)).export()["pages"]
+        
+        extractor = PdfTextLayerExtractor(file_path)
+        try:
+            pages = extractor.extract_pages()
+            missing = [idx for idx, page in enumerate(pages) if page is None]
+            logger.info(f"Text layer used for {len(pages) - len(missing)}/{len(pages)} pages")
+            
+            if missing:
+                logger.debug(f"Running OCR prediction on pages {missing}")
+                ocr_pages = self.model(extractor.render_pages(missing)).export()["pages"]
+                for idx, page in zip(missing, ocr_pages):
+                    pages[idx] = page
+        finally:
+            extractor.close()
+        
+        return pages
+    
+    def _extract_enhanced_formatted_text(self, extracted_data: Dict) -> str:
+        """
+        Enhanced text extraction with specialized formatting for payslips.
+        
+        This method uses a more advanced approach to preserve:
+        1. Table structures and alignments
+        2. Section headings and hierarchies
+        3. Financial data patterns
+        4. Date and time information
+        """
+        page_texts = [self._format_page(page) for page in extracted_data["pages"]]
+        return self.assemble_pages(page_texts)
+    
+    def _format_page(self, page: Dict) -> str:
+        """Run the layout analysis for one page and return its formatted text."""
+        # Extract all words with their positions for better spatial analysis
+        words_with_positions = self._extract_all_words_with_positions(page)
+        
+        # Group words into lines based on vertical position
+        lines = self._group_words_into_lines(words_with_positions)
+        
+        # Detect section headings and mark them
+        lines = self._detect_and_mark_sections(lines)
+        
+        # Process and format tabular data
+        tables = self._detect_and_format_tables(page, lines)
+        
+        # Fingerprint the page layout for template lookup
+        self.page_signatures.append(self._compute_layout_signature(lines, tables))
+        
+        # Apply formatting and create final text
+        return self._apply_final_formatting(lines, tables)
+    
+    @property
+    def layout_signature(self) -> Optional[List[float]]:
+        """Layout signature of the last processed document (its first page)."""
+        return self.page_signatures[0] if self.page_signatures else None
+    
+    def _compute_layout_signature(self, lines: List[Dict], tables: List[Dict]) -> List[float]:
+        """
+        Compact layout signature for a page: where the heading lines sit vertically
+        and where the table columns sit horizontally, as two normalised histograms.
+        
+        Word geometry is relative to the page, so the signature does not depend on
+        resolution or page size. Used by the layout index (app/services/layout_index.py).
+        """
+        def histogram(positions: List[float]) -> np.ndarray:
+            if not positions:
+                return np.zeros(LAYOUT_SIGNATURE_BINS)
+            counts, _ = np.histogram(np.clip(positions, 0.0, 1.0), bins=LAYOUT_SIGNATURE_BINS, range=(0.0, 1.0))
+            return counts / counts.sum()
+        
+        heading_y = [line["y"] for line in lines if line.get("is_heading")]
+        column_x = [x for table in tables for x in table.get("columns", [])]
+        signature = np.concatenate([histogram(heading_y), histogram(column_x)])
+        return [round(float(value), 4) for value in signature]
+    
     def _extract_all_words_with_positions(self, page: Dict) -> List[Dict]:
         """Extract all words with their positions for spatial analysis."""
         words = []
@@ -126,8 +297,12 @@ class OCRService:
         if not words:
             return []
         
+        center_y = np.array([word["center_y"] for word in words])
+        x1 = np.array([word["x1"] for word in words])
+        
         # Sort words by vertical position (top to bottom)
-        sorted_words = sorted(words, key=lambda w: w["center_y"])
+        order = np.argsort(center_y, kind="stable")
+        sorted_y = center_y[order]
         
         # Group words by lines using adaptive thresholding
         y_threshold = 0.01  # Start with a small threshold
@@ -137,73 +312,44 @@ class OCRService:
         y_threshold = max(y_threshold, avg_height * 0.7)  # Adjust threshold based on font size
         
         lines = []
-        current_line = [sorted_words[0]]
-        current_y = sorted_words[0]["center_y"]
-        
-        for word in sorted_words[1:]:
-            # If this word is on the same line (within threshold)
-            if abs(word["center_y"] - current_y) <= y_threshold:
-                current_line.append(word)
-            else:
-                # Sort words in the current line by horizontal position
-                current_line.sort(key=lambda w: w["x1"])
-                
-                # Store current line and start a new one
-                lines.append({
-                    "words": current_line,
-                    "y": current_y,
-                    "text": " ".join(w["text"] for w in current_line)
-                })
-                
-                # Start a new line
-                current_line = [word]
-                current_y = word["center_y"]
-        
-        # Add the last line
-        if current_line:
-            current_line.sort(key=lambda w: w["x1"])
+        start = 0
+        count = len(sorted_y)
+        while start < count:
+            # A line holds every word within y_threshold of its first word
+            line_y = sorted_y[start]
+            end = int(np.searchsorted(sorted_y, line_y + y_threshold, side="right"))
+            # Correct for rounding so the boundary matches (y - line_y) <= y_threshold exactly
+            while end < count and sorted_y[end] - line_y <= y_threshold:
+                end += 1
+            while end > start + 1 and sorted_y[end - 1] - line_y > y_threshold:
+                end -= 1
+            
+            # Sort words in the line by horizontal position
+            line_idx = order[start:end]
+            line_idx = line_idx[np.argsort(x1[line_idx], kind="stable")]
+            line_words = [words[i] for i in line_idx]
+            
             lines.append({
-                "words": current_line,
-                "y": current_y,
-                "text": " ".join(w["text"] for w in current_line)
+                "words": line_words,
+                "y": words[order[start]]["center_y"],
+                "text": " ".join(w["text"] for w in line_words)
             })
+            start = end
         
         return lines
     
     def _detect_and_mark_sections(self, lines: List[Dict]) -> List[Dict]:
         """Detect and mark section headings for better structure."""
-        section_patterns = [
-            # Common patterns for section headings in Danish payslips
-            r"(lønoplysninger|lønseddel|specifikation|ferieregnskab|arbejdstidsopgørelse|optælling af timer|metadata|pension|overenskomst|ferie|afspadsering)",
-            r"(løn|indtægt|fradrag|a-skat|am-bidrag|arbejdsmarkedsbidrag|skat|pension)",
-            r"(timer|normtimer|arbejdstimer|netto\s+udbetalt|brutto)",
-            r"^(periode|periode:|beløb|samlet|total)",
-            r"^(grundløn|særydelser|tillæg)"
-        ]
-        
-        # Compile patterns for performance
-        compiled_patterns = [re.compile(pattern, re.IGNORECASE) for pattern in section_patterns]
-        
         for line in lines:
-            text = line["text"].lower()
-            is_heading = False
-            
-            # Check if line matches a section pattern
-            for pattern in compiled_patterns:
-                if pattern.search(text):
-                    is_heading = True
-                    break
-            
-            # Check if the line contains any all-caps words (typical for headings)
-            if any(word.isupper() and len(word) > 2 for word in line["text"].split()):
-                is_heading = True
-            
-            # Detect lines that have numbers at the beginning or end (likely column headers)
-            if re.match(r'^\d+\.?\s+\w+', line["text"]) or re.match(r'^\w+\s+\d+\.?$', line["text"]):
-                is_heading = True
-            
-            # Mark line as heading
-            line["is_heading"] = is_heading
+            text = line["text"]
+            line["is_heading"] = bool(
+                # Common patterns for section headings in Danish payslips
+                _HEADING_KEYWORD_RE.search(text.lower())
+                # All-caps words are typical for headings
+                or any(word.isupper() and len(word) > 2 for word in text.split())
+                # Lines with numbers at the beginning or end (likely column headers)
+                or _HEADING_NUMBER_RE.match(text)
+            )
         
         return lines
     
@@ -265,18 +411,18 @@ class OCRService:
             return 0.0
         
         # Create position markers for each row
-        r1_positions = [w["center_x"] for w in row1_words]
-        r2_positions = [w["center_x"] for w in row2_words]
+        r1_positions = np.array([w["center_x"] for w in row1_words])
+        r2_positions = np.sort(np.array([w["center_x"] for w in row2_words]))
         
-        # Count how many positions have close matches
-        aligned_count = 0
+        # Count how many positions have a close match, using the nearest
+        # neighbour on each side of the insertion point in the sorted row
         threshold = 0.03  # Position match threshold (relative to page width)
-        
-        for pos1 in r1_positions:
-            for pos2 in r2_positions:
-                if abs(pos1 - pos2) < threshold:
-                    aligned_count += 1
-                    break
+        last = len(r2_positions) - 1
+        insert_at = np.searchsorted(r2_positions, r1_positions)
+        left = r2_positions[np.clip(insert_at - 1, 0, last)]
+        right = r2_positions[np.clip(insert_at, 0, last)]
+        nearest = np.minimum(np.abs(r1_positions - left), np.abs(r1_positions - right))
+        aligned_count = int(np.count_nonzero(nearest < threshold))
         
         # Calculate alignment score
         max_possible = min(len(r1_positions), len(r2_positions))
@@ -285,42 +431,35 @@ class OCRService:
     def _format_table(self, table_rows: List[Dict]) -> Dict:
         """Format detected table for better readability."""
         # Identify columns by clustering x-positions
-        all_x_positions = []
-        for row in table_rows:
-            for word in row["words"]:
-                all_x_positions.append(word["center_x"])
+        all_x_positions = np.array([word["center_x"] for row in table_rows for word in row["words"]])
         
-        # Use simple clustering to identify columns
-        x_positions = sorted(all_x_positions)
+        # 1-D gap clustering: a new column starts wherever the gap between
+        # neighbouring sorted positions reaches the threshold
         columns = []
-        if x_positions:
-            current_cluster = [x_positions[0]]
+        if all_x_positions.size:
             cluster_threshold = 0.03  # Maximum distance to be in the same column
-            
-            for x in x_positions[1:]:
-                if x - current_cluster[-1] < cluster_threshold:
-                    current_cluster.append(x)
-                else:
-                    # End of cluster
-                    column_pos = sum(current_cluster) / len(current_cluster)
-                    columns.append(column_pos)
-                    current_cluster = [x]
-            
-            # Add last cluster
-            if current_cluster:
-                column_pos = sum(current_cluster) / len(current_cluster)
-                columns.append(column_pos)
+            x_positions = np.sort(all_x_positions)
+            breaks = np.flatnonzero(np.diff(x_positions) >= cluster_threshold) + 1
+            for cluster in np.split(x_positions, breaks):
+                values = cluster.tolist()
+                columns.append(sum(values) / len(values))
+        
+        # Assign every word to its closest column (first one on ties)
+        if columns:
+            distances = np.abs(all_x_positions[:, None] - np.array(columns)[None, :])
+            closest_cols = distances.argmin(axis=1).tolist()
+        else:
+            closest_cols = []
         
         # Format each row of the table
         formatted_rows = []
+        word_pos = 0
         for row in table_rows:
             column_values = [""] * len(columns)
             
-            # Assign words to columns
             for word in row["words"]:
-                # Find closest column
-                closest_col = min(range(len(columns)), 
-                                 key=lambda i: abs(word["center_x"] - columns[i]))
+                closest_col = closest_cols[word_pos]
+                word_pos += 1
                 
                 # Add word to that column
                 if column_values[closest_col]:
@@ -395,52 +534,25 @@ class OCRService:
         return "\n".join(result_lines)
     
     def _post_process_payslip_data(self, text: str) -> str:
-        """Apply post-processing specifically for payslip data."""
-        # Function to enhance numbers and currencies
-        def format_numbers(match):
-            num = match.group(0)
-            # Ensure proper formatting of decimal numbers
-            return num.replace(" ", "").replace(",", ".")
-        
-        # Format common patterns in Danish payslips
-        processed = text
-        
-        # Format currency values and percentages
-        money_pattern = r'\b\d{1,3}(?:\.\d{3})*(?:,\d{1,2})?\s*(?:kr\.?|DKK)?\b'
-        processed = re.sub(money_pattern, format_numbers, processed)
-        
-        # Format percentages
-        pct_pattern = r'\b\d{1,2}(?:,\d{1,2})?\s*%'
-        processed = re.sub(pct_pattern, format_numbers, processed)
-        
-        # Format dates (Danish format: dd.mm.yyyy or dd-mm-yyyy)
-        date_pattern = r'\b\d{1,2}[.-]\d{1,2}[.-]\d{2,4}\b'
-        processed = re.sub(date_pattern, lambda m: m.group(0).replace(" ", ""), processed)
-        
-        # Format CPR numbers (Danish social security numbers)
-        cpr_pattern = r'\b\d{6}[-\s]?\d{4}\b'
-        processed = re.sub(cpr_pattern, lambda m: m.group(0).replace(" ", "-"), processed)
-        
-        # Format time intervals (e.g., 08:00-16:00)
-        time_pattern = r'\b\d{1,2}[:\.]\d{2}\s*[-–]\s*\d{1,2}[:\.]\d{2}\b'
-        processed = re.sub(time_pattern, lambda m: m.group(0).replace(" ", "").replace(".", ":"), processed)
-        
-        # Replace multiple spaces with a single space and clean up empty lines
-        processed = re.sub(r' {2,}', ' ', processed)
-        processed = re.sub(r'\n{3,}', '\n\n', processed)
-        
-        # Add section markers for common payslip sections to help the parser
-        sections = {
-            r'(?i)(?:^|\n)(?:løn|period|name|cpr)': '\n### METADATA ###\n',
-            r'(?i)(?:^|\n)(?:grundløn|fast løn|tillæg)': '\n### LØN ###\n',
-            r'(?i)(?:^|\n)(?:ferie|feriepenge|ferietillæg)': '\n### FERIE ###\n',
-            r'(?i)(?:^|\n)(?:arbejdstid|timer|optælling)': '\n### TIMER ###\n',
-            r'(?i)(?:^|\n)(?:pension|samlet pensionsbidrag)': '\n### PENSION ###\n',
-            r'(?i)(?:^|\n)(?:skat|trækprocent|a-skat)': '\n### SKAT ###\n',
-            r'(?i)(?:^|\n)(?:arbejdsmarkedsbidrag|am-bidrag)': '\n### AM-BIDRAG ###\n',
-        }
+        """
+        Apply post-processing specifically for payslip data.
+        
+        Currency values are compacted first; percentages, CPR numbers and time
+        intervals (which read the compacted values), runs of spaces and blank lines
+        are then handled in a single combined scan. Finally section markers are
+        added to help the parser.
+        """
+        processed = _MONEY_RE.sub(_format_money, text)
+        processed = _NUMBER_FORMATS_RE.sub(_format_number_match, processed)
+        
+        # Add section markers for common payslip sections, each before its first match
+        first_matches = {}
+        for match in _SECTION_RE.finditer("\n" + processed):
+            first_matches.setdefault(match.lastgroup, max(match.start() - 1, 0))
+            if len(first_matches) == len(_SECTION_MARKERS):
+                break
         
-        for pattern, marker in sections.items():
-            processed = re.sub(pattern, lambda m: marker + m.group(0), processed, count=1)
+        for name, position in sorted(first_matches.items(), key=lambda item: item[1], reverse=True):
+            processed = processed[:position] + _SECTION_MARKERS[name][1] + processed[position:]
         
-        return processed
\ No newline at end of file
+        return processed
@@ -1,9 +1,23 @@
+import asyncio
 import os
-from typing import Dict, Any
+from typing import Dict, Any, Awaitable, Callable, List, Optional
 import json
+from mistralai.async_client import MistralAsyncClient
 from mistralai.client import MistralClient
 from mistralai.models.chat_completion import ChatMessage
 from app.config import settings
+from app.services.json_stream import JsonSectionStream, clean_json_string
+from app.services.payslip_prompts import (
+    JSON_TEMPLATE,
+    LAYOUT_PROMPT_HINTS,
+    SECTION_SHARDS,
+    build_prompt,
+    build_section_prompt,
+    shard_excerpt,
+    split_ocr_sections,
+)
+from app.services.result_cache import llm_cache_key, llm_response_cache
+from app.services.rule_extractor import fill_missing, rule_extractor
 import logging
 import pprint
 
@@ -11,322 +25,58 @@ logger = logging.getLogger(__name__)
 # Set logging level to DEBUG to capture all log messages
 logger.setLevel(logging.DEBUG)
 
+# Kaldes med (sektionsnavn, værdi) når en top-level sektion er færdigparset
+OnSection = Callable[[str, Any], Awaitable[None]]
+
 class ParserService:
     def __init__(self):
         self.api_key = settings.MISTRAL_API_KEY
         if not self.api_key:
             raise ValueError("MISTRAL_API_KEY not found in environment variables")
         self.model = "mistral-medium"
+        # Klienterne oprettes én gang og genbruges, så forbindelser (TLS, keep-alive)
+        # ikke skal sættes op igen ved hvert kald
+        self._client: Optional[MistralClient] = None
+        self._async_client: Optional[MistralAsyncClient] = None
+        # Samlet tokenforbrug for denne service (til benchmarks og overvågning)
+        self.usage = {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0}
+
+    @property
+    def client(self) -> MistralClient:
+        """Blokerende klient (bruges af scripts og andre synkrone kaldere)."""
+        if self._client is None:
+            self._client = MistralClient(api_key=self.api_key)
+        return self._client
+
+    @property
+    def async_client(self) -> MistralAsyncClient:
+        """Langlivet async klient med en delt aiohttp-session (forbindelsespulje)."""
+        if self._async_client is None:
+            self._async_client = MistralAsyncClient(
+                api_key=self.api_key,
+                max_concurrent_requests=max(1, settings.LLM_MAX_CONCURRENCY),
+            )
+        return self._async_client
+
+    async def close(self) -> None:
+        """Lukker den async klients HTTP-session. Kaldes ved app-nedlukning."""
+        if self._async_client is not None:
+            await self._async_client.close()
+            self._async_client = None
 
     def parse_payslip(self, ocr_text: str) -> Dict[str, Any]:
         """Parser lønseddeldata med Mistral LLM og returnerer struktureret JSON."""
+        response_content = ""
         try:
-            # Log the received OCR text (truncated for brevity)
-            logger.info(f"Parsing lønseddel med OCR-tekst (første 100 tegn): {ocr_text[:100]}...")
-            
-            # JSON-skabelon til outputformat
-            json_template = {
-                "metadata": {
-                    "periode": None,
-                    "cpr_nr": None,
-                    "navn": None,
-                    "adresse": None,
-                    "arbejdsplads": None,
-                    "lønseddel_nr": None,
-                    "tjenestenr": None,
-                    "anciennitetsdato": None,
-                    "jubilæumsdato": None,
-                    "næste_løntrinsstigning": None,
-                    "område": None,
-                    "overenskomst": None
-                },
-                "løn": {
-                    "grundløn": {"trin": None, "beløb": None, "timer_pr_uge": None},
-                    "tillæg": [],
-                    "fast_løn_i_alt": None,
-                    "særydelser": [],
-                    "fradrag": [],
-                    "samlet_løn_før_skat": None,
-                    "netto_udbetalt": None,
-                    "overførsel_dato": None
-                },
-                "skat": {
-                    "arbejdsmarkedsbidrag": None,
-                    "fradrag": None,
-                    "skat": None,
-                    "trækprocent": None
-                },
-                "a_skat_og_am_bidrag": {
-                    "a_skat_beløb": None,
-                    "a_skat_procent": None,
-                    "am_bidrag_beløb": None,
-                    "am_bidrag_procent": None
-                },
-                "pension": {
-                    "eget_bidrag": None,
-                    "pensionsprocent": None,
-                    "samlet_pensionsbidrag": None
-                },
-                "bruttoløn": {
-                    "beløb": None,
-                    "heraf_pension": None
-                },
-                "feriepenge": {
-                    "optjent": None,
-                    "udbetalt": None
-                },
-                "ferie": {
-                    "6_uge": None,
-                    "ferie_med_løn_saldo": None,
-                    "ferie_uden_løn_saldo": None,
-                    "feriegodtgørelse_ekstra_tjeneste": None,
-                    "feriegodtgørelse_fond": None,
-                    "ferietillæg_maj": None
-                },
-                "afspadsering": {
-                    "afholdt_timer": None,
-                    "optjent_timer": None,
-                    "saldo_start": None,
-                    "saldo_slut": None
-                },
-                "særydelser": [],
-                "arbejdstimer": [],
-                "arbejdstimer_ics": []
-            }
-
-            # Convert the template to JSON with proper indentation
-            template_json = json.dumps(json_template, indent=2, ensure_ascii=False)
-            
-            # Building the prompt without f-strings to avoid format issues
-            prompt_part1 = """
-Du er en specialiseret assistent, der analyserer danske lønsedler.
-Din opgave er at udtrække alle nøgleoplysninger og formatere dem som JSON i nøjagtigt samme struktur som denne skabelon:
-"""
-            
-            prompt_part2 = """
-
-# Analyseproces
-1. Læs HELE lønseddelteksten grundigt igennem for at få overblik over dokumentet.
-2. Vær opmærksom på den komplekse struktur af lønsedler - de kan have både forside og bagside med vigtige detaljer.
-3. Identificer alle sektioner: metadata, løndele, ferie, afspadsering og især arbejdstimer fra arbejdstidsopgørelsen.
-4. Udtryk alle beløb som tal uden tusindtalsadskiller og med punktum som decimaltegn.
-5. Konverter og standardiser alle data efter retningslinjerne nedenfor.
-
-# Vigtige dokumentsektioner at finde
-1. Hovedsektion med grundoplysninger (typisk øverst på første side)
-2. Periode og metadata (CPR, navn, adresse, arbejdsplads, tjenestenr osv.)
-3. Lønsektioner: grundløn, tillæg, særydelser, fradrag
-4. Ferieregnskab og feriegodtgørelser (ofte på bagside)
-5. Afspadseringsregnskab (typisk på bagsiden)
-6. Arbejdstidsopgørelse eller optælling af timer (detaljeret oversigt over alle arbejdsdage)
-
-# Vigtige detaljer at fokusere på
-
-## Metadata
-- periode: Perioden lønsedlen dækker (f.eks. "september 2024" eller "01.09-30.09.2024")
-- cpr_nr: CPR-nummer - find formatet XXXXXX-XXXX (f.eks. "080498-0075")
-- navn: Medarbejderens fulde navn (f.eks. "Ernst Cæsius Jakobsen Krohn")
-- adresse: Komplet adresse med gade, nummer, etage og postnummer/by
-- arbejdsplads: Arbejdspladsens fulde navn (f.eks. "Region Hovedstadens Psykiatri")
-- lønseddel_nr: Lønseddelnummer format MM/ÅÅÅÅ (f.eks. "09/2024")
-- tjenestenr: Tjenestenummer - søg efter "Tjenestenr" eller "Tjnr" (f.eks. "15893")
-- anciennitetsdato: Dato for anciennitet (f.eks. "01.08.2024")
-- jubilæumsdato: Dato for jubilæum (f.eks. "25.08.2022")
-- næste_løntrinsstigning: Dato for næste løntrinsstigning (f.eks. "01.08.2028")
-- område: Områdenummer (f.eks. "4")
-- overenskomst: Overenskomstoplysninger (f.eks. "Ikke-ledende personale på SHK-området")
-
-## Løn
-- grundløn: Objekt med:
-  - trin: Løntrinnet (f.eks. "04")
-  - beløb: Beløbet uden tusindtalsadskiller (f.eks. 24559.41)
-  - timer_pr_uge: Timer pr. uge (f.eks. 32)
-- tillæg: Liste af tillæg med type og beløb. Hvert tillæg er et objekt med:
-  - type: Beskrivelse af tillægget (f.eks. "Lukket afsnit/afd. PV")
-  - beløb: Beløb uden tusindtalsadskiller (f.eks. 1751.08)
-  - pensionsgivende: true hvis markeret med "P", ellers false
-- fast_løn_i_alt: Samlet fast løn (f.eks. 27477.38)
-- fradrag: Liste over fradrag. Hvert fradrag er et objekt med:
-  - type: Type fradrag (f.eks. "Feriefradrag" eller "ATP bidrag")
-  - beløb: Beløb (f.eks. -161.18)
-- samlet_løn_før_skat: Samlet løn før skat (f.eks. 27878.86)
-- netto_udbetalt: Nettobeløb udbetalt (f.eks. 17057.86)
-- overførsel_dato: Dato for overførsel (f.eks. "2024-09-30")
-
-## Skat
-- arbejdsmarkedsbidrag: Arbejdsmarkedsbidrag beløb (f.eks. 2230.00)
-- fradrag: Skattefradrag (f.eks. 4694.00)
-- skat: Samlet skattebeløb (f.eks. 8591.00)
-- trækprocent: Skatteprocent (f.eks. 41)
-
-## A-skat og AM-bidrag
-- a_skat_beløb: A-skat beløb (f.eks. 8591.00)
-- a_skat_procent: A-skat procent (f.eks. 41)
-- am_bidrag_beløb: AM-bidrag beløb (f.eks. 2230.00)
-- am_bidrag_procent: AM-bidrag procent (f.eks. 8)
-
-## Pension
-- samlet_pensionsbidrag: Samlet pensionsbidrag (f.eks. 3751.56)
-- eget_bidrag: Eget bidrag til pension (f.eks. 1250.52)
-- pensionsprocent: Pensionsprocent (f.eks. 13.55)
-
-## Bruttoløn
-- beløb: Samlet bruttoløn - samme som samlet_løn_før_skat (f.eks. 27878.86)
-- heraf_pension: Pensionsbidrag inkluderet i bruttolønnen (f.eks. 3751.56)
-
-## Feriepenge
-- optjent: Optjente feriepenge (f.eks. 4634.24)
-- udbetalt: Udbetalte feriepenge (hvis angivet, ellers null)
-
-## Ferie
-- ferie_med_løn_saldo: Saldo for ferie med løn (f.eks. 0.00)
-- ferie_uden_løn_saldo: Saldo for ferie uden løn (f.eks. -4.01)
-- 6_uge: Sjette ferieuge (f.eks. 32.00)
-- feriegodtgørelse_fond: Feriegodtgørelse til fond (f.eks. 48.50)
-- feriegodtgørelse_ekstra_tjeneste: Feriegodtgørelse af ekstra tjeneste
-- ferietillæg_maj: Ferietillæg (f.eks. 290.85)
-
-## Afspadsering
-- saldo_start: Saldo ved periodens start (f.eks. 11.28)
-- optjent_timer: Optjente timer i perioden (f.eks. 7.52)
-- afholdt_timer: Afholdte timer i perioden (f.eks. 8.00)
-- saldo_slut: Saldo ved periodens slutning (f.eks. 10.80)
-
-## Særydelser
-Hver særydelse er et objekt med:
-- type: Type særydelse (f.eks. "Lørdagstillæg" eller "Aftentillæg")
-- antal: Antal enheder (f.eks. 8.0)
-- sats: Sats pr. enhed (f.eks. 93.13)
-- beløb: Samlet beløb (f.eks. 745.04)
-- pensionsgivende: true hvis markeret med "P", ellers false
-
-## Arbejdstimer
-For hver dag med arbejdstid fra "Arbejdstidsopgørelse"-sektionen, opret et objekt med:
-- dato: Dato i format YYYY-MM-DD (f.eks. "2024-08-05")
-- arbejdstid: Arbejdstidsinterval (f.eks. "07:00-15:00")
-- normtid: Normtid i timer (f.eks. 8.0)
-- fravær: Type fravær hvis relevant (f.eks. "Ferietimer", "Kursustimer" eller null)
-- tillæg: Liste af tillæg for denne dag (f.eks. [{"type": "Aftentillæg", "timer": 6.0}])
-
-## Arbejdstimer ICS
-Konvertering af arbejdstimer til kalendervenligt format med:
-- start_tid: Starttidspunkt i ISO format (f.eks. "2024-08-05T07:00:00")
-- slut_tid: Sluttidspunkt i ISO format (f.eks. "2024-08-05T15:00:00")
-- summary: Beskrivelse (f.eks. "Arbejdstid")
-- description: Detaljer om vagten (f.eks. "Normaltid: 8 timer")
-
-# Særlige formateringsretningslinjer
-- Konverter alle beløb til tal uden tusindtalsadskiller og med punktum som decimaltegn.
-- Fjern "P" og "*" fra beløb, men registrer deres betydning i objektstrukturen.
-- Markering med "P" angiver pensionsgivende beløb - sæt pensionsgivende: true for disse.
-- Negative beløb (f.eks. -161.18) skal beholde minustegnet.
-- Hvis visse data ikke findes i lønsedlen, sæt værdien til null.
-- For datoer, brug formatet YYYY-MM-DD (f.eks. "2024-09-30").
-
-# Særligt fokus på arbejdstidsopgørelsen
-- Find sektionen "Arbejdstidsopgørelse" eller "Optælling af timer".
-- For hver dato med registreret arbejdstid, ekstrahér det komplette mønster:
-  * Dato (konverter til YYYY-MM-DD format)
-  * Arbejdstidsinterval (f.eks. "07:00-15:00")
-  * Normtid (antal timer)
-  * Fraværstype hvis relevant (f.eks. "Ferietimer", "Kursustimer")
-  * Eventuelle tillæg (f.eks. "Aftentillæg")
-- Registrer også dage med fravær, såsom ferie, kursus eller sygdom.
-- I nogle tabeller kan arbejdstid vises uge for uge i datokolonner - vær opmærksom på dette format.
-
-# Vigtige sektioner at søge efter
-- "Lønseddel", "Periode", "Løn", "Fast løn", "Særydelser", "Skatteberegning", "Arbejdstidsopgørelse"
-- "Specifikation af særydelser", "Ferieregnskab", "Afspadseringsregnskab", "Tilgodehavende afspadsering"
-- "Optælling af timer", "Feriegodtgørelser", "Samlet pensionsbidrag"
-
-Returner KUN det endelige JSON-objekt uden forklarende tekst eller kommentarer.
-
-OCR-tekst:
-"""
-            
-            prompt_part3 = """
-"""
-            
-            # Construct the full prompt by concatenation (not f-string)
-            prompt = prompt_part1 + template_json + prompt_part2 + ocr_text + prompt_part3
-            
-            messages = [ChatMessage(role="user", content=prompt)]
+            messages = self._build_messages(ocr_text)
 
             logger.info("Sender request til Mistral API...")
-            client = MistralClient(api_key=self.api_key)
-            chat_response = client.chat(model=self.model, messages=messages)
+            chat_response = self.client.chat(model=self.model, messages=messages)
             logger.info("Modtog respons fra Mistral API.")
-            
-            # Log API response details
-            logger.debug(f"Mistral API finish_reason: {chat_response.choices[0].finish_reason}")
-            logger.debug(f"Mistral API model: {chat_response.model}")
+            self._record_usage(chat_response.usage)
 
-            response_content = chat_response.choices[0].message.content.strip()
-            # Log raw content (first 200 chars)
-            logger.debug(f"Rå respons fra API (første 200 tegn): {response_content[:200]}...")
-            
-            # Fjern fenced code blocks hvis eksisterende
-            if response_content.startswith("```json"):
-                response_content = response_content[7:]
-            if response_content.endswith("```"):
-                response_content = response_content[:-3]
-            response_content = response_content.strip()
-            
-            # Rens JSON før parsing - fjern kommentarer og anden ikke-valid JSON
-            cleaned_json = self._clean_json_string(response_content)
-            
-            # Parse JSON
-            try:
-                parsed_data = json.loads(cleaned_json)
-            except json.JSONDecodeError as e:
-                logger.error(f"Første forsøg på at parse JSON fejlede: {e}")
-                # Forsøg at bruge en mere robust JSON-parser som et fallback
-                import re
-                import ast
-                
-                # Fjern kommentarer i JSON
-                pattern = r'//.*?(?=\n|$)|/\*.*?\*/|\s*//.*?$'
-                no_comments = re.sub(pattern, '', cleaned_json, flags=re.DOTALL)
-                
-                # Erstatter 'null' med 'None', 'true' med 'True', etc.
-                no_comments = no_comments.replace('null', 'None').replace('true', 'True').replace('false', 'False')
-                
-                # Forsøg at parse med ast.literal_eval
-                try:
-                    parsed_data = ast.literal_eval(no_comments)
-                except (SyntaxError, ValueError) as ast_err:
-                    logger.error(f"Også fallback parsing fejlede: {ast_err}")
-                    raise json.JSONDecodeError(str(e), cleaned_json, e.pos) from e
-            
-            # Rengør numeriske værdier i parsed_data
-            self._clean_numeric_values(parsed_data)
-            
-            # Log key fields from parsed data
-            logger.info(f"Parset data for periode: {parsed_data.get('metadata', {}).get('periode')}")
-            logger.info(f"Lønseddel for: {parsed_data.get('metadata', {}).get('navn')}")
-            logger.info(f"Arbejdsplads: {parsed_data.get('metadata', {}).get('arbejdsplads')}")
-            logger.info(f"Samlet løn før skat: {parsed_data.get('løn', {}).get('samlet_løn_før_skat')}")
-            logger.info(f"Netto udbetalt: {parsed_data.get('løn', {}).get('netto_udbetalt')}")
-            
-            # Log aantal arbejdstimer
-            arbejdstimer = parsed_data.get('arbejdstimer', [])
-            logger.info(f"Antal registrerede arbejdsdage: {len(arbejdstimer)}")
-            if arbejdstimer:
-                logger.debug(f"Første arbejdsdag: {pprint.pformat(arbejdstimer[0])}")
-            
-            # Tilføj manglende felter hvis Mistral ikke har inkluderet dem
-            self._ensure_required_fields(parsed_data)
-            
-            # Hvis arbejdstimer_ics ikke er udfyldt, men arbejdstimer er, så lav dem selv
-            if parsed_data.get("arbejdstimer") and not parsed_data.get("arbejdstimer_ics"):
-                parsed_data["arbejdstimer_ics"] = self._convert_to_ics_format(parsed_data["arbejdstimer"])
-            
-            # Valider at alle påkrævede felter er til stede i dataudtrækningen
-            self.validate_extraction_completeness(parsed_data)
-            
-            logger.info("Succesfuldt parset JSON fra LLM.")
-            logger.debug(f"Komplet parset data: {pprint.pformat(parsed_data)}")
-            return parsed_data
+            response_content = self._response_content(chat_response)
+            return self._process_response(response_content)
 
         except json.JSONDecodeError as json_err:
             logger.error(f"JSONDecodeError: {json_err}")
@@ -335,38 +85,268 @@ OCR-tekst:
         except Exception as e:
             logger.error("Uventet fejl i parse_payslip:", exc_info=True)
             raise Exception(f"Parsing-fejl: {str(e)}")
-    
-    def _clean_json_string(self, json_str):
-        """Rens en JSON-streng for ugyldige elementer som kommentarer og lignende"""
-        import re
+
+    async def parse_payslip_async(
+        self, ocr_text: str, on_section: Optional[OnSection] = None, layout_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Som `parse_payslip`, men awaiter Mistral via den delte async klient.
+        Svaret slås først op i LLM-cachen på den normaliserede OCR-tekst.
+
+        Med `on_section` (og LLM_STREAMING slået til) streames svaret, og hver
+        top-level sektion (metadata, løn, skat, ...) sendes videre så snart
+        den er komplet. Det returnerede resultat er det samme som uden stream.
+
+        Med LLM_EXTRACTION_MODE=sharded udtrækkes sektionerne i stedet med
+        flere små, samtidige prompts (se `_parse_sharded`). Genkendes layoutet
+        af regeludtrækket, kaldes Mistral kun for det reglerne ikke kunne udfylde.
+        `layout_id` (fra layout-indekset) vælger regelsæt og prompt-variant direkte.
+        """
+        response_content = ""
+        try:
+            if settings.RULE_EXTRACTION_ENABLED:
+                prefilled = rule_extractor.extract(ocr_text, layout_id=layout_id)
+                if prefilled is not None:
+                    return await self._complete_prefilled(ocr_text, prefilled, on_section)
+
+            if settings.LLM_EXTRACTION_MODE == "sharded":
+                sections = split_ocr_sections(ocr_text)
+                if len(sections) >= 2:
+                    return await self._parse_sharded(ocr_text, sections, on_section)
+                logger.info("For få sektionsmarkører i OCR-teksten - bruger den samlede prompt")
+
+            # Prompt-varianten er en del af cache-nøglen
+            variant = layout_id if layout_id in LAYOUT_PROMPT_HINTS else None
+            prompt_model = f"{self.model}:{variant}" if variant else self.model
+            cache_key = llm_cache_key(ocr_text, prompt_model) if settings.LLM_CACHE_ENABLED else None
+            cached = await llm_response_cache.get(cache_key) if cache_key else None
+            if cached is not None:
+                logger.info("Mistral-svar fundet i cache")
+                response_content = cached["content"]
+            else:
+                messages = self._build_messages(ocr_text, variant)
+
+                if on_section is not None and settings.LLM_STREAMING:
+                    logger.info("Streamer request til Mistral API...")
+                    response_content = await self._stream_response(messages, on_section)
+                    logger.info("Stream fra Mistral API afsluttet.")
+                else:
+                    logger.info("Sender async request til Mistral API...")
+                    response_content = await self._chat(messages)
+                    logger.info("Modtog respons fra Mistral API.")
+
+            parsed_data = self._process_response(response_content)
+            if on_section is not None and cached is not None:
+                # Cache-hit: alle sektioner er klar med det samme
+                for name, value in parsed_data.items():
+                    await on_section(name, value)
+            # Cache først når svaret kunne parses, så fejlbehæftede svar prøves igen
+            if cache_key and cached is None:
+                await llm_response_cache.set(cache_key, {"content": response_content})
+            logger.debug(f"LLM-cache: {llm_response_cache.stats()}")
+            return parsed_data
+
+        except json.JSONDecodeError as json_err:
+            logger.error(f"JSONDecodeError: {json_err}")
+            logger.error(f"Problematic content:\n{response_content}")
+            raise Exception(f"Parsing-fejl: Kunne ikke parse JSON fra LLM - {json_err}") from json_err
+        except Exception as e:
+            logger.error("Uventet fejl i parse_payslip_async:", exc_info=True)
+            raise Exception(f"Parsing-fejl: {str(e)}")
+
+    async def _parse_sharded(
+        self, ocr_text: str, sections: Dict[str, str], on_section: Optional[OnSection]
+    ) -> Dict[str, Any]:
+        """
+        Udtrækker hver shard (metadata, løn, skat, ...) med sin egen lille prompt
+        og kun sit OCR-uddrag. Kaldene kører samtidigt og flettes til samme
+        skema som den samlede prompt.
+        """
+        logger.info(f"Sharded udtræk af {len(SECTION_SHARDS)} sektioner ({', '.join(sections)} fundet i OCR-teksten)")
+        merged = await self._run_shards(list(SECTION_SHARDS), ocr_text, sections, on_section)
+        # Samme nøglerækkefølge som skabelonen; manglende/afledte felter udfyldes i _finalize
+        parsed_data = {key: merged[key] for key in JSON_TEMPLATE if key in merged}
+        return self._finalize(parsed_data)
+
+    async def _complete_prefilled(
+        self, ocr_text: str, prefilled: Dict[str, Any], on_section: Optional[OnSection]
+    ) -> Dict[str, Any]:
+        """
+        Færdiggør et regeludtræk: kun de shards reglerne ikke kunne udfylde
+        entydigt sendes til Mistral, og regel-værdierne vinder ved fletningen.
+        """
+        data = prefilled["data"]
+        missing = prefilled["missing_shards"]
+
+        if on_section is not None:
+            for shard, spec in SECTION_SHARDS.items():
+                if shard in missing:
+                    continue
+                for key in spec["keys"]:
+                    if key in data:
+                        self._clean_numeric_values(data[key])
+                        await on_section(key, data[key])
+
+        if missing:
+            logger.info(f"Layout {prefilled['layout']}: henter {', '.join(missing)} fra Mistral")
+            llm_data = await self._run_shards(missing, ocr_text, split_ocr_sections(ocr_text), on_section)
+            data = fill_missing(data, llm_data)
+        else:
+            logger.info(f"Layout {prefilled['layout']}: alle felter udfyldt af regler - Mistral springes over")
+        return self._finalize(data)
+
+    async def _run_shards(
+        self, shards: List[str], ocr_text: str, sections: Dict[str, str], on_section: Optional[OnSection]
+    ) -> Dict[str, Any]:
+        """Kører de angivne shards samtidigt og returnerer deres nøgler samlet."""
+
+        async def run_shard(shard: str) -> Dict[str, Any]:
+            keys = SECTION_SHARDS[shard]["keys"]
+            # Mangler shardens sektioner, får den hele teksten i stedet
+            excerpt = shard_excerpt(shard, sections) or ocr_text
+
+            cache_key = llm_cache_key(excerpt, f"{self.model}:{shard}") if settings.LLM_CACHE_ENABLED else None
+            cached = await llm_response_cache.get(cache_key) if cache_key else None
+            if cached is not None:
+                content = cached["content"]
+            else:
+                messages = [ChatMessage(role="user", content=build_section_prompt(shard, excerpt))]
+                content = await self._chat(messages)
+
+            data = self._parse_json_content(content)
+            if cache_key and cached is None:
+                await llm_response_cache.set(cache_key, {"content": content})
+
+            result = {key: data[key] for key in keys if key in data}
+            if on_section is not None:
+                for name, value in result.items():
+                    self._clean_numeric_values(value)
+                    await on_section(name, value)
+            return result
+
+        merged: Dict[str, Any] = {}
+        for result in await asyncio.gather(*(run_shard(shard) for shard in shards)):
+            merged.update(result)
+        return merged
+
+    async def _chat(self, messages: List[ChatMessage]) -> str:
+        chat_response = await self.async_client.chat(model=self.model, messages=messages)
+        self._record_usage(chat_response.usage)
+        return self._response_content(chat_response)
+
+    def _record_usage(self, usage) -> None:
+        self.usage["requests"] += 1
+        if usage is not None:
+            self.usage["prompt_tokens"] += usage.prompt_tokens or 0
+            self.usage["completion_tokens"] += usage.completion_tokens or 0
+
+    def _build_messages(self, ocr_text: str, layout_id: Optional[str] = None) -> List[ChatMessage]:
+        """Bygger prompten med JSON-skabelonen og OCR-teksten (og evt. layoutets variant)."""
+        # Log the received OCR text (truncated for brevity)
+        logger.info(f"Parsing lønseddel med OCR-tekst (første 100 tegn): {ocr_text[:100]}...")
+        return [ChatMessage(role="user", content=build_prompt(ocr_text, layout_id))]
+
+    async def _stream_response(self, messages: List[ChatMessage], on_section: OnSection) -> str:
+        """Forbruger token-streamen og sender færdige sektioner videre undervejs."""
+        sections = JsonSectionStream()
+        parts = []
+        usage = None
+        async for chunk in self.async_client.chat_stream(model=self.model, messages=messages):
+            # Forbruget sendes med i den sidste chunk
+            usage = chunk.usage or usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            parts.append(delta)
+            for name, value in sections.feed(delta):
+                self._clean_numeric_values(value)
+                logger.debug(f"Sektion '{name}' færdig fra stream")
+                await on_section(name, value)
+        self._record_usage(usage)
+        return "".join(parts).strip()
+
+    def _response_content(self, chat_response) -> str:
+        # Log API response details
+        logger.debug(f"Mistral API finish_reason: {chat_response.choices[0].finish_reason}")
+        logger.debug(f"Mistral API model: {chat_response.model}")
+        return chat_response.choices[0].message.content.strip()
+
+    def _process_response(self, response_content: str) -> Dict[str, Any]:
+        """Renser og parser LLM-svaret til lønseddel-JSON."""
+        return self._finalize(self._parse_json_content(response_content))
+
+    def _parse_json_content(self, response_content: str) -> Dict[str, Any]:
+        """Fjerner code fences og kommentarer og parser svaret som JSON."""
+        # Log raw content (first 200 chars)
+        logger.debug(f"Rå respons fra API (første 200 tegn): {response_content[:200]}...")
         
-        # Fjern enkeltlinjekommentarer
-        json_str = re.sub(r'//.*?$', '', json_str, flags=re.MULTILINE)
+        # Fjern fenced code blocks hvis eksisterende
+        if response_content.startswith("```json"):
+            response_content = response_content[7:]
+        if response_content.endswith("```"):
+            response_content = response_content[:-3]
+        response_content = response_content.strip()
         
-        # Fjern blokkommentarer
-        json_str = re.sub(r'/\*.*?\*/', '', json_str, flags=re.DOTALL)
+        # Rens JSON før parsing - fjern kommentarer og anden ikke-valid JSON
+        cleaned_json = clean_json_string(response_content)
+        
+        # Parse JSON
+        try:
+            parsed_data = json.loads(cleaned_json)
+        except json.JSONDecodeError as e:
+            logger.error(f"Første forsøg på at parse JSON fejlede: {e}")
+            # Forsøg at bruge en mere robust JSON-parser som et fallback
+            import re
+            import ast
+            
+            # Fjern kommentarer i JSON
+            pattern = r'//.*?(?=\n|$)|/\*.*?\*/|\s*//.*?$'
+            no_comments = re.sub(pattern, '', cleaned_json, flags=re.DOTALL)
+            
+            # Erstatter 'null' med 'None', 'true' med 'True', etc.
+            no_comments = no_comments.replace('null', 'None').replace('true', 'True').replace('false', 'False')
+            
+            # Forsøg at parse med ast.literal_eval
+            try:
+                parsed_data = ast.literal_eval(no_comments)
+            except (SyntaxError, ValueError) as ast_err:
+                logger.error(f"Også fallback parsing fejlede: {ast_err}")
+                raise json.JSONDecodeError(str(e), cleaned_json, e.pos) from e
+        return parsed_data
+
+    def _finalize(self, parsed_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Rengør tal, udfylder afledte felter og logger hvad der mangler."""
+        # Rengør numeriske værdier i parsed_data
+        self._clean_numeric_values(parsed_data)
         
-        # Fjern kommentarer som "// ... resten af arbejdstiderne"
-        json_str = re.sub(r'// \.\.\. .*?$', '', json_str, flags=re.MULTILINE)
+        # Log key fields from parsed data
+        logger.info(f"Parset data for periode: {parsed_data.get('metadata', {}).get('periode')}")
+        logger.info(f"Lønseddel for: {parsed_data.get('metadata', {}).get('navn')}")
+        logger.info(f"Arbejdsplads: {parsed_data.get('metadata', {}).get('arbejdsplads')}")
+        logger.info(f"Samlet løn før skat: {parsed_data.get('løn', {}).get('samlet_løn_før_skat')}")
+        logger.info(f"Netto udbetalt: {parsed_data.get('løn', {}).get('netto_udbetalt')}")
         
-        # Håndter trailing commas
-        json_str = re.sub(r',(\s*[\]}])', r'\1', json_str)
+        # Log aantal arbejdstimer
+        arbejdstimer = parsed_data.get('arbejdstimer', [])
+        logger.info(f"Antal registrerede arbejdsdage: {len(arbejdstimer)}")
+        if arbejdstimer:
+            logger.debug(f"Første arbejdsdag: {pprint.pformat(arbejdstimer[0])}")
         
-        # Fjern usynlige kontroltegn
-        json_str = ''.join(ch for ch in json_str if ord(ch) >= 32 or ch in '\n\r\t')
+        # Tilføj manglende felter hvis Mistral ikke har inkluderet dem
+        self._ensure_required_fields(parsed_data)
         
-        # Håndter decimal-tal med to punktummer (31.805.89 -> 31805.89)
-        def fix_numbers(match):
-            num_str = match.group(0)
-            if num_str.count('.') > 1:
-                # Fjern alle punktummer og behold det sidste som decimalseparator
-                parts = num_str.split('.')
-                return ''.join(parts[:-1]) + '.' + parts[-1]
-            return num_str
+        # Hvis arbejdstimer_ics ikke er udfyldt, men arbejdstimer er, så lav dem selv
+        if parsed_data.get("arbejdstimer") and not parsed_data.get("arbejdstimer_ics"):
+            parsed_data["arbejdstimer_ics"] = self._convert_to_ics_format(parsed_data["arbejdstimer"])
         
-        json_str = re.sub(r'\d+\.\d+\.\d+', fix_numbers, json_str)
+        # Valider at alle påkrævede felter er til stede i dataudtrækningen
+        self.validate_extraction_completeness(parsed_data)
         
-        return json_str
+        logger.info("Succesfuldt parset JSON fra LLM.")
+        logger.debug(f"Komplet parset data: {pprint.pformat(parsed_data)}")
+        return parsed_data
     
     def _clean_numeric_values(self, data):
         """Rengør numeriske værdier i data strukturen for at sikre korrekt formatering"""
@@ -0,0 +1,351 @@
+"""
+Prompts og JSON-skabelon til LLM-udtræk af lønsedler.
+
+Den fulde prompt (`build_prompt`) beder om hele skabelonen på én gang. I
+sharded mode (`LLM_EXTRACTION_MODE=sharded`) deles OCR-teksten op efter
+sektionsmarkørerne fra OCRService (`### LØN ###` osv.), og hver shard får en
+lille prompt med kun sine nøgler, feltbeskrivelser og tekstuddrag.
+
+Bump settings.PROMPT_VERSION når teksterne her ændres, så cachede svar ikke
+genbruges på tværs af prompt-ændringer.
+"""
+import json
+import re
+from typing import Dict, List, Optional
+
+# JSON-skabelon til outputformat
+JSON_TEMPLATE = {
+    "metadata": {
+        "periode": None,
+        "cpr_nr": None,
+        "navn": None,
+        "adresse": None,
+        "arbejdsplads": None,
+        "lønseddel_nr": None,
+        "tjenestenr": None,
+        "anciennitetsdato": None,
+        "jubilæumsdato": None,
+        "næste_løntrinsstigning": None,
+        "område": None,
+        "overenskomst": None
+    },
+    "løn": {
+        "grundløn": {"trin": None, "beløb": None, "timer_pr_uge": None},
+        "tillæg": [],
+        "fast_løn_i_alt": None,
+        "særydelser": [],
+        "fradrag": [],
+        "samlet_løn_før_skat": None,
+        "netto_udbetalt": None,
+        "overførsel_dato": None
+    },
+    "skat": {
+        "arbejdsmarkedsbidrag": None,
+        "fradrag": None,
+        "skat": None,
+        "trækprocent": None
+    },
+    "a_skat_og_am_bidrag": {
+        "a_skat_beløb": None,
+        "a_skat_procent": None,
+        "am_bidrag_beløb": None,
+        "am_bidrag_procent": None
+    },
+    "pension": {
+        "eget_bidrag": None,
+        "pensionsprocent": None,
+        "samlet_pensionsbidrag": None
+    },
+    "bruttoløn": {
+        "beløb": None,
+        "heraf_pension": None
+    },
+    "feriepenge": {
+        "optjent": None,
+        "udbetalt": None
+    },
+    "ferie": {
+        "6_uge": None,
+        "ferie_med_løn_saldo": None,
+        "ferie_uden_løn_saldo": None,
+        "feriegodtgørelse_ekstra_tjeneste": None,
+        "feriegodtgørelse_fond": None,
+        "ferietillæg_maj": None
+    },
+    "afspadsering": {
+        "afholdt_timer": None,
+        "optjent_timer": None,
+        "saldo_start": None,
+        "saldo_slut": None
+    },
+    "særydelser": [],
+    "arbejdstimer": [],
+    "arbejdstimer_ics": []
+}
+
+# Prompt-dele - bygges ved konkatenering (ikke f-strings) pga. klammerne i skabelonen
+PROMPT_INTRO = """
+Du er en specialiseret assistent, der analyserer danske lønsedler.
+Din opgave er at udtrække alle nøgleoplysninger og formatere dem som JSON i nøjagtigt samme struktur som denne skabelon:
+"""
+
+PROMPT_OVERVIEW = """
+
+# Analyseproces
+1. Læs HELE lønseddelteksten grundigt igennem for at få overblik over dokumentet.
+2. Vær opmærksom på den komplekse struktur af lønsedler - de kan have både forside og bagside med vigtige detaljer.
+3. Identificer alle sektioner: metadata, løndele, ferie, afspadsering og især arbejdstimer fra arbejdstidsopgørelsen.
+4. Udtryk alle beløb som tal uden tusindtalsadskiller og med punktum som decimaltegn.
+5. Konverter og standardiser alle data efter retningslinjerne nedenfor.
+
+# Vigtige dokumentsektioner at finde
+1. Hovedsektion med grundoplysninger (typisk øverst på første side)
+2. Periode og metadata (CPR, navn, adresse, arbejdsplads, tjenestenr osv.)
+3. Lønsektioner: grundløn, tillæg, særydelser, fradrag
+4. Ferieregnskab og feriegodtgørelser (ofte på bagside)
+5. Afspadseringsregnskab (typisk på bagsiden)
+6. Arbejdstidsopgørelse eller optælling af timer (detaljeret oversigt over alle arbejdsdage)
+
+# Vigtige detaljer at fokusere på
+
+"""
+
+# Feltbeskrivelser pr. top-level nøgle i skabelonen
+FIELD_GUIDES = {
+    "metadata": """## Metadata
+- periode: Perioden lønsedlen dækker (f.eks. "september 2024" eller "01.09-30.09.2024")
+- cpr_nr: CPR-nummer - find formatet XXXXXX-XXXX (f.eks. "080498-0075")
+- navn: Medarbejderens fulde navn (f.eks. "Ernst Cæsius Jakobsen Krohn")
+- adresse: Komplet adresse med gade, nummer, etage og postnummer/by
+- arbejdsplads: Arbejdspladsens fulde navn (f.eks. "Region Hovedstadens Psykiatri")
+- lønseddel_nr: Lønseddelnummer format MM/ÅÅÅÅ (f.eks. "09/2024")
+- tjenestenr: Tjenestenummer - søg efter "Tjenestenr" eller "Tjnr" (f.eks. "15893")
+- anciennitetsdato: Dato for anciennitet (f.eks. "01.08.2024")
+- jubilæumsdato: Dato for jubilæum (f.eks. "25.08.2022")
+- næste_løntrinsstigning: Dato for næste løntrinsstigning (f.eks. "01.08.2028")
+- område: Områdenummer (f.eks. "4")
+- overenskomst: Overenskomstoplysninger (f.eks. "Ikke-ledende personale på SHK-området")
+
+""",
+    "løn": """## Løn
+- grundløn: Objekt med:
+  - trin: Løntrinnet (f.eks. "04")
+  - beløb: Beløbet uden tusindtalsadskiller (f.eks. 24559.41)
+  - timer_pr_uge: Timer pr. uge (f.eks. 32)
+- tillæg: Liste af tillæg med type og beløb. Hvert tillæg er et objekt med:
+  - type: Beskrivelse af tillægget (f.eks. "Lukket afsnit/afd. PV")
+  - beløb: Beløb uden tusindtalsadskiller (f.eks. 1751.08)
+  - pensionsgivende: true hvis markeret med "P", ellers false
+- fast_løn_i_alt: Samlet fast løn (f.eks. 27477.38)
+- fradrag: Liste over fradrag. Hvert fradrag er et objekt med:
+  - type: Type fradrag (f.eks. "Feriefradrag" eller "ATP bidrag")
+  - beløb: Beløb (f.eks. -161.18)
+- samlet_løn_før_skat: Samlet løn før skat (f.eks. 27878.86)
+- netto_udbetalt: Nettobeløb udbetalt (f.eks. 17057.86)
+- overførsel_dato: Dato for overførsel (f.eks. "2024-09-30")
+
+""",
+    "skat": """## Skat
+- arbejdsmarkedsbidrag: Arbejdsmarkedsbidrag beløb (f.eks. 2230.00)
+- fradrag: Skattefradrag (f.eks. 4694.00)
+- skat: Samlet skattebeløb (f.eks. 8591.00)
+- trækprocent: Skatteprocent (f.eks. 41)
+
+""",
+    "a_skat_og_am_bidrag": """## A-skat og AM-bidrag
+- a_skat_beløb: A-skat beløb (f.eks. 8591.00)
+- a_skat_procent: A-skat procent (f.eks. 41)
+- am_bidrag_beløb: AM-bidrag beløb (f.eks. 2230.00)
+- am_bidrag_procent: AM-bidrag procent (f.eks. 8)
+
+""",
+    "pension": """## Pension
+- samlet_pensionsbidrag: Samlet pensionsbidrag (f.eks. 3751.56)
+- eget_bidrag: Eget bidrag til pension (f.eks. 1250.52)
+- pensionsprocent: Pensionsprocent (f.eks. 13.55)
+
+""",
+    "bruttoløn": """## Bruttoløn
+- beløb: Samlet bruttoløn - samme som samlet_løn_før_skat (f.eks. 27878.86)
+- heraf_pension: Pensionsbidrag inkluderet i bruttolønnen (f.eks. 3751.56)
+
+""",
+    "feriepenge": """## Feriepenge
+- optjent: Optjente feriepenge (f.eks. 4634.24)
+- udbetalt: Udbetalte feriepenge (hvis angivet, ellers null)
+
+""",
+    "ferie": """## Ferie
+- ferie_med_løn_saldo: Saldo for ferie med løn (f.eks. 0.00)
+- ferie_uden_løn_saldo: Saldo for ferie uden løn (f.eks. -4.01)
+- 6_uge: Sjette ferieuge (f.eks. 32.00)
+- feriegodtgørelse_fond: Feriegodtgørelse til fond (f.eks. 48.50)
+- feriegodtgørelse_ekstra_tjeneste: Feriegodtgørelse af ekstra tjeneste
+- ferietillæg_maj: Ferietillæg (f.eks. 290.85)
+
+""",
+    "afspadsering": """## Afspadsering
+- saldo_start: Saldo ved periodens start (f.eks. 11.28)
+- optjent_timer: Optjente timer i perioden (f.eks. 7.52)
+- afholdt_timer: Afholdte timer i perioden (f.eks. 8.00)
+- saldo_slut: Saldo ved periodens slutning (f.eks. 10.80)
+
+""",
+    "særydelser": """## Særydelser
+Hver særydelse er et objekt med:
+- type: Type særydelse (f.eks. "Lørdagstillæg" eller "Aftentillæg")
+- antal: Antal enheder (f.eks. 8.0)
+- sats: Sats pr. enhed (f.eks. 93.13)
+- beløb: Samlet beløb (f.eks. 745.04)
+- pensionsgivende: true hvis markeret med "P", ellers false
+
+""",
+    "arbejdstimer": """## Arbejdstimer
+For hver dag med arbejdstid fra "Arbejdstidsopgørelse"-sektionen, opret et objekt med:
+- dato: Dato i format YYYY-MM-DD (f.eks. "2024-08-05")
+- arbejdstid: Arbejdstidsinterval (f.eks. "07:00-15:00")
+- normtid: Normtid i timer (f.eks. 8.0)
+- fravær: Type fravær hvis relevant (f.eks. "Ferietimer", "Kursustimer" eller null)
+- tillæg: Liste af tillæg for denne dag (f.eks. [{"type": "Aftentillæg", "timer": 6.0}])
+
+""",
+    "arbejdstimer_ics": """## Arbejdstimer ICS
+Konvertering af arbejdstimer til kalendervenligt format med:
+- start_tid: Starttidspunkt i ISO format (f.eks. "2024-08-05T07:00:00")
+- slut_tid: Sluttidspunkt i ISO format (f.eks. "2024-08-05T15:00:00")
+- summary: Beskrivelse (f.eks. "Arbejdstid")
+- description: Detaljer om vagten (f.eks. "Normaltid: 8 timer")
+
+""",
+}
+
+PROMPT_FORMATTING = """# Særlige formateringsretningslinjer
+- Konverter alle beløb til tal uden tusindtalsadskiller og med punktum som decimaltegn.
+- Fjern "P" og "*" fra beløb, men registrer deres betydning i objektstrukturen.
+- Markering med "P" angiver pensionsgivende beløb - sæt pensionsgivende: true for disse.
+- Negative beløb (f.eks. -161.18) skal beholde minustegnet.
+- Hvis visse data ikke findes i lønsedlen, sæt værdien til null.
+- For datoer, brug formatet YYYY-MM-DD (f.eks. "2024-09-30").
+
+"""
+
+PROMPT_WORKTIME_FOCUS = """# Særligt fokus på arbejdstidsopgørelsen
+- Find sektionen "Arbejdstidsopgørelse" eller "Optælling af timer".
+- For hver dato med registreret arbejdstid, ekstrahér det komplette mønster:
+  * Dato (konverter til YYYY-MM-DD format)
+  * Arbejdstidsinterval (f.eks. "07:00-15:00")
+  * Normtid (antal timer)
+  * Fraværstype hvis relevant (f.eks. "Ferietimer", "Kursustimer")
+  * Eventuelle tillæg (f.eks. "Aftentillæg")
+- Registrer også dage med fravær, såsom ferie, kursus eller sygdom.
+- I nogle tabeller kan arbejdstid vises uge for uge i datokolonner - vær opmærksom på dette format.
+
+"""
+
+PROMPT_SECTION_HINTS = """# Vigtige sektioner at søge efter
+- "Lønseddel", "Periode", "Løn", "Fast løn", "Særydelser", "Skatteberegning", "Arbejdstidsopgørelse"
+- "Specifikation af særydelser", "Ferieregnskab", "Afspadseringsregnskab", "Tilgodehavende afspadsering"
+- "Optælling af timer", "Feriegodtgørelser", "Samlet pensionsbidrag"
+
+"""
+
+PROMPT_OUTRO = """Returner KUN det endelige JSON-objekt uden forklarende tekst eller kommentarer.
+
+OCR-tekst:
+"""
+
+SHARD_INTRO = """
+Du er en specialiseret assistent, der analyserer danske lønsedler.
+Din opgave er at udtrække udvalgte oplysninger fra et uddrag af en lønseddel og formatere dem som JSON i nøjagtigt samme struktur som denne skabelon:
+"""
+
+SHARD_FIELDS_HEADER = """
+
+# Vigtige detaljer at fokusere på
+
+"""
+
+SHARD_OUTRO = """Returner KUN det endelige JSON-objekt uden forklarende tekst eller kommentarer.
+
+OCR-tekst (uddrag):
+"""
+
+# Shards til sharded udtræk: skabelon-nøgler og de OCR-sektioner de læser fra.
+# arbejdstimer_ics udledes af arbejdstimer og spørges derfor ikke om.
+SECTION_SHARDS = {
+    "metadata": {"keys": ["metadata"], "markers": ["METADATA"]},
+    "løn": {"keys": ["løn", "særydelser", "bruttoløn"], "markers": ["LØN", "PENSION"]},
+    "skat": {"keys": ["skat", "a_skat_og_am_bidrag"], "markers": ["SKAT", "AM-BIDRAG"]},
+    "pension": {"keys": ["pension"], "markers": ["PENSION", "LØN"]},
+    "ferie": {"keys": ["ferie", "feriepenge", "afspadsering"], "markers": ["FERIE"]},
+    "timer": {"keys": ["arbejdstimer"], "markers": ["TIMER"]},
+}
+
+# Layout-specifikke tilføjelser til den samlede prompt, slået op på layout-id
+# fra layout-indekset (se app/services/layout_index.py)
+LAYOUT_PROMPT_HINTS = {
+    "silkeborg_data": """# Om dette lønseddel-layout
+- Lønsedlen er dannet af Silkeborg Data: grundløn står som "Grundløn trin NN" efterfulgt af beløbet.
+- Under "Særydelser" har hver linje kolonnerne antal, sats og beløb; et "P" efter beløbet betyder pensionsgivende.
+- Arbejdstidsopgørelsen har én linje pr. dag med dato, tidsrum og normtid.
+
+""",
+}
+
+_MARKER_RE = re.compile(r"^### (.+?) ###$", re.MULTILINE)
+
+
+def build_prompt(ocr_text: str, layout_id: Optional[str] = None) -> str:
+    """
+    Den fulde prompt med hele skabelonen og alle feltbeskrivelser, samt
+    layoutets egne hints hvis `layout_id` har en variant.
+    """
+    template_json = json.dumps(JSON_TEMPLATE, indent=2, ensure_ascii=False)
+    return (
+        PROMPT_INTRO + template_json + PROMPT_OVERVIEW + "".join(FIELD_GUIDES.values())
+        + PROMPT_FORMATTING + PROMPT_WORKTIME_FOCUS + PROMPT_SECTION_HINTS
+        + LAYOUT_PROMPT_HINTS.get(layout_id, "") + PROMPT_OUTRO
+        + ocr_text + "\n"
+    )
+
+
+def split_ocr_sections(ocr_text: str) -> Dict[str, str]:
+    """
+    Deler OCR-teksten op efter `### NAVN ###`-markørerne. Tekst før første
+    markør (typisk sidehovedet) regnes med til METADATA.
+    """
+    matches = list(_MARKER_RE.finditer(ocr_text))
+    if not matches:
+        return {}
+
+    sections: Dict[str, str] = {}
+    preamble = ocr_text[:matches[0].start()].strip()
+    if preamble:
+        sections["METADATA"] = preamble
+    for idx, match in enumerate(matches):
+        end = matches[idx + 1].start() if idx + 1 < len(matches) else len(ocr_text)
+        text = ocr_text[match.end():end].strip()
+        name = match.group(1)
+        sections[name] = (sections[name] + "\n" + text) if name in sections else text
+    return sections
+
+
+def shard_excerpt(shard: str, sections: Dict[str, str]) -> str:
+    """OCR-uddraget en shard skal se (tom streng hvis ingen af dens sektioner findes)."""
+    parts: List[str] = [
+        f"### {marker} ###\n{sections[marker]}"
+        for marker in SECTION_SHARDS[shard]["markers"]
+        if sections.get(marker)
+    ]
+    return "\n\n".join(parts)
+
+
+def build_section_prompt(shard: str, ocr_excerpt: str) -> str:
+    """Lille, målrettet prompt for én shard."""
+    keys = SECTION_SHARDS[shard]["keys"]
+    template_json = json.dumps({key: JSON_TEMPLATE[key] for key in keys}, indent=2, ensure_ascii=False)
+    focus = PROMPT_WORKTIME_FOCUS if "arbejdstimer" in keys else ""
+    return (
+        SHARD_INTRO + template_json + SHARD_FIELDS_HEADER + "".join(FIELD_GUIDES[key] for key in keys)
+        + PROMPT_FORMATTING + focus + SHARD_OUTRO + ocr_excerpt + "\n"
+    )
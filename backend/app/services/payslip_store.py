@@ -0,0 +1,151 @@
+import calendar
+import logging
+import re
+from datetime import date, datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy.dialects.postgresql import insert
+
+from app.db import AsyncSessionLocal
+from app.models import Payslip
+
+logger = logging.getLogger(__name__)
+
+MONTHS = {
+    "januar": 1, "februar": 2, "marts": 3, "april": 4, "maj": 5, "juni": 6,
+    "juli": 7, "august": 8, "september": 9, "oktober": 10, "november": 11, "december": 12,
+}
+
+_DMY_RE = re.compile(r"(\d{1,2})[.-](\d{1,2})[.-](\d{4})")
+_ISO_RE = re.compile(r"(\d{4})-(\d{2})-(\d{2})")
+_MONTH_YEAR_RE = re.compile(r"(?:^|\D)(\d{1,2})[/.-](\d{4})(?!\d)|(\d{4})-(\d{2})(?![-\d])")
+_MONTH_NAME_RE = re.compile(r"(" + "|".join(MONTHS) + r")\w*\s+(\d{4})", re.IGNORECASE)
+
+
+def _number(value: Any) -> Optional[float]:
+    """Tal fra LLM-output: 24559.41, "24.559,41", "24559.41" eller {"beløb": ...}."""
+    if isinstance(value, dict):
+        value = value.get("beløb")
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        value = value.strip().replace(" ", "")
+        if "," in value:
+            value = value.replace(".", "").replace(",", ".")
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return None
+
+
+def _end_of_month(year: int, month: int) -> Optional[date]:
+    if not 1 <= month <= 12:
+        return None
+    return date(year, month, calendar.monthrange(year, month)[1])
+
+
+def period_end_date(period: Any) -> Optional[date]:
+    """
+    Slutdatoen for en lønperiode som LLM'en skriver den: "01.09.2024 - 30.09.2024",
+    "01.09-30.09.2024", "2024-09-30", "september 2024" eller "09/2024".
+    """
+    if not isinstance(period, str) or not period.strip():
+        return None
+    try:
+        dmy = _DMY_RE.findall(period)
+        if dmy:
+            day, month, year = dmy[-1]
+            return date(int(year), int(month), int(day))
+        iso = _ISO_RE.findall(period)
+        if iso:
+            year, month, day = iso[-1]
+            return date(int(year), int(month), int(day))
+        named = _MONTH_NAME_RE.findall(period)
+        if named:
+            month_name, year = named[-1]
+            return _end_of_month(int(year), MONTHS[month_name.lower()])
+        numeric = _MONTH_YEAR_RE.findall(period)
+        if numeric:
+            month, year, iso_year, iso_month = numeric[-1]
+            return _end_of_month(int(year or iso_year), int(month or iso_month))
+    except ValueError:
+        return None
+    return None
+
+
+def summary_columns(parsed_data: Dict[str, Any], fallback_date: date) -> Dict[str, Any]:
+    """
+    Opsummerende kolonner for `payslips` udledt af det parsede resultat.
+    Datoen er lønperiodens slutdato (ellers overførselsdatoen, ellers `fallback_date`).
+    """
+    metadata = parsed_data.get("metadata") or {}
+    salary = parsed_data.get("løn") or {}
+
+    gross = (
+        _number(parsed_data.get("bruttoløn"))
+        or _number(salary.get("samlet_løn_før_skat"))
+        or _number(salary.get("fast_løn_i_alt"))
+    )
+    net = _number(salary.get("netto_udbetalt"))
+    hours = [
+        _number(day.get("normtid")) for day in parsed_data.get("arbejdstimer") or [] if isinstance(day, dict)
+    ]
+    hours = [h for h in hours if h is not None]
+
+    return {
+        "date": (
+            period_end_date(metadata.get("periode"))
+            or period_end_date(salary.get("overførsel_dato"))
+            or fallback_date
+        ),
+        "gross_salary": gross,
+        "net_salary": net,
+        "deductions_total": round(gross - net, 2) if gross is not None and net is not None else None,
+        "work_hours": round(sum(hours), 2) if hours else None,
+    }
+
+
+class PayslipStore:
+    """
+    Gemmer parsede lønsedler i tabellen `payslips`: hele resultatet som JSONB
+    plus opsummerende kolonner (dato, brutto, netto, fradrag, timer), så
+    historik og sammenligninger er indekserede forespørgsler.
+    """
+
+    async def save(
+        self,
+        user_id: int,
+        parsed_data: Dict[str, Any],
+        content_hash: Optional[str] = None,
+        filename: Optional[str] = None,
+    ) -> int:
+        """
+        Indsætter lønsedlen og returnerer dens id. Den samme fil (samme SHA-256)
+        uploadet igen af samme bruger opdaterer den eksisterende række.
+        """
+        now = datetime.utcnow()
+        values = {
+            "user_id": user_id,
+            "content_hash": content_hash,
+            "file_path": filename,
+            "parsed_data": parsed_data,
+            **summary_columns(parsed_data, now.date()),
+        }
+        stmt = insert(Payslip).values(created_at=now, **values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Payslip.user_id, Payslip.content_hash],
+            set_={key: value for key, value in values.items() if key not in ("user_id", "content_hash")},
+        ).returning(Payslip.id)
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(stmt)
+            payslip_id = result.scalar_one()
+            await session.commit()
+
+        logger.info(f"Lønseddel {payslip_id} gemt for bruger {user_id} ({values['date']})")
+        return payslip_id
+
+
+payslip_store = PayslipStore()
@@ -0,0 +1,118 @@
+import logging
+from typing import Dict, List, Optional
+
+import pypdfium2 as pdfium
+import pypdfium2.raw as pdfium_c
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Tegn der altid afslutter et ord
+_BREAK_CHARS = {" ", "\t", "\r", "\n", "\u00a0"}
+
+
+def count_pdf_pages(file_path: str) -> int:
+    """Antal sider i en PDF (uden at indlæse eller rendere siderne)."""
+    pdf = pdfium.PdfDocument(file_path)
+    try:
+        return len(pdf)
+    finally:
+        pdf.close()
+
+
+class PdfTextLayerExtractor:
+    """
+    Udtrækker ord med geometri direkte fra en PDF's indlejrede tekstlag.
+
+    Siderne returneres i samme struktur som docTR's `export()` (blocks → lines →
+    words med `value` og relativ `geometry`), så OCRService' linje-, tabel- og
+    sektionslogik kan køre uændret. Sider uden brugbar tekst returneres som None
+    og skal OCR'es.
+    """
+
+    def __init__(self, file_path: str, min_chars: Optional[int] = None):
+        self.pdf = pdfium.PdfDocument(file_path)
+        self.min_chars = settings.PDF_TEXT_LAYER_MIN_CHARS if min_chars is None else min_chars
+
+    def close(self) -> None:
+        self.pdf.close()
+
+    def __len__(self) -> int:
+        return len(self.pdf)
+
+    def extract_pages(self) -> List[Optional[Dict]]:
+        return [self.extract_page(idx) for idx in range(len(self.pdf))]
+
+    def extract_page(self, page_idx: int) -> Optional[Dict]:
+        """Returnerer siden i docTR-format, eller None hvis tekstlaget ikke er brugbart."""
+        page = self.pdf[page_idx]
+        try:
+            words = self._extract_words(page)
+        finally:
+            page.close()
+
+        if sum(len(w["value"]) for w in words) < self.min_chars:
+            return None
+        return {"blocks": [{"lines": [{"words": words}]}]}
+
+    def render_pages(self, page_indices: List[int], scale: float = 2) -> List:
+        """Rasteriserer udvalgte sider til numpy-arrays (samme indstillinger som DocumentFile.from_pdf)."""
+        images = []
+        for idx in page_indices:
+            page = self.pdf[idx]
+            try:
+                images.append(page.render(scale=scale, rev_byteorder=True).to_numpy())
+            finally:
+                page.close()
+        return images
+
+    def _extract_words(self, page) -> List[Dict]:
+        left, bottom, right, top = page.get_cropbox()
+        width = right - left
+        height = top - bottom
+        if width <= 0 or height <= 0:
+            return []
+
+        textpage = page.get_textpage()
+        try:
+            words = []
+            current = None  # [tekst, x1, y1, x2, y2]
+
+            def flush():
+                if current and current[0].strip():
+                    x1, y1, x2, y2 = current[1:]
+                    words.append({
+                        "value": current[0],
+                        "geometry": (
+                            (min(max((x1 - left) / width, 0.0), 1.0), min(max((top - y2) / height, 0.0), 1.0)),
+                            (min(max((x2 - left) / width, 0.0), 1.0), min(max((top - y1) / height, 0.0), 1.0)),
+                        ),
+                    })
+
+            for idx in range(textpage.count_chars()):
+                char = chr(pdfium_c.FPDFText_GetUnicode(textpage.raw, idx))
+                if char in _BREAK_CHARS or pdfium_c.FPDFText_IsGenerated(textpage.raw, idx) == 1:
+                    flush()
+                    current = None
+                    continue
+
+                cx1, cy1, cx2, cy2 = textpage.get_charbox(idx, loose=True)
+                if current is not None:
+                    char_height = max(cy2 - cy1, current[4] - current[2], 1e-6)
+                    same_line = abs((cy1 + cy2) / 2 - (current[2] + current[4]) / 2) < char_height * 0.5
+                    small_gap = cx1 - current[3] < char_height * 0.3
+                    if same_line and small_gap:
+                        current[0] += char
+                        current[1] = min(current[1], cx1)
+                        current[2] = min(current[2], cy1)
+                        current[3] = max(current[3], cx2)
+                        current[4] = max(current[4], cy2)
+                        continue
+                    flush()
+                current = [char, cx1, cy1, cx2, cy2]
+
+            flush()
+            return words
+        finally:
+            textpage.close()
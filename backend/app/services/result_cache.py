@@ -0,0 +1,217 @@
+import copy
+import hashlib
+import logging
+import re
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import delete, select as sql_select, update
+from sqlalchemy.dialects.postgresql import insert
+
+from app.config import settings
+from app.db import AsyncSessionLocal
+from app.models import ResultCacheEntry
+
+logger = logging.getLogger(__name__)
+
+
+class ResultCache:
+    """
+    Persistent cache i Postgres-tabellen `result_cache`, opdelt i namespaces.
+
+    Entries ældre end `max_age` ignoreres og slettes, og hvert namespace holdes
+    under `max_entries` ved at fjerne de mindst nyligt brugte. Fejl i cachen
+    logges men får aldrig en upload til at fejle.
+
+    Med `memory_entries` > 0 ligger en proces-lokal LRU foran tabellen, så
+    gentagne opslag ikke rammer databasen.
+    """
+
+    def __init__(self, namespace: str, max_entries: int, max_age: timedelta, memory_entries: int = 0):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.memory_entries = memory_entries
+        self._memory: "OrderedDict[str, Tuple[datetime, Any]]" = OrderedDict()
+        self.hits = 0
+        self.memory_hits = 0
+        self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "namespace": self.namespace,
+            "hits": self.hits,
+            "memory_hits": self.memory_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "memory_size": len(self._memory),
+        }
+
+    def _memory_get(self, key: str) -> Optional[Any]:
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        created_at, value = entry
+        if created_at < datetime.utcnow() - self.max_age:
+            del self._memory[key]
+            return None
+        self._memory.move_to_end(key)
+        return copy.deepcopy(value)
+
+    def _memory_set(self, key: str, value: Any, created_at: datetime) -> None:
+        if self.memory_entries <= 0:
+            return
+        self._memory[key] = (created_at, copy.deepcopy(value))
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    async def get(self, key: str) -> Optional[Any]:
+        value = self._memory_get(key)
+        if value is not None:
+            self.hits += 1
+            self.memory_hits += 1
+            return value
+
+        value = await self._db_get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def peek(self, key: str) -> Optional[Any]:
+        """Som `get`, men tæller ikke som et opslag i statistikken eller i entryens hits."""
+        value = self._memory_get(key)
+        if value is not None:
+            return value
+        try:
+            async with AsyncSessionLocal() as session:
+                result = await session.execute(
+                    sql_select(ResultCacheEntry.value).where(
+                        ResultCacheEntry.namespace == self.namespace,
+                        ResultCacheEntry.cache_key == key,
+                        ResultCacheEntry.created_at >= datetime.utcnow() - self.max_age,
+                    )
+                )
+                return result.scalar_one_or_none()
+        except Exception as e:
+            logger.warning(f"Opslag i cache '{self.namespace}' fejlede: {e}")
+            return None
+
+    async def _db_get(self, key: str) -> Optional[Any]:
+        try:
+            async with AsyncSessionLocal() as session:
+                result = await session.execute(
+                    sql_select(ResultCacheEntry.id, ResultCacheEntry.value, ResultCacheEntry.created_at).where(
+                        ResultCacheEntry.namespace == self.namespace,
+                        ResultCacheEntry.cache_key == key,
+                        ResultCacheEntry.created_at >= datetime.utcnow() - self.max_age,
+                    )
+                )
+                row = result.first()
+                if row is None:
+                    return None
+
+                await session.execute(
+                    update(ResultCacheEntry)
+                    .where(ResultCacheEntry.id == row.id)
+                    .values(last_accessed_at=datetime.utcnow(), hits=ResultCacheEntry.hits + 1)
+                )
+                await session.commit()
+                self._memory_set(key, row.value, row.created_at)
+                return row.value
+        except Exception as e:
+            logger.warning(f"Opslag i cache '{self.namespace}' fejlede: {e}")
+            return None
+
+    async def set(self, key: str, value: Any) -> None:
+        now = datetime.utcnow()
+        self._memory_set(key, value, now)
+        try:
+            async with AsyncSessionLocal() as session:
+                stmt = insert(ResultCacheEntry).values(
+                    namespace=self.namespace,
+                    cache_key=key,
+                    value=value,
+                    created_at=now,
+                    last_accessed_at=now,
+                    hits=0,
+                )
+                stmt = stmt.on_conflict_do_update(
+                    constraint="uq_result_cache_namespace_key",
+                    set_={"value": stmt.excluded.value, "created_at": now, "last_accessed_at": now},
+                )
+                await session.execute(stmt)
+                await session.commit()
+            await self.evict()
+        except Exception as e:
+            logger.warning(f"Skrivning til cache '{self.namespace}' fejlede: {e}")
+
+    async def evict(self) -> None:
+        """Fjerner for gamle entries og de mindst nyligt brugte ud over max_entries."""
+        async with AsyncSessionLocal() as session:
+            await session.execute(
+                delete(ResultCacheEntry).where(
+                    ResultCacheEntry.namespace == self.namespace,
+                    ResultCacheEntry.created_at < datetime.utcnow() - self.max_age,
+                )
+            )
+            overflow = (
+                sql_select(ResultCacheEntry.id)
+                .where(ResultCacheEntry.namespace == self.namespace)
+                .order_by(ResultCacheEntry.last_accessed_at.desc())
+                .offset(self.max_entries)
+            )
+            await session.execute(
+                delete(ResultCacheEntry).where(ResultCacheEntry.id.in_(overflow))
+            )
+            await session.commit()
+
+
+_max_age = timedelta(days=settings.RESULT_CACHE_MAX_AGE_DAYS)
+
+# OCR-tekst pr. filindhold og OCR-version
+ocr_text_cache = ResultCache("ocr_text", settings.RESULT_CACHE_MAX_ENTRIES, _max_age)
+# Parset JSON pr. filindhold, layout og versionerne af OCR, prompt og udtræk
+parsed_cache = ResultCache("parsed", settings.RESULT_CACHE_MAX_ENTRIES, _max_age)
+# Rå Mistral-svar pr. normaliseret OCR-tekst, model og prompt-version
+llm_response_cache = ResultCache(
+    "llm_response",
+    settings.LLM_CACHE_MAX_ENTRIES,
+    timedelta(days=settings.LLM_CACHE_TTL_DAYS),
+    memory_entries=settings.LLM_CACHE_MEMORY_ENTRIES,
+)
+
+_WHITESPACE_RE = re.compile(r"[ \t\u00a0]+")
+
+
+def ocr_cache_key(content_hash: str) -> str:
+    return f"{content_hash}:{settings.OCR_VERSION}"
+
+
+def parsed_cache_key(content_hash: str, layout_id: Optional[str] = None) -> str:
+    """Alt der ændrer det parsede resultat: OCR, prompt, udtræksmåde, regler og genkendt layout."""
+    rules = f"rules{settings.RULE_VERSION}" if settings.RULE_EXTRACTION_ENABLED else "norules"
+    return (
+        f"{content_hash}:{settings.OCR_VERSION}:{settings.PROMPT_VERSION}:"
+        f"{settings.LLM_EXTRACTION_MODE}:{rules}:{layout_id or '-'}"
+    )
+
+
+def normalize_ocr_text(text: str) -> str:
+    """
+    Normaliserer OCR-tekst før hashing, så tekst der kun adskiller sig i
+    whitespace, tomme linjer eller Unicode-form giver samme cache-nøgle.
+    """
+    text = unicodedata.normalize("NFC", text).replace("\r\n", "\n").replace("\r", "\n")
+    lines = (_WHITESPACE_RE.sub(" ", line).strip() for line in text.split("\n"))
+    return "\n".join(line for line in lines if line)
+
+
+def llm_cache_key(ocr_text: str, model: str) -> str:
+    digest = hashlib.sha256(normalize_ocr_text(ocr_text).encode("utf-8")).hexdigest()
+    return f"{digest}:{model}:{settings.PROMPT_VERSION}"
@@ -0,0 +1,382 @@
+import copy
+import logging
+import re
+from typing import Any, Dict, List, Optional
+
+from app.services.payslip_prompts import JSON_TEMPLATE, SECTION_SHARDS
+
+logger = logging.getLogger(__name__)
+
+# Beløb som de ser ud efter OCRService' efterbehandling: "24.559.41", "1751.08", "161.18-".
+# Efterbehandlingen kan lime tal sammen ("8.0093.13745.04"), men da beløb altid har
+# to decimaler, kan de skilles ad igen ved at læse dem fra venstre mod højre.
+AMOUNT_RE = re.compile(r"-?(?:\d{1,3}(?:\.\d{3})+|\d+)\.\d{2}-?")
+DATE = r"\d{2}\.\d{2}\.\d{2,4}"
+
+# Overskrifter kan være markeret som "## TEKST ##" af OCRService - tillad det overalt
+_LINE_START = r"(?im)^(?:#+\s*)?"
+
+# Sektioner der udledes af andre felter i ParserService._ensure_required_fields,
+# hvis reglerne ikke selv har udfyldt dem
+DERIVED_SECTIONS = ("a_skat_og_am_bidrag", "bruttoløn", "feriepenge")
+
+# Fravær og tillæg der kan stå på en linje i arbejdstidsopgørelsen
+ABSENCE_TYPES = ("Ferietimer", "Ferie", "Kursustimer", "Kursus", "Sygdom", "Syg", "Afspadsering", "Omsorgsdag")
+SUPPLEMENT_TYPES = ("Aftentillæg", "Nattillæg", "Lørdagstillæg", "Søndagstillæg", "Helligdagstillæg", "Weekendtillæg")
+
+# Regler pr. kendt layout.
+#   fingerprint: tekster der kendetegner netop dette layout - leverandørens navn
+#                alene, eller mindst `min_headers` af layoutets faste overskrifter
+#                (generiske ord som "a-skat" og "trækprocent" står på alle lønsedler)
+#   fields:  dot-sti i skabelonen -> (regex med én gruppe, type, påkrævet)
+#   amounts: dot-sti -> (regex for ledeteksten, hvilket beløb på resten af linjen, påkrævet)
+#   lists:   dot-sti -> (regex for overskriften, navne på beløbskolonnerne)
+#   worktime: om arbejdstidsopgørelsen kan læses linje for linje
+# Påkrævede felter er layoutets kendetegn: kan de ikke læses, stoles der ikke på
+# reglerne, og hele lønsedlen går til LLM'en. Alle felter i skabelonen reglerne
+# ikke udfylder, sendes til LLM'en (pr. shard).
+LAYOUT_RULES: Dict[str, Dict[str, Any]] = {
+    "silkeborg_data": {
+        "fingerprint": {
+            "vendor": ["silkeborg data", "sd løn"],
+            "headers": [
+                "grundløn trin", "fast løn i alt", "specifikation af særydelser", "tjenestenr",
+                "anciennitetsdato", "jubilæumsdato", "næste løntrinsstigning",
+            ],
+            "min_headers": 3,
+        },
+        "fields": {
+            "metadata.periode": (_LINE_START + r"periode\s*:?\s*(" + DATE + r"\s*-\s*" + DATE + r")", "text", True),
+            "metadata.cpr_nr": (r"\b(\d{6}-\d{4})\b", "text", False),
+            "metadata.navn": (_LINE_START + r"navn\s*:?\s*([^\n#]+?)\s*#*$", "text", False),
+            "metadata.lønseddel_nr": (r"(?i)lønseddel\s*(?:nr\.?)?\s*:?\s*(\d{2}/\d{4})", "text", False),
+            "metadata.tjenestenr": (r"(?i)\b(?:tjenestenr|tjnr)\.?\s*:?\s*(\d+)", "text", False),
+            "metadata.anciennitetsdato": (r"(?i)anciennitetsdato\s*:?\s*(" + DATE + ")", "text", False),
+            "metadata.jubilæumsdato": (r"(?i)jubilæumsdato\s*:?\s*(" + DATE + ")", "text", False),
+            "metadata.næste_løntrinsstigning": (r"(?i)næste\s+løntrinsstigning\s*:?\s*(" + DATE + ")", "text", False),
+            "metadata.område": (r"(?i)\bområde\s*:?\s*(\d+)\b", "text", False),
+            # Løntrinnet er altid to cifre og limes sammen med beløbet ("trin 0424.559.41")
+            "løn.grundløn.trin": (r"(?i)grundløn\s+trin\s+(\d{2})", "text", True),
+            "løn.grundløn.timer_pr_uge": (r"(?i)(\d{1,2}(?:\.\d{1,2})?)\s*timer\s*(?:pr\.?|/)\s*uge", "number", False),
+            "løn.overførsel_dato": (r"(?i)overført?\s+(?:den\s+)?(?:til\s+\w+\s+)?(" + DATE + ")", "date", False),
+            "skat.trækprocent": (r"(?i)trækprocent\s*:?\s*(\d{1,2})\b", "number", False),
+            "pension.pensionsprocent": (r"(?i)pension[^\n]*?(\d{1,2}\.\d{2})\s*%", "number", False),
+        },
+        "amounts": {
+            "løn.grundløn.beløb": (_LINE_START + r"grundløn(?:\s+trin\s+\d{2})?", 0, True),
+            "løn.fast_løn_i_alt": (r"(?i)fast\s+løn\s+i\s+alt", 0, False),
+            "løn.samlet_løn_før_skat": (r"(?i)(?:samlet\s+)?løn\s+før\s+skat", 0, False),
+            "løn.netto_udbetalt": (r"(?i)netto\s*udbetalt|til\s+udbetaling", 0, False),
+            "skat.arbejdsmarkedsbidrag": (r"(?i)am-bidrag|arbejdsmarkedsbidrag", -1, False),
+            "skat.skat": (_LINE_START + r"a-skat\b", -1, False),
+            "skat.fradrag": (_LINE_START + r"(?:måneds)?fradrag\b", -1, False),
+            "pension.samlet_pensionsbidrag": (r"(?i)samlet\s+pensionsbidrag", -1, False),
+            "pension.eget_bidrag": (r"(?i)eget\s*bidrag", -1, False),
+            "ferie.ferie_med_løn_saldo": (r"(?i)ferie\s+med\s+løn", -1, False),
+            "ferie.ferie_uden_løn_saldo": (r"(?i)ferie\s+uden\s+løn", -1, False),
+            "ferie.6_uge": (r"(?i)6\.?\s*ferieuge", -1, False),
+            "ferie.feriegodtgørelse_fond": (r"(?i)feriegodtgørelse[^\n]*?fond", -1, False),
+            "ferie.ferietillæg_maj": (r"(?i)ferietillæg", -1, False),
+            "afspadsering.saldo_start": (r"(?i)afspadsering[^\n]*?saldo\s+primo", -1, False),
+            "afspadsering.optjent_timer": (r"(?i)afspadsering[^\n]*?optjent", -1, False),
+            "afspadsering.afholdt_timer": (r"(?i)afspadsering[^\n]*?afholdt", -1, False),
+            "afspadsering.saldo_slut": (r"(?i)afspadsering[^\n]*?saldo\s+ultimo", -1, False),
+        },
+        "lists": {
+            "løn.tillæg": (_LINE_START + r"tillæg\b", ["beløb"]),
+            "særydelser": (_LINE_START + r"(?:specifikation\s+af\s+)?særydelser\b", ["antal", "sats", "beløb"]),
+            "løn.fradrag": (_LINE_START + r"fradrag\s*#*$", ["beløb"]),
+        },
+        "worktime": True,
+    },
+}
+
+# En række i arbejdstidsopgørelsen: dato, tidsrum ("09:00-17:30", "09.00 – 17.30") og
+# normtid, som efterbehandlingen kan have limet på sluttidspunktet ("17:307.50")
+_TIME = r"\d{1,2}[:.]\d{2}"
+_WORKTIME_ROW_RE = re.compile(
+    r"^\s*(" + DATE + r")\D{0,12}?(" + _TIME + r")\s*[-–]\s*(" + _TIME + r")\s*(\d{1,2}\.\d{2})?"
+)
+# Linjer der ligner en række (starter med en dato) - skal alle kunne læses
+_WORKTIME_CANDIDATE_RE = re.compile(r"^\s*" + DATE + r"\s+\d")
+
+
+def parse_amount(value: str) -> Optional[float]:
+    """'24.559.41' -> 24559.41, '161.18-' -> -161.18 (efterbehandlet OCR-format)."""
+    value = value.strip()
+    negative = value.startswith("-") or value.endswith("-")
+    digits = value.strip("-")
+    if "." in digits:
+        head, _, tail = digits.rpartition(".")
+        digits = head.replace(".", "") + ("." + tail if len(tail) <= 2 else tail)
+    try:
+        amount = float(digits)
+    except ValueError:
+        return None
+    return -amount if negative else amount
+
+
+def parse_amounts(text: str) -> List[float]:
+    """Alle beløb i en tekst fra venstre mod højre (også når de er limet sammen)."""
+    return [amount for amount in (parse_amount(m.group(0)) for m in AMOUNT_RE.finditer(text)) if amount is not None]
+
+
+def parse_date(value: str) -> Optional[str]:
+    """'30.09.2024' -> '2024-09-30'."""
+    match = re.match(r"(\d{2})\.(\d{2})\.(\d{2,4})$", value.strip())
+    if not match:
+        return None
+    day, month, year = match.groups()
+    if len(year) == 2:
+        year = f"20{year}"
+    return f"{year}-{month}-{day}"
+
+
+def _convert(value: str, kind: str) -> Any:
+    if kind == "number":
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    if kind == "date":
+        return parse_date(value)
+    return value.strip() or None
+
+
+def _set_path(data: Dict[str, Any], path: str, value: Any) -> None:
+    parts = path.split(".")
+    current = data
+    for part in parts[:-1]:
+        current = current.setdefault(part, {})
+    current[parts[-1]] = value
+
+
+def _shard_for_key(key: str) -> Optional[str]:
+    for shard, spec in SECTION_SHARDS.items():
+        if key in spec["keys"]:
+            return shard
+    return None
+
+
+def _unfilled_paths(template: Any, data: Any, prefix: str = "") -> List[str]:
+    """Dot-stierne til de felter i skabelonen der stadig er None eller en tom liste."""
+    if isinstance(template, dict):
+        if not isinstance(data, dict):
+            return [prefix]
+        paths = []
+        for key, value in template.items():
+            paths += _unfilled_paths(value, data.get(key), f"{prefix}.{key}" if prefix else key)
+        return paths
+    return [prefix] if data is None or data == [] else []
+
+
+def fill_missing(data: Any, fallback: Any) -> Any:
+    """
+    Fletter LLM-resultatet ind i regel-resultatet: regel-værdier vinder, og
+    kun felter reglerne ikke har udfyldt (None/tomme) tages fra `fallback`.
+    """
+    if isinstance(data, dict) and isinstance(fallback, dict):
+        merged = dict(data)
+        for key, value in fallback.items():
+            merged[key] = fill_missing(merged[key], value) if key in merged else value
+        return merged
+    if data is None or data == []:
+        return fallback
+    return data
+
+
+class RuleExtractor:
+    """
+    Deterministisk udtræk af lønseddelfelter for kendte layouts.
+
+    Layoutet genkendes på et fingeraftryk, og felterne læses direkte fra den
+    linje- og tabelstruktur OCRService allerede har bygget. De shards med
+    felter reglerne ikke kan udfylde entydigt, sendes videre til LLM'en (se
+    ParserService).
+    """
+
+    def __init__(self, layouts: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.layouts = layouts or LAYOUT_RULES
+        self._compiled = {
+            layout_id: {
+                "vendor": [marker.lower() for marker in rules["fingerprint"]["vendor"]],
+                "headers": [marker.lower() for marker in rules["fingerprint"]["headers"]],
+                "min_headers": rules["fingerprint"]["min_headers"],
+                "fields": {
+                    path: (re.compile(pattern, re.MULTILINE), kind, required)
+                    for path, (pattern, kind, required) in rules.get("fields", {}).items()
+                },
+                "amounts": {
+                    path: (re.compile(pattern, re.MULTILINE), index, required)
+                    for path, (pattern, index, required) in rules.get("amounts", {}).items()
+                },
+                "lists": {
+                    path: (re.compile(pattern, re.MULTILINE), columns)
+                    for path, (pattern, columns) in rules.get("lists", {}).items()
+                },
+                "worktime": rules.get("worktime", False),
+            }
+            for layout_id, rules in self.layouts.items()
+        }
+
+    def detect_layout(self, ocr_text: str) -> Optional[str]:
+        """
+        Tekstligt fingeraftryk: det første layout hvis leverandørnavn står i
+        teksten, eller hvis mindst `min_headers` af dets faste overskrifter gør.
+        """
+        lowered = ocr_text.lower()
+        for layout_id, rules in self._compiled.items():
+            if any(marker in lowered for marker in rules["vendor"]):
+                return layout_id
+            if sum(marker in lowered for marker in rules["headers"]) >= rules["min_headers"]:
+                return layout_id
+        return None
+
+    def extract(self, ocr_text: str, layout_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Udfylder skabelonen for et kendt layout. Et `layout_id` fra layout-indekset
+        bruges direkte; ellers genkendes layoutet på fingeraftrykket.
+
+        Returnerer None for ukendte layouts og når layoutets påkrævede felter
+        ikke kan læses, ellers et dict med `layout`, `data` (skabelonen med de
+        felter reglerne kunne udfylde) og `missing_shards` (de shards med felter
+        LLM'en stadig skal udtrække).
+        """
+        if layout_id not in self._compiled:
+            # Layout-indekset kender ikke et regelsæt for layoutet - prøv fingeraftrykket
+            layout_id = self.detect_layout(ocr_text)
+        if layout_id is None:
+            return None
+        rules = self._compiled[layout_id]
+
+        data = copy.deepcopy(JSON_TEMPLATE)
+        filled_sections = set()
+        filled = 0
+
+        scalars = [
+            (path, self._match_field(pattern, kind, ocr_text), required)
+            for path, (pattern, kind, required) in rules["fields"].items()
+        ] + [
+            (path, self._match_amount(pattern, index, ocr_text), required)
+            for path, (pattern, index, required) in rules["amounts"].items()
+        ]
+        unmatched = [path for path, value, required in scalars if required and value is None]
+        if unmatched:
+            logger.info(f"Layout {layout_id} genkendt, men {', '.join(unmatched)} kan ikke læses - bruger ikke regler")
+            return None
+        for path, value, _ in scalars:
+            if value is not None:
+                _set_path(data, path, value)
+                filled_sections.add(path.split(".")[0])
+                filled += 1
+
+        for path, (heading, columns) in rules["lists"].items():
+            items = self._match_list(heading, columns, ocr_text)
+            if items is not None:
+                _set_path(data, path, items)
+                filled += len(items)
+
+        if rules["worktime"]:
+            rows = self._match_worktime(ocr_text)
+            if rows is not None:
+                data["arbejdstimer"] = rows
+                filled += len(rows)
+
+        # Lad ParserService udlede sektioner reglerne ikke selv har fundet
+        for key in DERIVED_SECTIONS:
+            if key not in filled_sections:
+                data.pop(key, None)
+        data.pop("arbejdstimer_ics", None)
+
+        # Alle felter reglerne ikke har udfyldt, hentes fra LLM'en
+        template = {key: value for key, value in JSON_TEMPLATE.items() if key in data}
+        missing_shards = {_shard_for_key(path.split(".")[0]) for path in _unfilled_paths(template, data)}
+        missing_shards.discard(None)
+        logger.info(
+            f"Regeludtræk ({layout_id}): {filled} felter udfyldt, "
+            f"mangler {', '.join(sorted(missing_shards)) or 'intet'}"
+        )
+        return {"layout": layout_id, "data": data, "missing_shards": sorted(missing_shards)}
+
+    @staticmethod
+    def _match_field(pattern: "re.Pattern", kind: str, ocr_text: str) -> Any:
+        """Værdien hvis alle forekomster er enige - ellers None (ikke entydig)."""
+        values = {_convert(match.group(1), kind) for match in pattern.finditer(ocr_text)}
+        values.discard(None)
+        return values.pop() if len(values) == 1 else None
+
+    @staticmethod
+    def _match_amount(pattern: "re.Pattern", index: int, ocr_text: str) -> Optional[float]:
+        """Beløb nr. `index` efter ledeteksten, hvis alle linjer med ledeteksten er enige."""
+        values = set()
+        for match in pattern.finditer(ocr_text):
+            line_end = ocr_text.find("\n", match.end())
+            amounts = parse_amounts(ocr_text[match.end():line_end if line_end != -1 else None])
+            if amounts:
+                values.add(amounts[index])
+        return values.pop() if len(values) == 1 else None
+
+    @staticmethod
+    def _match_list(heading: "re.Pattern", columns: List[str], ocr_text: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        Læser rækkerne under en overskrift indtil næste tomme linje eller overskrift.
+        Hver række er en tekst efterfulgt af præcis len(columns) beløb og evt. "P".
+        Mangler overskriften, eller kan en af rækkerne under den ikke læses, er
+        resultatet ikke entydigt (None), og listen overlades til LLM'en.
+        """
+        match = heading.search(ocr_text)
+        if match is None:
+            return None
+
+        items = []
+        started = False
+        for line in ocr_text[match.end():].split("\n")[1:]:
+            line = line.strip()
+            if not line:
+                if started:
+                    break
+                continue
+            if line.startswith("#"):
+                break
+            started = True
+
+            first_amount = AMOUNT_RE.search(line)
+            amounts = parse_amounts(line)
+            if first_amount is None or len(amounts) != len(columns):
+                return None
+            item: Dict[str, Any] = {"type": line[:first_amount.start()].strip()}
+            item.update(zip(columns, amounts))
+            item["pensionsgivende"] = line.rstrip().endswith("P")
+            items.append(item)
+        return items or None
+
+    @staticmethod
+    def _match_worktime(ocr_text: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        Rækkerne i arbejdstidsopgørelsen. None (til LLM'en) hvis der ingen rækker
+        er, eller hvis en linje der ligner en række ikke kan læses.
+        """
+        rows = []
+        for line in ocr_text.split("\n"):
+            if not _WORKTIME_CANDIDATE_RE.match(line):
+                continue
+            match = _WORKTIME_ROW_RE.match(line)
+            if match is None:
+                logger.debug(f"Arbejdstidslinje kan ikke læses: {line.strip()!r}")
+                return None
+            date, start, end, norm = match.groups()
+            start, end = start.replace(".", ":"), end.replace(".", ":")
+            rest = line[match.end():].lower()
+            absence = next((name for name in ABSENCE_TYPES if name.lower() in rest), None)
+            supplements = [{"type": name} for name in SUPPLEMENT_TYPES if name.lower() in rest]
+            rows.append({
+                "dato": parse_date(date),
+                "arbejdstid": f"{start}-{end}",
+                "normtid": float(norm) if norm else None,
+                "fravær": absence,
+                "tillæg": supplements,
+            })
+        return rows or None
+
+
+rule_extractor = RuleExtractor()
@@ -0,0 +1,128 @@
+import hashlib
+import logging
+from datetime import datetime, time, timezone
+from typing import Any, Dict, Iterable, List
+
+from sqlalchemy import delete, select as sql_select
+from sqlalchemy.dialects.postgresql import insert
+
+from app.db import AsyncSessionLocal
+from app.models import Shift
+from app.utils.ics_import import recurrence_window
+
+logger = logging.getLogger(__name__)
+
+# Rækker pr. INSERT-statement (Postgres tillader højst 32767 parametre pr. statement)
+UPSERT_BATCH_SIZE = 2000
+# Kolonner der overskrives når en vagt med samme UID er ændret
+_UPDATE_COLUMNS = ("date", "start_time", "end_time", "hours", "title", "content_hash")
+
+
+def _to_naive_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def shift_content_hash(event: Dict[str, Any]) -> str:
+    """Hash af det en vagt består af (start, slut, titel) - ens hash betyder uændret vagt."""
+    key = f"{event['start']}|{event['end']}|{event.get('title') or ''}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def shift_row(user_id: int, event: Dict[str, Any], content_hash: str) -> Dict[str, Any]:
+    """Række til `shifts` for en vagt fra ICS-feed'et ({"id", "title", "start", "end"})."""
+    start = datetime.fromisoformat(event["start"])
+    end = datetime.fromisoformat(event["end"])
+    return {
+        "user_id": user_id,
+        "uid": event["id"],
+        # Datoen er vagtens lokale dato; tidspunkter gemmes som UTC
+        "date": start.date(),
+        "start_time": _to_naive_utc(start),
+        "end_time": _to_naive_utc(end),
+        "hours": round((end - start).total_seconds() / 3600, 2),
+        "title": event.get("title") or "Vagt",
+        "content_hash": content_hash,
+    }
+
+
+class ShiftSync:
+    """
+    Inkrementel synkronisering af en brugers ICS-vagter til tabellen `shifts`.
+
+    Vagterne fra feed'et sammenlignes med de gemte på UID og indholds-hash:
+    kun nye og ændrede vagter skrives (som én bulk-upsert), og vagter der er
+    forsvundet fra feed'et slettes. Et uændret feed koster én hash-sammenligning
+    pr. vagt og ingen skrivninger. Vagter uden UID (oprettet manuelt) røres ikke.
+
+    Gentagne vagter udfoldes kun fra starten af `recurrence_window()`, så vagter
+    der starter før den, slettes ikke når de mangler i feed'et - historikken
+    bevares, også efterhånden som vinduet flytter sig.
+    """
+
+    async def sync(self, user_id: int, events: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+        # Sidste forekomst vinder hvis et UID optræder flere gange i feed'et
+        feed: Dict[str, Dict[str, Any]] = {}
+        for event in events:
+            if event.get("id"):
+                feed[event["id"]] = event
+
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                sql_select(Shift.uid, Shift.content_hash, Shift.start_time)
+                .where(Shift.user_id == user_id, Shift.uid.isnot(None))
+            )
+            stored: Dict[str, str] = {}
+            history = set()
+            keep_before = datetime.combine(recurrence_window()[0], time.min)
+            for uid, content_hash, start_time in result.all():
+                stored[uid] = content_hash
+                if start_time is not None and start_time < keep_before:
+                    history.add(uid)
+
+            rows: List[Dict[str, Any]] = []
+            inserted = unchanged = 0
+            for uid, event in feed.items():
+                content_hash = shift_content_hash(event)
+                if stored.get(uid) == content_hash:
+                    unchanged += 1
+                    continue
+                try:
+                    rows.append(shift_row(user_id, event, content_hash))
+                except (KeyError, TypeError, ValueError) as e:
+                    logger.warning(f"Springer vagt {uid} over for bruger {user_id}: {e}")
+                    continue
+                inserted += uid not in stored
+            removed = [uid for uid in stored if uid not in feed and uid not in history]
+
+            counts = {
+                "inserted": inserted,
+                "updated": len(rows) - inserted,
+                "deleted": len(removed),
+                "unchanged": unchanged,
+            }
+            if not rows and not removed:
+                return counts
+
+            for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+                stmt = insert(Shift).values(rows[start:start + UPSERT_BATCH_SIZE])
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[Shift.user_id, Shift.uid],
+                    set_={column: stmt.excluded[column] for column in _UPDATE_COLUMNS},
+                )
+                await session.execute(stmt)
+            if removed:
+                await session.execute(
+                    delete(Shift).where(Shift.user_id == user_id, Shift.uid.in_(removed))
+                )
+            await session.commit()
+
+        logger.info(
+            f"Vagter synkroniseret for bruger {user_id}: {counts['inserted']} nye, "
+            f"{counts['updated']} ændrede, {counts['deleted']} slettede, {counts['unchanged']} uændrede"
+        )
+        return counts
+
+
+shift_sync = ShiftSync()
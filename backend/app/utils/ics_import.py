@@ -1,56 +1,97 @@
 import aiohttp
-import icalendar
-from datetime import datetime
+from datetime import date, timedelta
 import logging
-import ssl
 import sys
 
+from app.config import settings
+from app.services.http_client import UNVERIFIED_SSL, http_client
+from app.utils.ics_stream import iter_ics_shifts
+
 async def fetch_ics(url):
     """Henter ICS-kalender fra URL"""
     print(f"DEBUG: Starter hentning af ICS fra URL: {url}", file=sys.stderr)
+    logging.info(f"Henter ICS-data fra URL: {url}")
     try:
-        # Opret en SSL-kontekst, der ikke verificerer certifikater
-        ssl_context = ssl.create_default_context()
-        ssl_context.check_hostname = False
-        ssl_context.verify_mode = ssl.CERT_NONE
-        
-        print(f"DEBUG: SSL kontekst oprettet med verify_mode: {ssl_context.verify_mode}", file=sys.stderr)
-        
-        async with aiohttp.ClientSession() as session:
-            logging.info(f"Henter ICS-data fra URL: {url}")
-            print(f"DEBUG: aiohttp session oprettet, forsøger at hente data...", file=sys.stderr)
-            try:
-                print(f"DEBUG: Sender GET anmodning til {url}", file=sys.stderr)
-                async with session.get(url, ssl=ssl_context, timeout=30) as response:
-                    status = response.status
-                    print(f"DEBUG: Modtog HTTP status {status} fra server", file=sys.stderr)
-                    
-                    if status == 200:
-                        text = await response.text()
-                        print(f"DEBUG: Succes! Modtog {len(text)} bytes data", file=sys.stderr)
-                        if len(text) < 100:
-                            print(f"DEBUG: Kort respons: {text}", file=sys.stderr)
-                        else:
-                            print(f"DEBUG: Begyndelsen af respons: {text[:100]}...", file=sys.stderr)
-                        
-                        logging.info(f"Succes! Modtog {len(text)} bytes data fra ICS URL")
-                        return text
-                    else:
-                        error_text = await response.text()
-                        print(f"DEBUG: HTTP fejl {status}. Respons: {error_text[:200]}", file=sys.stderr)
-                        logging.error(f"HTTP fejl {status} ved hentning fra {url}")
-                        return None
-            except aiohttp.ClientError as e:
-                print(f"DEBUG: aiohttp ClientError: {e}", file=sys.stderr)
-                logging.error(f"aiohttp fejl ved forbindelse til {url}: {e}")
+        # Den fælles session genbruger forbindelser; certifikater verificeres ikke
+        print(f"DEBUG: Sender GET anmodning til {url}", file=sys.stderr)
+        async with http_client.session.get(url, ssl=UNVERIFIED_SSL) as response:
+            status = response.status
+            print(f"DEBUG: Modtog HTTP status {status} fra server", file=sys.stderr)
+            
+            if status == 200:
+                text = await response.text()
+                print(f"DEBUG: Succes! Modtog {len(text)} bytes data", file=sys.stderr)
+                if len(text) < 100:
+                    print(f"DEBUG: Kort respons: {text}", file=sys.stderr)
+                else:
+                    print(f"DEBUG: Begyndelsen af respons: {text[:100]}...", file=sys.stderr)
+                
+                logging.info(f"Succes! Modtog {len(text)} bytes data fra ICS URL")
+                return text
+            else:
+                error_text = await response.text()
+                print(f"DEBUG: HTTP fejl {status}. Respons: {error_text[:200]}", file=sys.stderr)
+                logging.error(f"HTTP fejl {status} ved hentning fra {url}")
                 return None
+    except aiohttp.ClientError as e:
+        print(f"DEBUG: aiohttp ClientError: {e}", file=sys.stderr)
+        logging.error(f"aiohttp fejl ved forbindelse til {url}: {e}")
+        return None
     except Exception as e:
         print(f"DEBUG: Generel fejl ved hentning af ICS-data: {e}", file=sys.stderr)
         logging.error(f"Generel fejl ved hentning af ICS-data: {e}")
         return None
 
+async def fetch_ics_conditional(url, etag=None, last_modified=None):
+    """
+    Henter ICS-kalender fra URL med conditional GET.
+
+    Sender If-None-Match/If-Modified-Since når ETag/Last-Modified fra en
+    tidligere hentning kendes. Returnerer {"status", "text", "etag", "last_modified"}
+    - med status 304 og text None hvis feed'et er uændret - eller None ved fejl.
+    """
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    try:
+        async with http_client.session.get(url, ssl=UNVERIFIED_SSL, headers=headers) as response:
+            if response.status == 304:
+                logging.info(f"ICS-feed uændret (304): {url}")
+                text = None
+            elif response.status == 200:
+                text = await response.text()
+                logging.info(f"Modtog {len(text)} bytes ICS-data fra {url}")
+            else:
+                logging.error(f"HTTP fejl {response.status} ved hentning fra {url}")
+                return None
+            return {
+                "status": response.status,
+                "text": text,
+                "etag": response.headers.get("ETag", etag),
+                "last_modified": response.headers.get("Last-Modified", last_modified),
+            }
+    except Exception as e:
+        logging.error(f"Fejl ved hentning af ICS-data fra {url}: {e}")
+        return None
+
+def recurrence_window():
+    """
+    Vindue for udfoldning af gentagne vagter: fra ICS_RECURRENCE_DAYS_BACK dage
+    tilbage til ICS_RECURRENCE_DAYS_AHEAD dage frem. Med en nedre grænse bruges
+    MAX_OCCURRENCES på de aktuelle forekomster og ikke på de ældste forekomster
+    af gamle, åbne regler. Grænserne er datoer, så udfoldningerne kan genbruges
+    fra cachen resten af dagen.
+    """
+    today = date.today()
+    return (
+        today - timedelta(days=settings.ICS_RECURRENCE_DAYS_BACK),
+        today + timedelta(days=settings.ICS_RECURRENCE_DAYS_AHEAD),
+    )
+
 async def ical_to_shifts(ical_data):
-    """Konverterer iCalendar data til en liste af vagter"""
+    """Konverterer iCalendar data til en liste af vagter (gentagne vagter udfoldes, se recurrence_window)"""
     if not ical_data:
         logging.warning("Ingen ICS-data at konvertere")
         print("DEBUG: Ingen ICS-data at konvertere", file=sys.stderr)
@@ -58,32 +99,14 @@ async def ical_to_shifts(ical_data):
     
     try:
         print(f"DEBUG: Forsøger at parse iCalendar data ({len(ical_data)} bytes)", file=sys.stderr)
-        calendar = icalendar.Calendar.from_ical(ical_data)
+        # Streaming-parseren bygger kun de felter vi bruger og springer fejlbehæftede events over
         shifts = []
-        
-        event_count = 0
-        for component in calendar.walk():
-            if component.name == "VEVENT":
-                event_count += 1
-                try:
-                    start = component.get('dtstart').dt
-                    end = component.get('dtend').dt
-                    
-                    if isinstance(start, datetime) and isinstance(end, datetime):
-                        shift = {
-                            "id": str(component.get('uid')),
-                            "title": str(component.get('summary', 'Vagt')),
-                            "start": start.isoformat(),
-                            "end": end.isoformat()
-                        }
-                        shifts.append(shift)
-                        if len(shifts) <= 3:
-                            print(f"DEBUG: Parsede event {len(shifts)}: {shift['title']} {shift['start']}", file=sys.stderr)
-                except Exception as e:
-                    logging.error(f"Fejl ved behandling af kalenderbegivenhed: {e}")
-                    print(f"DEBUG: Fejl ved parsing af event: {e}", file=sys.stderr)
-        
-        print(f"DEBUG: Fandt {event_count} events, konverterede {len(shifts)} vagter", file=sys.stderr)
+        for shift in iter_ics_shifts(ical_data, recurrence_window=recurrence_window()):
+            shifts.append(shift)
+            if len(shifts) <= 3:
+                print(f"DEBUG: Parsede event {len(shifts)}: {shift['title']} {shift['start']}", file=sys.stderr)
+
+        print(f"DEBUG: Konverterede {len(shifts)} vagter", file=sys.stderr)
         logging.info(f"Konverteret {len(shifts)} vagter fra ICS-data")
         return shifts
     except Exception as e:
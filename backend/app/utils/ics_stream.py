@@ -0,0 +1,487 @@
+"""
+Streaming-parser til ICS-feeds (RFC 5545).
+
+Læser feed'et linje for linje og bygger kun de VEVENT-felter vi bruger (UID,
+SUMMARY, DTSTART, DTEND/DURATION) i stedet for hele icalendar-objekttræet, så
+hukommelsesforbruget er uafhængigt af feed'ets længde. Håndterer foldede
+linjer (også foldning midt i et UTF-8-tegn), TZID (IANA-navne, Windows-navne
+og præfiksede navne som "/mozilla.org/.../Europe/Copenhagen") og VALUE=DATE.
+VTIMEZONE-definitioner læses ikke; tidszoner slås op i tz-databasen på navn.
+
+Gentagne begivenheder (RRULE/EXDATE, og ændrede forekomster med
+RECURRENCE-ID) udfoldes kun inden for et tidsvindue, så åbne regler ikke
+materialiseres til årevis af forekomster.
+"""
+import logging
+import re
+from datetime import date, datetime, time, timedelta, timezone, tzinfo
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from dateutil.rrule import rrulestr
+
+logger = logging.getLogger(__name__)
+
+# Udfoldede gentagelser caches pr. (UID, regel, vindue)
+RECURRENCE_CACHE_SIZE = 1024
+# Sikkerhedsgrænse for forekomster pr. regel i ét vindue
+MAX_OCCURRENCES = 5000
+
+ICSSource = Union[str, bytes, Iterable[bytes], Iterable[str]]
+
+# Windows-tidszonenavne fra Outlook/Exchange-feeds -> IANA
+WINDOWS_TZIDS = {
+    "Romance Standard Time": "Europe/Copenhagen",
+    "W. Europe Standard Time": "Europe/Berlin",
+    "Central Europe Standard Time": "Europe/Budapest",
+    "Central European Standard Time": "Europe/Warsaw",
+    "GMT Standard Time": "Europe/London",
+    "Greenwich Standard Time": "Atlantic/Reykjavik",
+    "FLE Standard Time": "Europe/Helsinki",
+    "Greenland Standard Time": "America/Godthab",
+    "UTC": "UTC",
+}
+
+# Egenskaber der bruges fra hver VEVENT; alle andre springes over uden parsing
+_EVENT_PROPERTIES = frozenset({
+    "UID", "SUMMARY", "DTSTART", "DTEND", "DURATION", "RRULE", "EXDATE", "RECURRENCE-ID",
+})
+_FOLD_PREFIXES = frozenset({" ", "\t", b" ", b"\t"})
+# Semikolon uden for citerede parameterværdier
+_PARAM_SPLIT_RE = re.compile(r';(?=(?:[^"]*"[^"]*")*[^"]*$)')
+_TEXT_ESCAPE_RE = re.compile(r"\\([\\;,nN])")
+_UNTIL_RE = re.compile(r"UNTIL=(\d{8})(T\d{6})?(Z?)", re.IGNORECASE)
+_DURATION_RE = re.compile(
+    r"([+-])?P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$"
+)
+
+
+def _split_lines(data: Union[str, bytes]) -> Iterator[Union[str, bytes]]:
+    """Linjer i en samlet streng/bytes som slices, uden at kopiere hele feed'et."""
+    newline = b"\n" if isinstance(data, bytes) else "\n"
+    start = 0
+    while True:
+        end = data.find(newline, start)
+        if end < 0:
+            if start < len(data):
+                yield data[start:]
+            return
+        yield data[start:end]
+        start = end + 1
+
+
+def _physical_lines(source: ICSSource) -> Iterator[Union[str, bytes]]:
+    """Fysiske linjer fra en streng, bytes eller en strøm af chunks (f.eks. fra en HTTP-respons)."""
+    if isinstance(source, (str, bytes)):
+        yield from _split_lines(source)
+        return
+
+    buffer = None
+    for chunk in source:
+        buffer = chunk if buffer is None else buffer + chunk
+        *lines, buffer = buffer.split(b"\n" if isinstance(buffer, bytes) else "\n")
+        yield from lines
+    if buffer:
+        yield buffer
+
+
+def _decode(line: Union[str, bytes]) -> str:
+    return line.decode("utf-8", "replace") if isinstance(line, bytes) else line
+
+
+def iter_unfolded_lines(source: ICSSource) -> Iterator[str]:
+    """
+    Logiske (foldede) linjer fra feed'et. Bytes samles før dekodning, så et
+    UTF-8-tegn der er foldet over to linjer stadig dekodes korrekt.
+    """
+    current = None
+    eol = None
+    for line in _physical_lines(source):
+        if eol is None:
+            eol = b"\r\n" if isinstance(line, bytes) else "\r\n"
+        line = line.rstrip(eol)
+        if line[:1] in _FOLD_PREFIXES:
+            if current is not None:
+                current += line[1:]
+            continue
+        if current:
+            yield _decode(current)
+        current = line
+    if current:
+        yield _decode(current)
+
+
+def _split_params(head: str) -> Tuple[str, Dict[str, str]]:
+    """Navn og parametre fra delen før værdien, f.eks. 'DTSTART;TZID="Europe/Copenhagen"'."""
+    if '"' in head:
+        parts = _PARAM_SPLIT_RE.split(head)
+    else:
+        parts = head.split(";")
+    params = {}
+    for part in parts[1:]:
+        key, _, value = part.partition("=")
+        params[key.upper()] = value.strip('"')
+    return parts[0].upper(), params
+
+
+def _value_start(line: str, colon: int) -> int:
+    """Positionen af kolonet der adskiller navn/parametre fra værdien (koloner i citerede parametre tæller ikke)."""
+    if '"' not in line[:colon]:
+        return colon
+    quoted = False
+    for i, char in enumerate(line):
+        if char == '"':
+            quoted = not quoted
+        elif char == ":" and not quoted:
+            return i
+    return colon
+
+
+def unescape_text(value: str) -> str:
+    """Fjerner RFC 5545-escaping fra TEXT-værdier (\\, \\; \\, \\n)."""
+    if "\\" not in value:
+        return value
+    return _TEXT_ESCAPE_RE.sub(lambda m: "\n" if m.group(1) in "nN" else m.group(1), value)
+
+
+@lru_cache(maxsize=256)
+def resolve_tzid(tzid: str) -> Optional[tzinfo]:
+    """
+    Tidszonen for en TZID, eller None (flydende tid) hvis den ikke kan findes.
+    Prøver IANA-navnet, Windows-navnet og til sidst stadigt kortere suffikser af
+    præfiksede navne ("/citadel.org/20190914_1/Europe/Copenhagen" -> "Europe/Copenhagen").
+    """
+    tzid = tzid.strip().strip('"')
+    candidates = [tzid, WINDOWS_TZIDS.get(tzid)]
+    segments = [segment for segment in tzid.split("/") if segment]
+    candidates += ["/".join(segments[i:]) for i in range(len(segments))]
+    for candidate in candidates:
+        if not candidate:
+            continue
+        try:
+            return ZoneInfo(candidate)
+        except (ZoneInfoNotFoundError, ValueError, OSError):
+            continue
+    logger.warning(f"Ukendt TZID i ICS-feed: {tzid!r} - tider behandles som lokal tid")
+    return None
+
+
+def parse_ics_datetime(value: str, params: Dict[str, str]) -> Union[date, datetime]:
+    """DATE eller DATE-TIME-værdi; 'Z' giver UTC, TZID giver den tidszone, ellers flydende (naiv) tid."""
+    value = value.strip()
+    if params.get("VALUE") == "DATE" or len(value) == 8:
+        return date(int(value[0:4]), int(value[4:6]), int(value[6:8]))
+    if len(value) < 15 or value[8] != "T":
+        raise ValueError(f"Ugyldig dato/tid: {value!r}")
+    result = datetime(
+        int(value[0:4]), int(value[4:6]), int(value[6:8]),
+        int(value[9:11]), int(value[11:13]), int(value[13:15]),
+    )
+    if value.endswith("Z"):
+        return result.replace(tzinfo=timezone.utc)
+    tzid = params.get("TZID")
+    if tzid:
+        tz = resolve_tzid(tzid)
+        if tz is not None:
+            return result.replace(tzinfo=tz)
+    return result
+
+
+def parse_ics_duration(value: str) -> timedelta:
+    """DURATION-værdi, f.eks. 'PT8H30M' eller 'P1D'."""
+    match = _DURATION_RE.match(value.strip())
+    if not match:
+        raise ValueError(f"Ugyldig varighed: {value!r}")
+    sign, weeks, days, hours, minutes, seconds = match.groups()
+    duration = timedelta(
+        weeks=int(weeks or 0), days=int(days or 0),
+        hours=int(hours or 0), minutes=int(minutes or 0), seconds=int(seconds or 0),
+    )
+    return -duration if sign == "-" else duration
+
+
+def _window_key(value: Union[date, datetime]) -> datetime:
+    """Sammenligningsværdi for tidsvinduet: naiv UTC (datoer og flydende tider tages som de er)."""
+    if not isinstance(value, datetime):
+        return datetime.combine(value, time.min)
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _instant(value: Union[date, datetime]) -> Union[date, datetime]:
+    """Sammenligningsværdi for EXDATE/RECURRENCE-ID: tidspunkter med tidszone som naiv UTC, datoer som datoer."""
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _occurrence_key(value: Union[date, datetime]) -> str:
+    if not isinstance(value, datetime):
+        return value.strftime("%Y%m%d")
+    if value.tzinfo is None:
+        return value.strftime("%Y%m%dT%H%M%S")
+    return _instant(value).strftime("%Y%m%dT%H%M%SZ")
+
+
+def event_id(event: Dict[str, Any]) -> str:
+    """
+    Id for en begivenhed: UID'et, og for forekomster af gentagne begivenheder
+    UID'et med forekomstens oprindelige start ("uid@20240105T060000Z"), så hver
+    forekomst har sit eget id - også når den er flyttet med RECURRENCE-ID.
+    """
+    if event.get("recurrence_id") is None:
+        return str(event["uid"])
+    return f"{event['uid']}@{_occurrence_key(event['recurrence_id'])}"
+
+
+def _parse_date_list(params: Dict[str, str], value: str) -> List[Union[date, datetime]]:
+    return [parse_ics_datetime(item, params) for item in value.split(",") if item.strip()]
+
+
+def _build_event(props: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    if "DTSTART" not in props:
+        return None
+    start = parse_ics_datetime(props["DTSTART"][1], props["DTSTART"][0])
+    if "DTEND" in props:
+        end = parse_ics_datetime(props["DTEND"][1], props["DTEND"][0])
+    elif "DURATION" in props:
+        end = start + parse_ics_duration(props["DURATION"][1])
+    else:
+        # RFC 5545: uden DTEND/DURATION varer en heldagsbegivenhed én dag, ellers nul tid
+        end = start if isinstance(start, datetime) else start + timedelta(days=1)
+
+    uid = props.get("UID")
+    summary = props.get("SUMMARY")
+    rrule = props.get("RRULE")
+    recurrence_id = props.get("RECURRENCE-ID")
+    return {
+        "uid": uid[1].strip() if uid else None,
+        "summary": unescape_text(summary[1]) if summary else None,
+        "start": start,
+        "end": end,
+        "all_day": not isinstance(start, datetime),
+        "rrule": rrule[1].strip() if rrule else None,
+        "exdates": [d for params, value in props.get("EXDATE", ()) for d in _parse_date_list(params, value)],
+        "recurrence_id": parse_ics_datetime(recurrence_id[1], recurrence_id[0]) if recurrence_id else None,
+    }
+
+
+def _normalise_until(rule: str, dtstart: datetime) -> str:
+    """
+    dateutil kræver UNTIL i UTC når DTSTART har tidszone, og uden tidszone
+    ellers; mange feeds overholder ikke det, så UNTIL omskrives efter DTSTART.
+    """
+    def replace(match):
+        day, clock, utc = match.groups()
+        if dtstart.tzinfo is None:
+            return f"UNTIL={day}{clock or 'T235959'}"
+        if utc:
+            return match.group(0)
+        local = datetime.strptime(day + (clock or "T235959"), "%Y%m%dT%H%M%S").replace(tzinfo=dtstart.tzinfo)
+        return f"UNTIL={_instant(local):%Y%m%dT%H%M%S}Z"
+
+    return _UNTIL_RE.sub(replace, rule)
+
+
+@lru_cache(maxsize=RECURRENCE_CACHE_SIZE)
+def _rule_occurrences(
+    uid: Optional[str],
+    dtstart: Union[date, datetime],
+    duration: timedelta,
+    rule: str,
+    window_start: Optional[datetime],
+    window_end: Optional[datetime],
+) -> Tuple[Union[date, datetime], ...]:
+    """
+    Starttidspunkterne for reglens forekomster der overlapper [window_start, window_end)
+    (naiv UTC). Reglen gennemløbes dovent fra vinduets start og stoppes ved dets slutning.
+    """
+    all_day = not isinstance(dtstart, datetime)
+    first = datetime.combine(dtstart, time.min) if all_day else dtstart
+    recurrence = rrulestr(_normalise_until(rule, first), dtstart=first)
+
+    if window_start is not None:
+        # Forekomster der starter før vinduet, men slutter i det, tages med
+        lower = window_start - duration
+        if first.tzinfo is not None:
+            lower = lower.replace(tzinfo=timezone.utc)
+        occurrences = recurrence.xafter(lower, inc=True)
+    else:
+        occurrences = iter(recurrence)
+
+    result = []
+    for occurrence in occurrences:
+        if window_end is not None and _window_key(occurrence) >= window_end:
+            break
+        if len(result) >= MAX_OCCURRENCES:
+            logger.warning(f"Gentagelse {uid} har over {MAX_OCCURRENCES} forekomster i vinduet - resten udelades")
+            break
+        result.append(occurrence.date() if all_day else occurrence)
+    return tuple(result)
+
+
+def expand_recurrence(
+    event: Dict[str, Any],
+    window_start: Optional[datetime],
+    window_end: Optional[datetime],
+    excluded: Set[Union[date, datetime]] = frozenset(),
+) -> Iterator[Dict[str, Any]]:
+    """
+    Forekomsterne af en gentagen begivenhed i vinduet (naiv UTC), undtagen
+    EXDATE'r og de `excluded` (f.eks. forekomster der er ændret med RECURRENCE-ID).
+    """
+    excluded = set(excluded) | {_instant(value) for value in event["exdates"]}
+    duration = event["end"] - event["start"]
+    for start in _rule_occurrences(
+        event["uid"], event["start"], duration, event["rrule"], window_start, window_end
+    ):
+        instant = _instant(start)
+        if instant in excluded or (isinstance(start, datetime) and start.date() in excluded):
+            continue
+        yield {
+            **event,
+            "start": start,
+            "end": start + duration,
+            "rrule": None,
+            "exdates": [],
+            "recurrence_id": start,
+        }
+
+
+def _in_window(event: Dict[str, Any], ws: Optional[datetime], we: Optional[datetime]) -> bool:
+    start = _window_key(event["start"])
+    if we is not None and start >= we:
+        return False
+    return ws is None or start >= ws or _window_key(event["end"]) > ws
+
+
+def iter_ics_events(
+    source: ICSSource,
+    window_start: Optional[Union[date, datetime]] = None,
+    window_end: Optional[Union[date, datetime]] = None,
+    stop_after_window: bool = False,
+    recurrence_window: Optional[Tuple[Optional[Union[date, datetime]], Optional[Union[date, datetime]]]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Begivenheder fra feed'et som {"uid", "summary", "start", "end", "all_day",
+    "rrule", "exdates", "recurrence_id"} (tider som date/datetime), én ad gangen.
+
+    Med `window_start`/`window_end` springes begivenheder uden for vinduet
+    over. `stop_after_window` stopper ved den første begivenhed der starter
+    efter vinduet - kun korrekt for feeds der er sorteret kronologisk.
+    Begivenheder der ikke kan parses logges og springes over.
+
+    Gentagne begivenheder udfoldes til forekomster (med `recurrence_id` sat til
+    forekomstens oprindelige start) inden for vinduet; de sider af vinduet der
+    ikke er givet, tages fra `recurrence_window`. Uden nogen af delene udfoldes
+    kun regler med COUNT/UNTIL fuldt (højst MAX_OCCURRENCES). Da ændrede
+    forekomster kan stå efter reglen, udfoldes reglerne når feed'et er læst.
+    """
+    ws = _window_key(window_start) if window_start is not None else None
+    we = _window_key(window_end) if window_end is not None else None
+    recurrence_start, recurrence_end = recurrence_window or (None, None)
+    if ws is None and recurrence_start is not None:
+        recurrence_start = _window_key(recurrence_start)
+    else:
+        recurrence_start = ws
+    if we is None and recurrence_end is not None:
+        recurrence_end = _window_key(recurrence_end)
+    else:
+        recurrence_end = we
+
+    masters: List[Dict[str, Any]] = []
+    # UID -> oprindelige starttidspunkter for forekomster der er ændret med RECURRENCE-ID
+    overridden: Dict[Optional[str], Set[Union[date, datetime]]] = {}
+
+    props: Optional[Dict[str, Any]] = None
+    nested = 0  # Underkomponenter (VALARM o.l.) i den aktuelle VEVENT
+    for line in iter_unfolded_lines(source):
+        colon = line.find(":")
+        if colon < 0:
+            continue
+        semi = line.find(";", 0, colon)
+        name = line[:semi if semi >= 0 else colon].upper()
+
+        if name == "BEGIN":
+            if props is None:
+                if line[colon + 1:].strip().upper() == "VEVENT":
+                    props, nested = {}, 0
+            else:
+                nested += 1
+            continue
+        if name == "END":
+            if props is None:
+                continue
+            if nested:
+                nested -= 1
+                continue
+            if line[colon + 1:].strip().upper() != "VEVENT":
+                continue
+            try:
+                event = _build_event(props)
+            except (ValueError, OverflowError) as e:
+                logger.warning(f"Springer ICS-begivenhed {props.get('UID', ({}, '?'))[1]} over: {e}")
+                event = None
+            props = None
+            if event is None:
+                continue
+
+            if event["recurrence_id"] is not None:
+                overridden.setdefault(event["uid"], set()).add(_instant(event["recurrence_id"]))
+            if we is not None and _window_key(event["start"]) >= we:
+                if stop_after_window:
+                    break
+                continue
+            if event["rrule"] and event["recurrence_id"] is None:
+                masters.append(event)
+                continue
+            if _in_window(event, ws, we):
+                yield event
+            continue
+
+        if props is None or nested or name not in _EVENT_PROPERTIES:
+            continue
+        if semi >= 0:
+            colon = _value_start(line, colon)
+            _, params = _split_params(line[:colon])
+        else:
+            params = {}
+        if name == "EXDATE":
+            # EXDATE kan optræde flere gange
+            props.setdefault(name, []).append((params, line[colon + 1:]))
+        else:
+            props[name] = (params, line[colon + 1:])
+
+    for master in masters:
+        try:
+            occurrences = list(expand_recurrence(master, recurrence_start, recurrence_end, overridden.get(master["uid"], set())))
+        except (ValueError, TypeError, OverflowError) as e:
+            logger.warning(f"Kan ikke udfolde gentagelse {master['uid']} ({master['rrule']}): {e}")
+            continue
+        for occurrence in occurrences:
+            if _in_window(occurrence, ws, we):
+                yield occurrence
+
+
+def iter_ics_shifts(
+    source: ICSSource,
+    window_start: Optional[Union[date, datetime]] = None,
+    window_end: Optional[Union[date, datetime]] = None,
+    stop_after_window: bool = False,
+    recurrence_window: Optional[Tuple[Optional[Union[date, datetime]], Optional[Union[date, datetime]]]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Vagter fra feed'et i samme form som `ical_to_shifts` ({"id", "title", "start", "end"},
+    ISO-tider). Heldagsbegivenheder er ikke vagter og udelades.
+    """
+    for event in iter_ics_events(source, window_start, window_end, stop_after_window, recurrence_window):
+        if event["all_day"] or not isinstance(event["end"], datetime):
+            continue
+        yield {
+            "id": event_id(event),
+            "title": event["summary"] if event["summary"] is not None else "Vagt",
+            "start": event["start"].isoformat(),
+            "end": event["end"].isoformat(),
+        }
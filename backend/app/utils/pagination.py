@@ -0,0 +1,46 @@
+"""
+Keyset-paginering af vagter.
+
+Sider sorteres på (starttidspunkt, id), og næste side beskrives af en opak
+cursor med nøglen for den sidste vagt på siden. Cursoren sendes i headeren
+`X-Next-Cursor`; mangler headeren, er der ikke flere vagter i vinduet.
+"""
+import base64
+import json
+from datetime import datetime, timezone
+from typing import Any, Optional, Tuple, Type
+
+from fastapi import HTTPException
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+# Højeste antal vagter pr. side
+MAX_PAGE_SIZE = 1000
+
+
+def to_naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Tidspunkter sammenlignes som naiv UTC, som i `shifts`; naive værdier tages som UTC."""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def encode_cursor(start: datetime, key: Any) -> str:
+    payload = json.dumps([start.isoformat(), key], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, key_type: Type) -> Tuple[datetime, Any]:
+    """
+    (starttidspunkt, id) fra en cursor; 400 hvis den ikke kan læses, eller
+    hvis id'et ikke har endpointets type (`key_type`, f.eks. int for `shifts.id`).
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        start, key = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        start = to_naive_utc(datetime.fromisoformat(start))
+    except (ValueError, TypeError, UnicodeError):
+        raise HTTPException(400, "Ugyldig cursor")
+    # bool er en underklasse af int, men aldrig et gyldigt id
+    if not isinstance(key, key_type) or isinstance(key, bool):
+        raise HTTPException(400, "Ugyldig cursor")
+    return start, key